@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, status
+
+from app.core.config import settings
+from app.core.exceptions import AuthorizationError, ConflictError
+from app.db.models import User
+from app.services.auth_service import auth_service
+from app.services.vector_index_manager import vector_index_manager
+
+router = APIRouter()
+
+async def require_admin(current_user: User = Depends(auth_service.get_current_user)) -> User:
+    if current_user.username not in settings.admin_usernames:
+        raise AuthorizationError("Admin privileges required")
+    return current_user
+
+@router.get("/vector-index")
+async def vector_index_status(
+    refresh: bool = False,
+    current_user: User = Depends(require_admin)
+):
+    if refresh:
+        await vector_index_manager.collect_stats()
+    return vector_index_manager.status()
+
+@router.post("/vector-index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_vector_index(
+    force: bool = False,
+    current_user: User = Depends(require_admin)
+):
+    if not vector_index_manager.trigger_rebuild(force=force):
+        raise ConflictError("A vector index rebuild is already running")
+    return {"status": "started", "force": force}
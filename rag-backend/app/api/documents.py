@@ -1,30 +1,39 @@
 from fastapi import APIRouter, UploadFile, File, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+import uuid
 
 from app.db.base import db
 from app.services.document_service import document_service
 from app.services.auth_service import auth_service
 from app.db.models import User
-from app.api.pydantic_models import DocumentSelectionRequest, DocumentOut
+from app.api.pydantic_models import DocumentSelectionRequest, DocumentOut, IngestionJobAccepted, IngestionJobOut
 from app.core.exceptions import ValidationError, DatabaseError
 
 router = APIRouter()
 
-@router.post("/upload")
+@router.post("/upload", response_model=IngestionJobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def upload_document(
     file: UploadFile = File(...),
     session: AsyncSession = Depends(db.get_session),
     current_user: User = Depends(auth_service.get_current_user)
 ):
     try:
-        result = await document_service.process_and_store_document(file, session, current_user)
+        result = await document_service.submit_document(file, session, current_user)
         return result
     except (ValidationError, DatabaseError) as e:
         raise
     except Exception as e:
         raise ValidationError(str(e))
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobOut)
+async def get_ingestion_job(
+    job_id: uuid.UUID,
+    session: AsyncSession = Depends(db.get_session),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    return await document_service.get_ingestion_job(job_id, session, current_user.id)
+
 @router.get("/list", response_model=List[DocumentOut])
 async def list_documents(
     session: AsyncSession = Depends(db.get_session),
@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel, EmailStr
-from typing import List
+from typing import Any, Dict, List, Optional
 import uuid
 
 class UserCreate(BaseModel):
@@ -28,8 +28,27 @@ class DocumentOut(BaseModel):
     class Config:
         from_attributes = True
 
+class IngestionJobAccepted(BaseModel):
+    job_id: uuid.UUID
+    status: str
+
+class IngestionJobOut(BaseModel):
+    job_id: uuid.UUID
+    filename: str
+    status: str
+    stage: Optional[str] = None
+    progress: Dict[str, Dict[str, Any]]
+    error: Optional[str] = None
+    document_id: Optional[uuid.UUID] = None
+    attempts: int
+    created_at: datetime
+    updated_at: datetime
+
 class QARequest(BaseModel):
     question: str
 
 class QAResponse(BaseModel):
-    answer: str 
\ No newline at end of file
+    answer: str 
+
+class QABatchRequest(BaseModel):
+    questions: List[str]
@@ -1,10 +1,12 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import db
 from app.services.qa_service import qa_service
 from app.services.auth_service import auth_service
-from app.api.pydantic_models import QARequest, QAResponse
+from app.api.pydantic_models import QARequest, QAResponse, QABatchRequest
 
 router = APIRouter()
 
@@ -21,4 +23,23 @@ async def qa_endpoint(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        ) 
\ No newline at end of file
+        ) 
+
+@router.post("/query/batch")
+async def qa_batch_endpoint(
+    request: QABatchRequest,
+    current_user = Depends(auth_service.get_current_user)
+):
+    try:
+        results = qa_service.get_answers_for_queries(request.questions, current_user.id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    async def stream():
+        async for result in results:
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -20,8 +20,41 @@ class Settings(BaseSettings):
 
     EMBEDDING_MODEL: str
     RERANKER_MODEL: str
-    MAX_TOKENS: int
+    MAX_TOKENS: int  # token budget of the context packed into the answer prompt
     TEMPERATURE: float
+    # Drop context chunks at least this cosine-similar to one already packed
+    CONTEXT_DEDUP_THRESHOLD: float = 0.95
+
+    # Inference executor: "thread" or "process"
+    INFERENCE_EXECUTOR: str = "thread"
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_MAX_QUEUE: int = 64
+    TORCH_NUM_THREADS: int = 0  # 0 keeps torch's default
+
+    # Embedding inference backend: "torch" or "onnx"
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_PATH: str = ".cache/onnx"
+    EMBEDDING_ONNX_QUANTIZE: bool = False
+
+    # Reranker batching and quantization
+    RERANKER_TOKEN_BUDGET: int = 8192
+    RERANKER_MAX_BATCH_SIZE: int = 32
+    RERANKER_QUANTIZE: bool = False
+
+    # Micro-batching of concurrent single-text (query) embeddings
+    EMBEDDING_MAX_BATCH_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0
+    # Max padded tokens (rows x longest row) per bulk embedding batch
+    EMBEDDING_TOKEN_BUDGET: int = 16384
+
+    # Persistent content-addressed cache of chunk embeddings
+    EMBEDDING_STORE_ENABLED: bool = True
+    EMBEDDING_STORE_PATH: str = ".cache/embeddings"
+    EMBEDDING_STORE_MAX_MB: int = 1024
+
+    # In-process LRU of question embeddings
+    QUERY_EMBEDDING_CACHE_TTL: int = 3600
+    QUERY_EMBEDDING_CACHE_MAX_MB: int = 64
 
     OPENAI_API_KEY: str
 
@@ -30,14 +63,78 @@ class Settings(BaseSettings):
     CHUNKING_STRATEGY: str
     CHUNK_SIZE: int
     CHUNK_OVERLAP: int
+    # Bulk write of document chunks: "copy" (binary COPY) or "executemany"
+    CHUNK_INSERT_METHOD: str = "copy"
+    CHUNK_INSERT_BATCH_SIZE: int = 1000
+
+    # Ingestion worker (python -m app.worker)
+    INGEST_WORKER_CONCURRENCY: int = 2  # jobs processed at once per worker process
+    INGEST_POLL_INTERVAL: float = 1.0  # seconds between polls of an empty queue
+    INGEST_JOB_TIMEOUT: int = 900  # seconds without progress before a job is requeued
+    INGEST_MAX_ATTEMPTS: int = 3
+    # Streaming ingestion pipeline
+    INGEST_EMBED_BATCH_SIZE: int = 64  # chunks per embedding and write batch
+    INGEST_QUEUE_SIZE: int = 4  # items buffered between pipeline stages
+    INGEST_CHUNK_WINDOW: int = 65536  # characters of text chunked at a time
+    # PDF text extraction
+    PDF_EXTRACT_WORKERS: int = 0  # processes extracting large PDFs; 0 uses every core
+    PDF_PARALLEL_MIN_PAGES: int = 64  # smaller PDFs are extracted in-process
+    PDF_PAGES_PER_TASK: int = 32
 
     TOP_K_DOCUMENTS: int
     SIMILARITY_THRESHOLD: float
     RERANKER_SCORE_THRESHOLD: float
+    # "ann": ORDER BY distance LIMIT TOP_K_DOCUMENTS, then threshold
+    # "threshold": every chunk within SIMILARITY_THRESHOLD (no LIMIT)
+    # "hybrid": ANN and full-text search merged with reciprocal rank fusion
+    RETRIEVAL_MODE: str = "ann"
+    # Candidates fetched for the reranker in ann and hybrid modes; the best
+    # TOP_K_DOCUMENTS of them are kept after reranking
+    RERANK_CANDIDATES: int = 50
+
+    # Hybrid retrieval
+    FTS_CONFIG: str = "english"  # text search configuration of the GIN index
+    HYBRID_VECTOR_WEIGHT: float = 1.0
+    HYBRID_LEXICAL_WEIGHT: float = 1.0
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATES: int = 0  # candidates per mode, 0 uses 2 x TOP_K_DOCUMENTS
+
+    # In-process exact vector index for users with few enabled chunks
+    USER_INDEX_CACHE_ENABLED: bool = True
+    USER_INDEX_CACHE_MAX_CHUNKS: int = 20000
+    USER_INDEX_CACHE_MAX_MB: int = 512
+
+    # Per-user plan: exact filtered scan up to this many enabled chunks, ANN above
+    RETRIEVAL_EXACT_MAX_CHUNKS: int = 10000
+    RETRIEVAL_STATS_TTL: int = 60  # seconds a worker caches a user's chunk count
+
+    # Vector index: "ivfflat" or "hnsw"
+    VECTOR_INDEX_TYPE: str = "ivfflat"
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40
+    # pgvector >= 0.8 iterative scans for filtered queries:
+    # "off", "relaxed_order" or "strict_order"
+    VECTOR_ITERATIVE_SCAN: str = "off"
+    # Background index maintenance (seconds between checks, 0 disables)
+    VECTOR_INDEX_MAINTENANCE_INTERVAL: int = 3600
+    VECTOR_INDEX_MIN_ROWS: int = 10000  # below this, IVFFlat is not retuned
+    VECTOR_INDEX_LISTS_TOLERANCE: float = 2.0  # rebuild when lists is off by this factor
+    VECTOR_INDEX_MAX_IMBALANCE: float = 4.0  # rebuild when the largest sampled list exceeds the mean by this factor
+    VECTOR_INDEX_IMBALANCE_SAMPLES: int = 8
+
+    # /rag/query/batch
+    QA_BATCH_MAX_QUESTIONS: int = 500
+    QA_BATCH_RETRIEVAL_CONCURRENCY: int = 8  # keep below DATABASE_POOL_SIZE
+    QA_BATCH_LLM_CONCURRENCY: int = 8
 
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     ALGORITHM: str
+    # JSON list of usernames allowed to call /admin endpoints
+    ADMIN_USERNAMES: str = "[]"
 
     LOG_LEVEL: str
     LOG_FORMAT: str
@@ -50,4 +147,8 @@ class Settings(BaseSettings):
     def supported_file_types(self) -> List[str]:
         return json.loads(self.SUPPORTED_FILE_TYPES)
 
+    @property
+    def admin_usernames(self) -> List[str]:
+        return json.loads(self.ADMIN_USERNAMES)
+
 settings = Settings() 
\ No newline at end of file
@@ -2,7 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
 from app.core.config import settings
-from sqlalchemy import text
+from sqlalchemy import text, event
 from app.core.logger import logger
 
 # Add detailed logging for database URL
@@ -10,6 +10,22 @@ logger.info(f"Attempting to create database engine with URL: {settings.DATABASE_
 engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+@event.listens_for(engine.sync_engine, "connect")
+def set_vector_search_defaults(dbapi_connection, connection_record):
+    """Apply the configured pgvector search parameters to every pooled connection."""
+    from app.db.optimizations import db_optimizations  # Import here to avoid circular import
+    # The driver would otherwise open a transaction for the SETs that the
+    # pool rolls back on checkin, undoing them
+    existing_autocommit = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in db_optimizations.vector_search_settings().items():
+            cursor.execute(f"SET {name} = '{value}'")
+    finally:
+        cursor.close()
+        dbapi_connection.autocommit = existing_autocommit
+
 class Database:
     async def init_db(self):
         from app.db.models import Base  # Import here to avoid circular import
@@ -27,6 +43,10 @@ class Database:
                 logger.info("Creating database tables...")
                 await conn.run_sync(Base.metadata.create_all)
                 logger.info("Database tables created successfully")
+                # Columns added after the tables were first created
+                await conn.execute(text("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS token_count INTEGER"))
+                await conn.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_hash VARCHAR"))
+                await conn.execute(text("ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS file_hash VARCHAR"))
         except Exception as e:
             logger.error(f"Error during database initialization: {str(e)}")
             logger.error(f"Database URL being used: {settings.DATABASE_URL}")
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, Float
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, Float, JSON
 from sqlalchemy.dialects.postgresql import UUID, BYTEA
 from pgvector.sqlalchemy import Vector
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 import uuid
 from datetime import datetime
 from .declarative_base import Base
@@ -22,6 +22,7 @@ class Document(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     content_hash = Column(String, nullable=False)
+    file_hash = Column(String)  # sha256 of the uploaded bytes
     created_at = Column(DateTime, default=datetime.utcnow)
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     users = relationship("UserDocument", back_populates="document")
@@ -34,6 +35,7 @@ class DocumentChunk(Base):
     chunk_index = Column(Integer, nullable=False)
     content = Column(String, nullable=False)
     embedding = Column(Vector(768))  # Using BAAI/bge-base-en-v1.5 dimensions
+    token_count = Column(Integer)  # Embedding-tokenizer tokens, counted at ingest
     created_at = Column(DateTime, default=datetime.utcnow)
     document = relationship("Document", back_populates="chunks")
 
@@ -46,4 +48,31 @@ class UserDocument(Base):
     enabled_for_qa = Column(Integer, default=0)  # 0: disabled, 1: enabled
     created_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="documents")
-    document = relationship("Document", back_populates="users") 
\ No newline at end of file
+    document = relationship("Document", back_populates="users") 
+
+class UserChunkStats(Base):
+    __tablename__ = "user_chunk_stats"
+
+    # Maintained on upload and toggle; read by the retrieval planner
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    enabled_chunks = Column(Integer, nullable=False, default=0)
+    total_chunks = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    stage = Column(String)  # stage being run while the job is running
+    progress = Column(JSON, default=dict)  # per-stage status, timings and counts
+    error = Column(String)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
+    attempts = Column(Integer, nullable=False, default=0)
+    file_hash = Column(String)  # sha256 of the payload
+    # Raw upload, loaded only by the worker and cleared once the job ends
+    payload = deferred(Column(BYTEA))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,11 +1,12 @@
-from sqlalchemy import text, select
+import re
+from sqlalchemy import text, select, literal_column
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.db.models import UserDocument, Document
 from app.core.exceptions import DatabaseError
 import redis
 import json
-from typing import List, Optional
+from typing import Dict, List, Optional
 import hashlib
 
 # Initialize Redis client for caching
@@ -16,23 +17,92 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+VECTOR_INDEX_NAMES = {
+    "ivfflat": "idx_document_chunks_embedding",
+    "hnsw": "idx_document_chunks_embedding_hnsw",
+}
+ITERATIVE_SCAN_MODES = ("off", "relaxed_order", "strict_order")
+
+def text_search_config():
+    """The full-text search configuration as a SQL constant.
+
+    It is inlined rather than bound so query expressions match the GIN index.
+    """
+    if not re.fullmatch(r"[a-z_]+", settings.FTS_CONFIG):
+        raise DatabaseError(f"Invalid full-text search configuration: {settings.FTS_CONFIG}")
+    return literal_column(f"'{settings.FTS_CONFIG}'::regconfig")
+
 class DatabaseOptimizations:
+    def vector_index_sql(self, lists: Optional[int] = None, concurrently: bool = False) -> str:
+        """CREATE INDEX statement for the configured vector index type"""
+        index_type = settings.VECTOR_INDEX_TYPE
+        if index_type == "hnsw":
+            options = f"m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)}"
+        elif index_type == "ivfflat":
+            options = f"lists = {int(lists or settings.IVFFLAT_LISTS)}"
+        else:
+            raise DatabaseError(f"Unsupported vector index type: {index_type}")
+        return f"""
+            CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {VECTOR_INDEX_NAMES[index_type]} 
+            ON document_chunks 
+            USING {index_type} (embedding vector_cosine_ops)
+            WITH ({options});
+        """
+
+    def vector_search_settings(self, probes: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, str]:
+        """pgvector GUCs for a search, using the configured defaults where not overridden"""
+        search_settings = {}
+        if settings.VECTOR_INDEX_TYPE == "hnsw":
+            search_settings["hnsw.ef_search"] = str(int(ef_search or settings.HNSW_EF_SEARCH))
+            scan_setting = "hnsw.iterative_scan"
+        else:
+            search_settings["ivfflat.probes"] = str(int(probes or settings.IVFFLAT_PROBES))
+            scan_setting = "ivfflat.iterative_scan"
+        if settings.VECTOR_ITERATIVE_SCAN != "off":
+            if settings.VECTOR_ITERATIVE_SCAN not in ITERATIVE_SCAN_MODES:
+                raise DatabaseError(f"Unsupported iterative scan mode: {settings.VECTOR_ITERATIVE_SCAN}")
+            # ivfflat only supports relaxed ordering
+            mode = settings.VECTOR_ITERATIVE_SCAN if scan_setting.startswith("hnsw") else "relaxed_order"
+            search_settings[scan_setting] = mode
+        return search_settings
+
+    async def apply_vector_search_params(self, session: AsyncSession, probes: Optional[int] = None, ef_search: Optional[int] = None):
+        """Override the search parameters for the current transaction only.
+
+        Pooled connections already carry the configured defaults (see
+        app.db.base), so this is a no-op unless a caller overrides them.
+        """
+        if probes is None and ef_search is None:
+            return
+        overrides = self.vector_search_settings(probes, ef_search)
+        assignments = ", ".join(f"set_config(:name_{i}, :value_{i}, true)" for i in range(len(overrides)))
+        params = {}
+        for i, (name, value) in enumerate(overrides.items()):
+            params[f"name_{i}"] = name
+            params[f"value_{i}"] = value
+        await session.execute(text(f"SELECT {assignments}"), params)
+
     async def create_optimized_indexes(self, session: AsyncSession):
         """Create optimized indexes for frequently queried columns"""
         try:
-            # Create IVFFlat index for vector similarity search
-            await session.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding 
-                ON document_chunks 
-                USING ivfflat (embedding vector_cosine_ops)
-                WITH (lists = 100);
-            """))
+            # Create the configured ANN index for vector similarity search and
+            # drop the other type so writes do not maintain two vector indexes
+            for index_type, index_name in VECTOR_INDEX_NAMES.items():
+                if index_type != settings.VECTOR_INDEX_TYPE:
+                    await session.execute(text(f"DROP INDEX IF EXISTS {index_name};"))
+            await session.execute(text(self.vector_index_sql()))
             
             # Create index for content hash lookups
             await session.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_documents_content_hash 
                 ON documents(content_hash);
             """))
+
+            # Create index for re-upload checks on the raw file hash
+            await session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_documents_file_hash
+                ON documents(file_hash);
+            """))
             
             # Create index for user document relationships
             await session.execute(text("""
@@ -40,6 +110,20 @@ class DatabaseOptimizations:
                 ON user_documents(user_id);
             """))
             
+            # Covering index for the enabled-documents semi-join in retrieval
+            await session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_user_documents_enabled 
+                ON user_documents(user_id, enabled_for_qa, document_id);
+            """))
+            
+            # Full-text index for the lexical side of hybrid retrieval; the
+            # expression must match the one built in the retriever
+            await session.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_document_chunks_content_fts 
+                ON document_chunks 
+                USING gin (to_tsvector({text_search_config().text}, content));
+            """))
+            
             # Create index for document chunks by document_id
             await session.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_document_chunks_document_id 
@@ -69,15 +153,39 @@ class DatabaseOptimizations:
 
     async def _get_cache_key(self, question: str, session: AsyncSession, user_id: Optional[str] = None) -> str:
         """Generate a unique cache key for a query that includes document state"""
+        docs_hash = await self._get_documents_hash(session, user_id) if user_id else None
+        return self._cache_key(question, user_id, docs_hash)
+
+    @staticmethod
+    def _cache_key(question: str, user_id: Optional[str], docs_hash: Optional[str]) -> str:
         key_parts = [question]
         if user_id:
             key_parts.append(str(user_id))  # Convert UUID to string
             # Add documents hash to make cache key unique per document state
-            docs_hash = await self._get_documents_hash(session, user_id)
             key_parts.append(docs_hash)
         
         return f"qa_cache:{hashlib.md5(''.join(key_parts).encode()).hexdigest()}"
 
+    async def get_cached_answers(self, questions: List[str], session: AsyncSession, user_id: Optional[str] = None) -> List[Optional[str]]:
+        """Get cached answers for many questions with one documents hash and one MGET"""
+        try:
+            docs_hash = await self._get_documents_hash(session, user_id) if user_id else None
+            keys = [self._cache_key(question, user_id, docs_hash) for question in questions]
+            return [json.loads(value) if value else None for value in redis_client.mget(keys)]
+        except Exception as e:
+            raise DatabaseError(f"Failed to get cached answers: {str(e)}")
+
+    async def cache_answers(self, answers: Dict[str, str], session: AsyncSession, user_id: Optional[str] = None, ttl: int = 3600):
+        """Cache many answers in one pipeline"""
+        try:
+            docs_hash = await self._get_documents_hash(session, user_id) if user_id else None
+            pipeline = redis_client.pipeline(transaction=False)
+            for question, answer in answers.items():
+                pipeline.setex(self._cache_key(question, user_id, docs_hash), ttl, json.dumps(answer))
+            pipeline.execute()
+        except Exception as e:
+            raise DatabaseError(f"Failed to cache answers: {str(e)}")
+
     async def get_cached_answer(self, question: str, session: AsyncSession, user_id: Optional[str] = None) -> Optional[str]:
         """Get cached answer for a question"""
         try:
@@ -100,16 +208,9 @@ class DatabaseOptimizations:
     async def optimize_vector_search(self, session: AsyncSession):
         """Optimize vector search performance"""
         try:
-            # Set the number of lists for IVFFlat index
-            await session.execute(text("""
-                ALTER INDEX idx_document_chunks_embedding 
-                SET (lists = 100);
-            """))
-            
-            # Set the number of probes for vector search
-            await session.execute(text("""
-                SET ivfflat.probes = 10;
-            """))
+            # Search parameters (probes / ef_search) are applied per connection
+            # and per transaction, not here: a SET in this startup session
+            # would never reach request sessions
             
             # Create a materialized view for frequently accessed documents
             await session.execute(text("""
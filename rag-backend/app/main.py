@@ -1,6 +1,7 @@
 from fastapi import FastAPI, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import time
 import logging
 from app.core.config import settings
@@ -9,6 +10,11 @@ from app.db.base import db
 from app.api.auth import router as auth_router
 from app.api.documents import router as documents_router
 from app.api.rag import router as rag_router
+from app.api.admin import router as admin_router
+from app.services.model_registry import model_registry
+from app.services.model_warmup import model_warmup
+from app.services.inference_executor import inference_executor
+from app.services.vector_index_manager import vector_index_manager
 from app.core.exception_handler import (
     app_exception_handler,
     sqlalchemy_exception_handler,
@@ -56,6 +62,7 @@ app.add_middleware(
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(documents_router, prefix="/documents", tags=["Documents"])
 app.include_router(rag_router, prefix="/rag", tags=["RAG"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 
 @app.on_event("startup")
 async def startup_event():
@@ -70,12 +77,25 @@ async def startup_event():
         await db.init_db()
         logger.info("Database initialized successfully")
         
+        # Models load in the background so liveness probes pass immediately
+        logger.info("Scheduling model warm-up...")
+        model_warmup.start()
+        
+        # Retunes the vector index as the corpus grows
+        vector_index_manager.start()
+        
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
         logger.error(f"Stack trace:", exc_info=True)
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await vector_index_manager.stop()
+    logger.info("Shutting down inference executor...")
+    inference_executor.shutdown()
+
 @app.get("/health", response_model=dict)
 async def health_check():
     """Health check endpoint that returns the status of the application."""
@@ -87,10 +107,8 @@ async def health_check():
             "version": "1.0.0",
             "app_name": settings.APP_NAME,
             "database": "connected",
-            "services": {
-                "embedding": "ready",
-                "reranker": "ready"
-            }
+            "services": dict(model_warmup.state),
+            "model_memory_bytes": model_registry.memory_report()["total_bytes"]
         }
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
@@ -100,4 +118,20 @@ async def health_check():
                 "status": "unhealthy",
                 "error": str(e)
             }
-        ) 
\ No newline at end of file
+        )
+
+@app.get("/ready", response_model=dict)
+async def readiness_check():
+    """Readiness endpoint that only succeeds once every model is loaded and warm."""
+    readiness = model_warmup.status()
+    if not readiness["ready"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=readiness
+        )
+    return readiness
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,19 @@
+def plan_length_buckets(lengths: list[int], token_budget: int, max_batch_size: int) -> list[list[int]]:
+    """Group indices into batches of similar length under a padded-token budget.
+
+    Indices are sorted by length, so the last item added to a batch is its
+    widest row and ``rows * width`` is the exact padded cost of the batch.
+    An item longer than the budget still gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    current = []
+    for idx in order:
+        width = lengths[idx]
+        if current and (len(current) >= max_batch_size or (len(current) + 1) * width > token_budget):
+            batches.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,159 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.model_registry import model_registry
+from app.core.logger import logger
+
+WORD = re.compile(r"\S+")
+# Shorter repeats between neighbouring chunks are treated as coincidence
+MIN_OVERLAP_WORDS = 3
+
+def overlap_end(left: str, right: str) -> int:
+    """Offset in ``right`` just past the longest prefix of it that ``left`` ends with.
+
+    Compared word by word, so differences in whitespace do not matter; 0
+    when the chunks do not overlap.
+    """
+    left_words = left.split()
+    right_matches = list(WORD.finditer(right))
+    if not left_words or not right_matches:
+        return 0
+    right_words = [match.group() for match in right_matches]
+    # Scan from the longest possible overlap down
+    for start in range(max(0, len(left_words) - len(right_words)), len(left_words)):
+        if left_words[start] != right_words[0]:
+            continue
+        length = len(left_words) - start
+        if left_words[start:] == right_words[:length]:
+            if length < MIN_OVERLAP_WORDS and length < len(right_words):
+                return 0
+            return right_matches[length - 1].end()
+    return 0
+
+class ContextPacker:
+    """Builds the answer context from ranked chunks under a token budget.
+
+    Chunks are taken greedily in rank order (rerank score, or retrieval order
+    when reranking was skipped); a chunk that does not fit the remaining
+    budget is skipped so a shorter, lower ranked one can still use the room.
+    Exact repeats and chunks whose embedding is at least ``dedup_threshold``
+    cosine-similar to an already packed chunk are dropped. Token counts and
+    embeddings stored at ingest are used when the chunks carry them, so
+    packing does not re-tokenize or re-embed anything.
+    """
+
+    def __init__(self, token_budget: int, dedup_threshold: float):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+
+    @property
+    def tokenizer(self):
+        # Only needed for chunks stored before token counts were recorded
+        return model_registry.get_tokenizer(settings.EMBEDDING_MODEL)
+
+    def _token_count(self, chunk: str) -> int:
+        token_count = getattr(chunk, "token_count", None)
+        if token_count is None:
+            token_count = len(self.tokenizer.encode(chunk, add_special_tokens=False))
+        return token_count
+
+    @staticmethod
+    def _unit_vector(chunk: str) -> Optional[np.ndarray]:
+        embedding = getattr(chunk, "embedding", None)
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    @staticmethod
+    def stitch(chunks: Sequence[str]) -> List[str]:
+        """Merge chunks with consecutive indexes in one document into single spans.
+
+        Text a chunk repeats from its predecessor (``CHUNKING_STRATEGY=overlap``)
+        is kept once. Spans are ordered by their best ranked chunk; chunks
+        without a document position are passed through.
+        """
+        spans: List[Tuple[int, str]] = []
+        by_document: Dict[object, List[Tuple[int, int, str]]] = {}
+        for rank, chunk in enumerate(chunks):
+            document_id = getattr(chunk, "document_id", None)
+            chunk_index = getattr(chunk, "chunk_index", None)
+            if document_id is None or chunk_index is None:
+                spans.append((rank, chunk))
+            else:
+                by_document.setdefault(document_id, []).append((chunk_index, rank, chunk))
+
+        removed = 0
+        for document_chunks in by_document.values():
+            document_chunks.sort(key=lambda item: item[0])
+            previous_index, span_rank, span = document_chunks[0]
+            for chunk_index, rank, chunk in document_chunks[1:]:
+                if chunk_index == previous_index + 1:
+                    end = overlap_end(span, chunk)
+                    removed += end
+                    rest = chunk[end:].lstrip()
+                    span = f"{span} {rest}" if rest else span
+                    span_rank = min(span_rank, rank)
+                else:
+                    spans.append((span_rank, span))
+                    span_rank, span = rank, chunk
+                previous_index = chunk_index
+            spans.append((span_rank, span))
+
+        spans.sort(key=lambda item: item[0])
+        if len(spans) < len(chunks):
+            logger.info(f"Stitched {len(chunks)} chunks into {len(spans)} spans, dropping {removed} repeated characters")
+        return [span for _, span in spans]
+
+    def assemble(self, chunks: Sequence[str]) -> List[str]:
+        """Pack ranked chunks under the budget, then stitch neighbours together."""
+        return self.stitch(self.pack(chunks))
+
+    def pack(self, chunks: Sequence[str], token_budget: Optional[int] = None) -> List[str]:
+        budget = self.token_budget if token_budget is None else token_budget
+        packed: List[str] = []
+        seen_texts = set()
+        packed_vectors: List[np.ndarray] = []
+        used = 0
+        skipped_duplicates = 0
+        skipped_budget = 0
+
+        for chunk in chunks:
+            if chunk in seen_texts:
+                skipped_duplicates += 1
+                continue
+            vector = self._unit_vector(chunk)
+            if vector is not None and packed_vectors:
+                if float(np.max(np.stack(packed_vectors) @ vector)) >= self.dedup_threshold:
+                    skipped_duplicates += 1
+                    continue
+
+            token_count = self._token_count(chunk)
+            if used + token_count > budget:
+                skipped_budget += 1
+                continue
+
+            packed.append(chunk)
+            seen_texts.add(chunk)
+            if vector is not None:
+                packed_vectors.append(vector)
+            used += token_count
+
+        if not packed and chunks:
+            # Better an over-long context than none; the best chunk still goes in
+            logger.warning(f"No chunk fits the {budget} token context budget, using the top chunk alone")
+            packed = [chunks[0]]
+            used = self._token_count(chunks[0])
+
+        logger.info(
+            f"Packed {len(packed)} chunks into {used}/{budget} context tokens "
+            f"({skipped_duplicates} near-duplicates, {skipped_budget} over budget skipped)"
+        )
+        return packed
+
+context_packer = ContextPacker(
+    token_budget=settings.MAX_TOKENS,
+    dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD
+)
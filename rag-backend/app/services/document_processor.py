@@ -1,70 +1,209 @@
-from transformers import AutoTokenizer
 from app.core.config import settings
-import fitz  # PyMuPDF
-import os
+from app.services.model_registry import model_registry
+from app.services.pdf_extractor import pdf_extractor
+import io
 from docx import Document
-from fastapi import UploadFile
-import hashlib
+import re
+from typing import BinaryIO, Iterator, Optional, Union
+
+# Sentences end at ". " (the boundary default chunking has always used)
+SENTENCE_BOUNDARY = re.compile(r"\. ")
+PARAGRAPH_BOUNDARY = re.compile(r"\n")
+# Longest run of tokens searched backwards for the start of a word
+MAX_WORD_TOKENS = 32
+# Characters of plain text decoded per extracted piece
+TEXT_BLOCK_SIZE = 65536
 
 class DocumentProcessor:
-    def __init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+    @property
+    def tokenizer(self):
+        # Resolved lazily so importing the module does not load the tokenizer
+        return model_registry.get_tokenizer(settings.EMBEDDING_MODEL)
 
-    def compute_hash(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    def extract_pages(self, content: Union[bytes, BinaryIO], file_ext: str) -> Iterator[str]:
+        """Yield the document's text piece by piece (PDF pages, DOCX paragraphs,
+        blocks of lines of plain text) from bytes or a binary file object.
 
-    async def extract_text(self, file: UploadFile, file_ext: str) -> str:
-        content = await file.read()
+        Joined with newlines the pieces are exactly the extracted text.
+        """
         if file_ext in ["txt", "md"]:
-            return content.decode("utf-8")
+            stream = io.BytesIO(content) if isinstance(content, bytes) else content
+            yield from self._text_blocks(stream)
         elif file_ext == "pdf":
-            with fitz.open(stream=content, filetype="pdf") as doc:
-                return "\n".join([page.get_text() for page in doc])
+            # PyMuPDF needs random access to the whole file
+            if not isinstance(content, bytes):
+                content = content.read()
+            yield from pdf_extractor.pages(content)
         elif file_ext == "docx":
-            with open("temp.docx", "wb") as temp:
-                temp.write(content)
-            doc = Document("temp.docx")
-            text = "\n".join([para.text for para in doc.paragraphs])
-            os.remove("temp.docx")
-            return text
+            # Read from memory: a shared temp file breaks concurrent ingestion
+            doc = Document(io.BytesIO(content) if isinstance(content, bytes) else content)
+            for para in doc.paragraphs:
+                yield para.text
         else:
             raise ValueError("Unsupported file format")
 
-    def chunk_text_default(self, text: str, max_tokens: int = 512):
-        sentences = text.split(". ")
-        chunks = []
-        current_chunk = []
-
-        for sentence in sentences:
-            tentative = " ".join(current_chunk + [sentence])
-            token_count = len(self.tokenizer.encode(tentative, add_special_tokens=False))
-            if token_count <= max_tokens:
-                current_chunk.append(sentence)
-            else:
-                if current_chunk:
-                    chunks.append(" ".join(current_chunk))
-                current_chunk = [sentence]
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
-
-    def chunk_text_overlap(self, text: str, max_tokens: int = 512, overlap: int = 128):
-        words = text.split()
-        step = max_tokens - overlap
-        chunks = []
-        for i in range(0, len(words), step):
-            chunk = words[i:i + max_tokens]
-            chunks.append(" ".join(chunk))
-        return chunks
-
-    def get_chunks(self, text: str) -> list[str]:
-        if settings.CHUNKING_STRATEGY == "overlap":
-            return self.chunk_text_overlap(text)
-        elif settings.CHUNKING_STRATEGY == "paragraph":
-            return [p for p in text.split("\n") if p.strip()]
+    def _text_blocks(self, stream: BinaryIO) -> Iterator[str]:
+        # Decodes a block at a time and splits after the last newline, so
+        # the blocks joined with newlines reproduce the text exactly
+        reader = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        try:
+            buffer = ""
+            while True:
+                block = reader.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                buffer += block
+                cut = buffer.rfind("\n")
+                if cut >= 0:
+                    yield buffer[:cut]
+                    buffer = buffer[cut + 1:]
+            yield buffer
+        finally:
+            # Leave the caller's file open
+            reader.detach()
+
+    def _token_offsets(self, text: str) -> list[tuple[int, int]]:
+        # The whole document goes through the fast tokenizer once; the offset
+        # mapping ties every token back to its characters, so chunk text is
+        # sliced from the document instead of re-tokenized
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return encoding["offset_mapping"]
+
+    @staticmethod
+    def _segment_bounds(text: str, offsets: list[tuple[int, int]], boundary: re.Pattern) -> list[int]:
+        """Index of the first token of every segment, followed by the token count."""
+        bounds = [0]
+        token = 0
+        for match in boundary.finditer(text):
+            while token < len(offsets) and offsets[token][0] < match.end():
+                token += 1
+            if token > bounds[-1]:
+                bounds.append(token)
+        if len(offsets) > bounds[-1]:
+            bounds.append(len(offsets))
+        return bounds
+
+    @staticmethod
+    def _word_start(offsets: list[tuple[int, int]], index: int, floor: int) -> int:
+        # Nearest token at or before index (and after floor) that starts a
+        # word, so chunks do not begin or end in the middle of one
+        candidate = index
+        while candidate > floor and candidate > index - MAX_WORD_TOKENS:
+            if offsets[candidate][0] != offsets[candidate - 1][1]:
+                return candidate
+            candidate -= 1
+        return index
+
+    @classmethod
+    def _windows(cls, offsets: list[tuple[int, int]], start: int, stop: int, size: int, overlap: int) -> list[tuple[int, int]]:
+        """Token ranges of at most ``size`` tokens over [start, stop), ``overlap`` tokens apart."""
+        ranges = []
+        while start < stop:
+            end = min(start + size, stop)
+            if end < stop:
+                end = cls._word_start(offsets, end, start)
+            ranges.append((start, end))
+            if end == stop:
+                break
+            start = cls._word_start(offsets, max(end - overlap, start + 1), start)
+        return ranges
+
+    @classmethod
+    def _pack_segments(
+        cls, offsets: list[tuple[int, int]], bounds: list[int], max_tokens: int, split_first: bool = False
+    ) -> list[tuple[int, int, bool]]:
+        """Greedily fill chunks of at most ``max_tokens`` tokens with whole segments.
+
+        Ranges are flagged when they are windows of a segment longer than a
+        chunk. ``split_first`` marks the first segment as the rest of such a
+        segment, so it is windowed on its own rather than packed with the next.
+        """
+        ranges = []
+        start = 0
+        for index, (segment_start, segment_end) in enumerate(zip(bounds, bounds[1:])):
+            if segment_end - start > max_tokens and segment_start > start:
+                ranges.append((start, segment_start, False))
+                start = segment_start
+            if segment_end - start > max_tokens or (index == 0 and split_first):
+                # A single segment longer than a chunk is split by token position
+                windows = cls._windows(offsets, start, segment_end, max_tokens, 0)
+                ranges.extend((window_start, window_end, True) for window_start, window_end in windows)
+                start = segment_end
+        if start < len(offsets):
+            ranges.append((start, len(offsets), False))
+        return ranges
+
+    def _chunk(self, text: str, strategy: str, max_tokens: int, overlap: int) -> tuple[list[str], list[int]]:
+        spans = self._chunk_spans(text, strategy, max_tokens, overlap)
+        return [text[start:end] for start, end, _, _ in spans], [token_count for _, _, token_count, _ in spans]
+
+    def _chunk_spans(
+        self, text: str, strategy: str, max_tokens: int, overlap: int, split_first: bool = False
+    ) -> list[tuple[int, int, int, bool]]:
+        """(start character, end character, token count, split) of every chunk.
+
+        ``split`` and ``split_first`` only apply to the default strategy,
+        see _pack_segments.
+        """
+        offsets = self._token_offsets(text)
+        if strategy == "overlap":
+            ranges = [(start, end, False) for start, end in self._windows(offsets, 0, len(offsets), max_tokens, overlap)]
+        elif strategy == "paragraph":
+            bounds = self._segment_bounds(text, offsets, PARAGRAPH_BOUNDARY)
+            ranges = [
+                (window_start, window_end, False)
+                for segment_start, segment_end in zip(bounds, bounds[1:])
+                for window_start, window_end in self._windows(offsets, segment_start, segment_end, max_tokens, 0)
+            ]
         else:
-            return self.chunk_text_default(text)
+            bounds = self._segment_bounds(text, offsets, SENTENCE_BOUNDARY)
+            ranges = self._pack_segments(offsets, bounds, max_tokens, split_first)
+        return [(offsets[start][0], offsets[end - 1][1], end - start, split) for start, end, split in ranges]
+
+    def incremental_chunker(self) -> "IncrementalChunker":
+        return IncrementalChunker(self, settings.CHUNKING_STRATEGY, 512, 128, settings.INGEST_CHUNK_WINDOW)
+
+class IncrementalChunker:
+    """Chunks a document that arrives piece by piece, e.g. page by page.
+
+    Text is buffered until ``window`` characters are available and then
+    chunked; every chunk but the last is final, and the text of the last is
+    carried over into the next window, since more text may still extend it.
+    When that chunk is a window of an over-long sentence, the carried text
+    is windowed on its own again instead of being packed with the sentences
+    after it. The chunks therefore match chunking the whole text at once,
+    while at most one window is held and re-tokenization is limited to one
+    chunk per window.
+    """
+
+    def __init__(self, processor: DocumentProcessor, strategy: str, max_tokens: int, overlap: int, window: int):
+        self.processor = processor
+        self.strategy = strategy
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.window = window
+        self._buffer: Optional[str] = None
+        # The buffer starts with the rest of a sentence split into windows
+        self._split_first = False
+
+    def feed(self, text: str) -> list[tuple[str, int]]:
+        """Add the next piece (joined with a newline) and return the chunks it completed."""
+        self._buffer = text if self._buffer is None else f"{self._buffer}\n{text}"
+        if len(self._buffer) < self.window:
+            return []
+        return self._drain(final=False)
+
+    def finish(self) -> list[tuple[str, int]]:
+        """Return the remaining chunks once the whole document has been fed."""
+        return self._drain(final=True) if self._buffer is not None else []
+
+    def _drain(self, final: bool) -> list[tuple[str, int]]:
+        buffer = self._buffer
+        spans = self.processor._chunk_spans(buffer, self.strategy, self.max_tokens, self.overlap, self._split_first)
+        if not final and spans:
+            self._buffer = buffer[spans[-1][0]:]
+            self._split_first = spans[-1][3]
+            spans = spans[:-1]
+        return [(buffer[start:end], token_count) for start, end, token_count, _ in spans]
 
 document_processor = DocumentProcessor() 
\ No newline at end of file
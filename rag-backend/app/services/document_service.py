@@ -1,35 +1,33 @@
+import hashlib
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
 from fastapi import UploadFile
 from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-import fitz  # PyMuPDF
-import hashlib
-from transformers import AutoTokenizer
-import os
-from docx import Document
 from app.core.config import settings
+from app.core.logger import logger
+from app.db.base import async_session
 from app.db.models import Document, UserDocument, DocumentChunk
-from app.services.embedding_service import embedding_service
-from app.services.document_processor import document_processor
 from app.services.document_storage import document_storage
+from app.services.user_index_cache import user_index_cache
+from app.services.retrieval_planner import retrieval_planner
+from app.services.ingestion_queue import ingestion_queue
+from app.services.ingestion_pipeline import IngestionPipeline, JOB_STAGES
 from app.core.exceptions import (
+    AppException,
     ValidationError,
     ConflictError,
     DatabaseError,
-    FileError,
     NotFoundError
 )
-from typing import List
-
-class DocumentService:
-    def __init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+from typing import List, Optional
 
-    def compute_hash(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+# Bytes read from an upload at a time while validating and hashing it
+UPLOAD_BLOCK_SIZE = 1024 * 1024
 
-    async def process_and_store_document(self, file: UploadFile, session: AsyncSession, current_user):
+class DocumentService:
+    async def submit_document(self, file: UploadFile, session: AsyncSession, current_user):
+        """Validate an upload, persist it as an ingestion job and queue it for the worker."""
         try:
             # Validate file
             if not file.filename:
@@ -39,111 +37,144 @@ class DocumentService:
             if file_ext not in settings.supported_file_types:
                 raise ValidationError(f"Unsupported file type. Supported types: {', '.join(settings.supported_file_types)}")
             
-            # Check file size
-            file_size = 0
-            for chunk in file.file:
-                file_size += len(chunk)
-                if file_size > settings.MAX_DOCUMENT_SIZE:
-                    raise ValidationError(f"File size exceeds maximum limit of {settings.MAX_DOCUMENT_SIZE} bytes")
-            await file.seek(0)  # Reset file pointer
-            
-            # Extract text from document
+            # Read, size-check and hash the upload in one pass
+            content, file_hash = await self._read_upload(file)
+            file_size = len(content)
+
+            # Exact re-uploads are rejected before any extraction or embedding
             try:
-                raw_text = await document_processor.extract_text(file, file_ext)
+                duplicate = await document_storage.check_duplicate_file(file_hash, current_user.id, session)
             except Exception as e:
-                raise FileError(f"Error extracting text from document: {str(e)}")
-                
-            content_hash = document_processor.compute_hash(raw_text)
-
-            # Check for duplicates
-            if await document_storage.check_duplicate_document(content_hash, current_user.id, session):
+                raise DatabaseError(f"Error checking for duplicate documents: {str(e)}")
+            if duplicate:
                 raise ConflictError("This document has already been uploaded")
 
-            # Get chunks from text
+            # Persist the raw file with the job so any worker can pick it up
             try:
-                chunks = document_processor.get_chunks(raw_text)
-                if not chunks:
-                    raise ValidationError("Document is empty or could not be processed")
+                progress = {stage: {"status": "pending"} for stage in JOB_STAGES}
+                job_id = await document_storage.create_ingestion_job(
+                    current_user.id, file.filename, content, progress, session, file_hash=file_hash
+                )
+                await session.commit()
             except Exception as e:
-                raise FileError(f"Error processing document chunks: {str(e)}")
+                raise DatabaseError(f"Error creating ingestion job: {str(e)}")
 
-            # Get embeddings for chunks
             try:
-                embeddings = await embedding_service.embed_texts(chunks)
+                ingestion_queue.enqueue(current_user.id, job_id)
             except Exception as e:
-                raise DatabaseError(f"Error generating embeddings: {str(e)}")
+                # The job is stored; the worker's stale-job sweep queues it later
+                logger.error(f"Failed to queue ingestion job {job_id}: {str(e)}")
 
-            # Store document and get document_id
-            try:
-                document_id = await document_storage.store_document(file.filename, content_hash, session)
-            except Exception as e:
-                raise DatabaseError(f"Error storing document: {str(e)}")
+            logger.info(f"Queued ingestion job {job_id} for {file.filename} ({file_size} bytes)")
+            return {"job_id": job_id, "status": "queued"}
 
-            # Create user-document relationship
-            try:
-                await document_storage.create_user_document_relationship(current_user.id, document_id, session)
-            except Exception as e:
-                raise DatabaseError(f"Error creating document relationship: {str(e)}")
+        except (ValidationError, ConflictError, DatabaseError):
+            raise
+        except Exception as e:
+            raise DatabaseError(f"Unexpected error submitting document: {str(e)}")
+
+    async def _read_upload(self, file: UploadFile) -> tuple:
+        """Read the upload in fixed-size blocks, enforcing MAX_DOCUMENT_SIZE; returns (bytes, sha256)."""
+        limit_error = ValidationError(f"File size exceeds maximum limit of {settings.MAX_DOCUMENT_SIZE} bytes")
+        if file.size is not None and file.size > settings.MAX_DOCUMENT_SIZE:
+            raise limit_error
+        await file.seek(0)
+        digest = hashlib.sha256()
+        blocks, size = [], 0
+        while True:
+            block = await file.read(UPLOAD_BLOCK_SIZE)
+            if not block:
+                break
+            size += len(block)
+            if size > settings.MAX_DOCUMENT_SIZE:
+                raise limit_error
+            digest.update(block)
+            blocks.append(block)
+        return b"".join(blocks), digest.hexdigest()
+
+    async def get_ingestion_job(self, job_id: str, session: AsyncSession, user_id: str) -> dict:
+        try:
+            job = await document_storage.get_ingestion_job(job_id, user_id, session)
+        except Exception as e:
+            raise DatabaseError(f"Error fetching ingestion job: {str(e)}")
+        if job is None:
+            raise NotFoundError("Ingestion job not found")
+        return {
+            "job_id": job.id,
+            "filename": job.filename,
+            "status": job.status,
+            "stage": job.stage,
+            "progress": job.progress,
+            "error": job.error,
+            "document_id": job.document_id,
+            "attempts": job.attempts,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+        }
+
+    async def ingest_job(self, job_id: str) -> bool:
+        """Run a queued job to completion; False if another worker already has it.
+
+        Stage progress is committed as the job advances so it can be polled.
+        The stages stream into each other (see IngestionPipeline) and every
+        document write happens in the pipeline's one transaction.
+        """
+        async with async_session() as session:
+            job = await document_storage.claim_ingestion_job(job_id, session)
+            await session.commit()
+        if job is None:
+            return False
 
-            # Store chunks with embeddings
-            try:
-                await document_storage.store_chunks(document_id, chunks, embeddings, session)
-            except Exception as e:
-                raise DatabaseError(f"Error storing document chunks: {str(e)}")
+        progress = dict(job.progress or {})
+        try:
+            document_id, chunk_count = await self._ingest(
+                job_id, job.user_id, job.filename, job.payload, progress, job.file_hash
+            )
+        except Exception as e:
+            error = e.detail if isinstance(e, AppException) else str(e)
+            logger.error(f"Ingestion job {job_id} failed: {error}")
+            await self._update_job(job_id, status="failed", error=error, progress=progress, payload=None)
+            return True
+
+        await self._update_job(
+            job_id, status="completed", stage=None, document_id=document_id, progress=progress, payload=None
+        )
+        logger.info(f"Ingestion job {job_id} stored {chunk_count} chunks as document {document_id}")
+        return True
+
+    async def _ingest(
+        self, job_id: str, user_id: str, filename: str, content: bytes, progress: dict, file_hash: Optional[str] = None
+    ):
+        async def report(stage: str, progress: dict):
+            await self._update_job(job_id, stage=stage, progress=progress)
+
+        pipeline = IngestionPipeline(user_id, filename, content, progress, on_progress=report, file_hash=file_hash)
+        document_id, chunk_count = await pipeline.run()
+
+        user_index_cache.invalidate(user_id)
+        retrieval_planner.invalidate(user_id)
+        return document_id, chunk_count
+
+    async def _update_job(self, job_id: str, **values):
+        # Progress goes through its own short session so pollers see it at once
+        try:
+            async with async_session() as session:
+                await document_storage.update_ingestion_job(job_id, session, **values)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to update ingestion job {job_id}: {str(e)}")
 
+    async def requeue_stale_jobs(self) -> int:
+        """Queue again jobs whose worker died or whose queue entry was lost."""
+        older_than = datetime.utcnow() - timedelta(seconds=settings.INGEST_JOB_TIMEOUT)
+        async with async_session() as session:
+            stale = await document_storage.requeue_stale_ingestion_jobs(older_than, settings.INGEST_MAX_ATTEMPTS, session)
             await session.commit()
-            return {"document_id": document_id, "chunks": len(chunks)}
-            
-        except (ValidationError, ConflictError, FileError, DatabaseError):
-            raise
-        except Exception as e:
-            raise DatabaseError(f"Unexpected error processing document: {str(e)}")
-
-    async def extract_text(self, file: UploadFile, file_ext: str) -> str:
-        content = await file.read()
-        if file_ext in ["txt", "md"]:
-            return content.decode("utf-8")
-        elif file_ext == "pdf":
-            with fitz.open(stream=content, filetype="pdf") as doc:
-                return "\n".join([page.get_text() for page in doc])
-        elif file_ext == "docx":
-            with open("temp.docx", "wb") as temp:
-                temp.write(content)
-            doc = Document("temp.docx")
-            text = "\n".join([para.text for para in doc.paragraphs])
-            os.remove("temp.docx")
-            return text
-        else:
-            raise ValueError("Unsupported file format")
-
-    def chunk_text_default(self, text: str, max_tokens: int = 512):
-        sentences = text.split(". ")
-        chunks = []
-        current_chunk = []
-
-        for sentence in sentences:
-            tentative = " ".join(current_chunk + [sentence])
-            token_count = len(self.tokenizer.encode(tentative, add_special_tokens=False))
-            if token_count <= max_tokens:
-                current_chunk.append(sentence)
-            else:
-                if current_chunk:
-                    chunks.append(" ".join(current_chunk))
-                current_chunk = [sentence]
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
-
-    def chunk_text_overlap(self, text: str, max_tokens: int = 512, overlap: int = 128):
-        words = text.split()
-        step = max_tokens - overlap
-        chunks = []
-        for i in range(0, len(words), step):
-            chunk = words[i:i + max_tokens]
-            chunks.append(" ".join(chunk))
-        return chunks
+        # Jobs still waiting in the queue are not queued again
+        requeued = sum(1 for job_id, user_id in stale if ingestion_queue.enqueue(user_id, job_id))
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale ingestion jobs")
+        return requeued
 
     async def get_user_documents(self, session: AsyncSession, user_id: str) -> List[Document]:
         try:
@@ -183,10 +214,17 @@ class DocumentService:
                 raise ValidationError("One or more documents do not belong to the user")
                 
             # Toggle QA status
+            chunk_counts = await document_storage.get_document_chunk_counts(document_ids, session)
+            enabled_delta = 0
             for user_doc in user_documents:
                 user_doc.enabled_for_qa = 1 if user_doc.enabled_for_qa == 0 else 0
+                count = chunk_counts.get(str(user_doc.document_id), 0)
+                enabled_delta += count if user_doc.enabled_for_qa == 1 else -count
+            await document_storage.adjust_user_chunk_stats(user_id, enabled_delta, 0, session)
                 
             await session.commit()
+            user_index_cache.invalidate(user_id)
+            retrieval_planner.invalidate(user_id)
             return {"message": "Document QA status updated successfully"}
             
         except ValidationError:
@@ -1,9 +1,25 @@
+import time
 from uuid import uuid4
 from datetime import datetime
-from sqlalchemy import insert, select, update
+from typing import Dict, Optional
+from sqlalchemy import insert, select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
-from app.db.models import Document, UserDocument, DocumentChunk
+from pgvector import Vector
+from app.core.config import settings
+from app.db.models import Document, UserDocument, DocumentChunk, UserChunkStats, IngestionJob
+from app.core.logger import logger
+
+CHUNK_COLUMNS = ["id", "document_id", "chunk_index", "content", "embedding", "token_count", "created_at"]
+
+def _encode_vector(value) -> bytes:
+    # SQLAlchemy's vector type binds values in their text form
+    if isinstance(value, str):
+        value = Vector.from_text(value)
+    elif not isinstance(value, Vector):
+        value = Vector(value)
+    return value.to_binary()
 
 class DocumentStorage:
     async def check_duplicate_document(self, content_hash: str, user_id: str, session: AsyncSession) -> bool:
@@ -15,18 +31,46 @@ class DocumentStorage:
         )
         return existing_doc.scalars().first() is not None
 
-    async def store_document(self, filename: str, content_hash: str, session: AsyncSession) -> str:
+    async def check_duplicate_file(self, file_hash: str, user_id: str, session: AsyncSession) -> bool:
+        """Whether the user already has a document, or a pending job, with these exact bytes."""
+        existing_doc = await session.execute(
+            select(Document.id)
+            .join(UserDocument, Document.id == UserDocument.document_id)
+            .where(UserDocument.user_id == user_id)
+            .where(Document.file_hash == file_hash)
+            .limit(1)
+        )
+        if existing_doc.first() is not None:
+            return True
+        pending_job = await session.execute(
+            select(IngestionJob.id)
+            .where(IngestionJob.user_id == user_id)
+            .where(IngestionJob.file_hash == file_hash)
+            .where(IngestionJob.status.in_(["queued", "running"]))
+            .limit(1)
+        )
+        return pending_job.first() is not None
+
+    async def store_document(
+        self, filename: str, content_hash: str, session: AsyncSession, file_hash: Optional[str] = None
+    ) -> str:
         document_id = uuid4()
         await session.execute(
             insert(Document).values(
                 id=document_id,
                 name=filename,
                 content_hash=content_hash,
+                file_hash=file_hash,
                 created_at=datetime.utcnow(),
             )
         )
         return document_id
 
+    async def set_document_hash(self, document_id: str, content_hash: str, session: AsyncSession):
+        await session.execute(
+            update(Document).where(Document.id == document_id).values(content_hash=content_hash)
+        )
+
     async def create_user_document_relationship(self, user_id: str, document_id: str, session: AsyncSession):
         await session.execute(
             insert(UserDocument).values(
@@ -38,18 +82,143 @@ class DocumentStorage:
             )
         )
 
-    async def store_chunks(self, document_id: str, chunks: list[str], embeddings: list[list[float]], session: AsyncSession):
-        for idx, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-            await session.execute(
-                insert(DocumentChunk).values(
-                    id=uuid4(),
-                    document_id=document_id,
-                    chunk_index=idx,
-                    content=chunk,
-                    embedding=vector,
-                    created_at=datetime.utcnow(),
-                )
+    async def store_chunks(
+        self,
+        document_id: str,
+        chunks: list[str],
+        embeddings: list[list[float]],
+        session: AsyncSession,
+        token_counts: Optional[list[int]] = None,
+        first_index: int = 0
+    ):
+        """Write chunks of a document in bulk, inside the session's transaction.
+
+        ``first_index`` is the chunk index of the first chunk, for documents
+        stored batch by batch.
+        """
+        token_counts = token_counts or [None] * len(chunks)
+        created_at = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid4(),
+                "document_id": document_id,
+                "chunk_index": first_index + idx,
+                "content": chunk,
+                "embedding": vector,
+                "token_count": token_count,
+                "created_at": created_at,
+            }
+            for idx, (chunk, vector, token_count) in enumerate(zip(chunks, embeddings, token_counts))
+        ]
+        if not rows:
+            return
+
+        started = time.perf_counter()
+        method = "executemany"
+        if settings.CHUNK_INSERT_METHOD == "copy" and await self._copy_chunks(rows, session):
+            method = "copy"
+        else:
+            batch_size = max(1, settings.CHUNK_INSERT_BATCH_SIZE)
+            for start in range(0, len(rows), batch_size):
+                await session.execute(insert(DocumentChunk), rows[start:start + batch_size])
+        duration = time.perf_counter() - started
+        logger.info(
+            f"Stored {len(rows)} chunks via {method} in {duration:.3f}s "
+            f"({len(rows) / max(duration, 1e-9):.0f} rows/s)"
+        )
+
+    async def _copy_chunks(self, rows: list[dict], session: AsyncSession) -> bool:
+        # Binary COPY on the session's own connection, so the rows commit or
+        # roll back with the rest of the upload. Returns False when COPY is
+        # not possible and the caller should fall back to executemany.
+        await session.flush()
+        connection = await session.connection()
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        if not hasattr(driver_connection, "copy_records_to_table") or not driver_connection.is_in_transaction():
+            # COPY outside a transaction would commit on its own
+            return False
+
+        # COPY needs pgvector's binary format. The codec is registered once
+        # per connection and kept, so later batches skip the type lookup;
+        # queries through SQLAlchemy keep working, as the encoder also takes
+        # the text form the vector type binds and its results accept Vector
+        if not connection.info.get("vector_codec"):
+            await driver_connection.set_type_codec(
+                "vector",
+                schema="public",
+                encoder=_encode_vector,
+                decoder=Vector.from_binary,
+                format="binary"
             )
+            connection.info["vector_codec"] = True
+        batch_size = max(1, settings.CHUNK_INSERT_BATCH_SIZE)
+        for start in range(0, len(rows), batch_size):
+            await driver_connection.copy_records_to_table(
+                DocumentChunk.__tablename__,
+                records=[tuple(row[column] for column in CHUNK_COLUMNS) for row in rows[start:start + batch_size]],
+                columns=CHUNK_COLUMNS
+            )
+        return True
+
+    async def get_document_chunk_counts(self, document_ids: list, session: AsyncSession) -> Dict[str, int]:
+        result = await session.execute(
+            select(DocumentChunk.document_id, func.count())
+            .where(DocumentChunk.document_id.in_(document_ids))
+            .group_by(DocumentChunk.document_id)
+        )
+        return {str(document_id): count for document_id, count in result.all()}
+
+    async def count_user_chunks(self, user_id: str, session: AsyncSession):
+        """Enabled and total chunk counts for a user, counted from scratch."""
+        result = await session.execute(
+            select(
+                func.count().filter(UserDocument.enabled_for_qa == 1),
+                func.count()
+            )
+            .select_from(DocumentChunk)
+            .join(UserDocument, UserDocument.document_id == DocumentChunk.document_id)
+            .where(UserDocument.user_id == user_id)
+        )
+        return result.one()
+
+    async def adjust_user_chunk_stats(self, user_id: str, enabled_delta: int, total_delta: int, session: AsyncSession):
+        """Apply chunk count changes made in the current transaction to the user's stats."""
+        result = await session.execute(
+            update(UserChunkStats)
+            .where(UserChunkStats.user_id == user_id)
+            .values(
+                enabled_chunks=UserChunkStats.enabled_chunks + enabled_delta,
+                total_chunks=UserChunkStats.total_chunks + total_delta,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        if result.rowcount == 0:
+            # First change for this user: the recount already includes it
+            await self.refresh_user_chunk_stats(user_id, session)
+
+    async def refresh_user_chunk_stats(self, user_id: str, session: AsyncSession):
+        """Recount the user's chunks into their stats row."""
+        enabled_chunks, total_chunks = await self.count_user_chunks(user_id, session)
+        statement = pg_insert(UserChunkStats).values(
+            user_id=user_id,
+            enabled_chunks=enabled_chunks,
+            total_chunks=total_chunks,
+            updated_at=datetime.utcnow(),
+        )
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[UserChunkStats.user_id],
+            set_={
+                "enabled_chunks": statement.excluded.enabled_chunks,
+                "total_chunks": statement.excluded.total_chunks,
+                "updated_at": statement.excluded.updated_at,
+            }
+        ))
+
+    async def get_enabled_chunk_count(self, user_id: str, session: AsyncSession):
+        result = await session.execute(
+            select(UserChunkStats.enabled_chunks).where(UserChunkStats.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
 
     async def get_user_documents(self, user_id: str, session: AsyncSession):
         result = await session.execute(
@@ -84,4 +253,96 @@ class DocumentStorage:
         await session.commit()
         return {"message": "Document QA status updated successfully"}
 
+    async def create_ingestion_job(
+        self,
+        user_id: str,
+        filename: str,
+        payload: bytes,
+        progress: dict,
+        session: AsyncSession,
+        file_hash: Optional[str] = None
+    ):
+        job_id = uuid4()
+        now = datetime.utcnow()
+        await session.execute(
+            insert(IngestionJob).values(
+                id=job_id,
+                user_id=user_id,
+                filename=filename,
+                status="queued",
+                progress=progress,
+                attempts=0,
+                payload=payload,
+                file_hash=file_hash,
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        return job_id
+
+    async def claim_ingestion_job(self, job_id: str, session: AsyncSession):
+        """Move a queued job to running; None if it was already claimed or finished."""
+        result = await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.status == "queued")
+            .values(status="running", attempts=IngestionJob.attempts + 1, updated_at=datetime.utcnow())
+            .returning(
+                IngestionJob.user_id,
+                IngestionJob.filename,
+                IngestionJob.progress,
+                IngestionJob.payload,
+                IngestionJob.file_hash
+            )
+        )
+        return result.first()
+
+    async def update_ingestion_job(self, job_id: str, session: AsyncSession, **values):
+        await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id)
+            .values(updated_at=datetime.utcnow(), **values)
+        )
+
+    async def get_ingestion_job(self, job_id: str, user_id: str, session: AsyncSession):
+        result = await session.execute(
+            select(IngestionJob).where(IngestionJob.id == job_id, IngestionJob.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def requeue_stale_ingestion_jobs(self, older_than: datetime, max_attempts: int, session: AsyncSession):
+        """Jobs to queue again; returns their (job id, user id) pairs.
+
+        Running jobs without progress since ``older_than`` lost their worker:
+        they are reset to queued, or failed once they used ``max_attempts``.
+        Queued jobs waiting since ``older_than`` are returned unchanged, as
+        their queue entry may have been lost; most are just behind a backlog,
+        which the queue recognizes and does not queue twice.
+        """
+        await session.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.status == "running",
+                IngestionJob.updated_at < older_than,
+                IngestionJob.attempts >= max_attempts,
+            )
+            .values(status="failed", error="Ingestion did not finish", payload=None, updated_at=datetime.utcnow())
+        )
+        requeued = await session.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.status == "running",
+                IngestionJob.updated_at < older_than,
+            )
+            .values(status="queued", updated_at=datetime.utcnow())
+            .returning(IngestionJob.id, IngestionJob.user_id)
+        )
+        waiting = await session.execute(
+            select(IngestionJob.id, IngestionJob.user_id)
+            .where(
+                IngestionJob.status == "queued",
+                IngestionJob.updated_at < older_than,
+            )
+        )
+        return requeued.all() + waiting.all()
+
 document_storage = DocumentStorage() 
\ No newline at end of file
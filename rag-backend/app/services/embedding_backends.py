@@ -0,0 +1,165 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import AutoModel
+from app.services.model_registry import model_registry
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBackend(ABC):
+    """Runs the embedding model on tokenized input.
+
+    ``embed`` receives the tokenizer output as torch tensors and returns one
+    mean-pooled, L2-normalized vector per row.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def load(self):
+        """Load the model; called once before the first ``embed``."""
+
+    @abstractmethod
+    def embed(self, encoded_input: Dict[str, torch.Tensor]) -> List[List[float]]:
+        """Embed one tokenized batch."""
+
+class TorchEmbeddingBackend(EmbeddingBackend):
+    """Eager PyTorch inference using the shared registry model."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, device):
+        self.model_name = model_name
+        self.device = device
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            model = model_registry.get_model(self.model_name, AutoModel)
+            model.to(self.device)
+            self.model = model
+
+    @staticmethod
+    def mean_pooling(model_output, attention_mask):
+        token_embeddings = model_output[0]  # First element is the last hidden state
+        input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+        return (token_embeddings * input_mask_expanded).sum(1) / input_mask_expanded.sum(1)
+
+    def embed(self, encoded_input: Dict[str, torch.Tensor]) -> List[List[float]]:
+        # Move to GPU/CPU
+        encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
+
+        # Forward pass
+        with torch.no_grad():
+            model_output = self.model(**encoded_input)
+
+        # Pooling
+        embeddings = self.mean_pooling(model_output, encoded_input['attention_mask'])
+
+        # Normalize
+        embeddings = F.normalize(embeddings, p=2, dim=1)
+
+        # Convert embeddings to list of floats
+        return embeddings.cpu().tolist()
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """ONNX Runtime inference on an exported (optionally int8-quantized) graph.
+
+    The graph is exported from the Hugging Face checkpoint on first use and
+    cached under ``cache_dir``; later starts load it directly without
+    materialising the PyTorch weights.
+    """
+
+    name = "onnx"
+    INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+    def __init__(self, model_name: str, cache_dir: str, quantize: bool = False, num_threads: int = 0):
+        self.model_name = model_name
+        self.model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.session = None
+        self.input_names = set()
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, "model.int8.onnx" if self.quantize else "model.onnx")
+
+    def load(self):
+        if self.session is not None:
+            return
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx requires the onnxruntime package")
+
+        self._ensure_exported()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads > 0:
+            options.intra_op_num_threads = self.num_threads
+        logger.info(f"Loading ONNX embedding graph {self.model_path}")
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _ensure_exported(self):
+        os.makedirs(self.model_dir, exist_ok=True)
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        if not os.path.exists(fp32_path):
+            self._export(fp32_path)
+        if self.quantize and not os.path.exists(self.model_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info(f"Quantizing {fp32_path} to int8")
+            tmp_path = f"{self.model_path}.{os.getpid()}.tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, self.model_path)
+
+    def _export(self, path: str):
+        logger.info(f"Exporting {self.model_name} to ONNX at {path}")
+        # Loaded outside the registry so the eager weights are freed after export
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+        tokenizer = model_registry.get_tokenizer(self.model_name)
+        dummy = tokenizer(["warm-up"], return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in self.INPUT_NAMES}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        # Export to a per-process temp file so concurrent workers never read a partial graph
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[name] for name in self.INPUT_NAMES),
+                tmp_path,
+                input_names=self.INPUT_NAMES,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        os.replace(tmp_path, path)
+
+    def embed(self, encoded_input: Dict[str, torch.Tensor]) -> List[List[float]]:
+        feeds = {
+            k: v.cpu().numpy().astype(np.int64)
+            for k, v in encoded_input.items()
+            if k in self.input_names
+        }
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        # Mean pooling and L2 normalization, matching the torch backend
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).tolist()
+
+def create_embedding_backend(kind: str, model_name: str, device, cache_dir: str, quantize: bool, num_threads: int) -> EmbeddingBackend:
+    if kind == "torch":
+        return TorchEmbeddingBackend(model_name, device)
+    if kind == "onnx":
+        return OnnxEmbeddingBackend(model_name, cache_dir, quantize=quantize, num_threads=num_threads)
+    raise ValueError(f"Unsupported embedding backend: {kind}")
@@ -1,7 +1,15 @@
-from transformers import AutoTokenizer, AutoModel
+import asyncio
+import os
+import threading
 import torch
-import torch.nn.functional as F
-from tenacity import retry, stop_after_attempt, wait_exponential
+from app.services.model_registry import model_registry
+from app.services.embedding_backends import create_embedding_backend
+from app.services.inference_executor import inference_executor
+from app.services.micro_batcher import MicroBatcher
+from app.services.batching import plan_length_buckets
+from app.services.embedding_store import EmbeddingStore
+from app.services.query_embedding_cache import QueryEmbeddingCache
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,59 +17,188 @@ logger = logging.getLogger(__name__)
 class EmbeddingService:
     def __init__(self):
         self.MODEL_NAME = "BAAI/bge-base-en-v1.5"
-        self.tokenizer = self._load_tokenizer()
-        self.model = self._load_model()
+        self.EMBEDDING_DIM = 768
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model.to(self.device)
-        self.model.eval()
+        self._tokenizer = None
+        self.backend = create_embedding_backend(
+            settings.EMBEDDING_BACKEND,
+            self.MODEL_NAME,
+            device=self.device,
+            cache_dir=settings.EMBEDDING_ONNX_PATH,
+            quantize=settings.EMBEDDING_ONNX_QUANTIZE,
+            num_threads=settings.TORCH_NUM_THREADS
+        )
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self.padding_stats = {"real_tokens": 0, "padded_tokens": 0}
+        self.store = None
+        if settings.EMBEDDING_STORE_ENABLED:
+            # int8 vectors drift slightly from fp32 ones, so they get their own keys
+            store_model_name = self.MODEL_NAME + ("+int8" if getattr(self.backend, "quantize", False) else "")
+            self.store = EmbeddingStore(
+                path=os.path.join(settings.EMBEDDING_STORE_PATH, self.MODEL_NAME.replace("/", "__")),
+                model_name=store_model_name,
+                dim=self.EMBEDDING_DIM,
+                max_bytes=settings.EMBEDDING_STORE_MAX_MB * 1024 * 1024
+            )
+        # Concurrent single-text requests (query embeddings) share forward passes
+        self.query_batcher = MicroBatcher(
+            self._embed_query_batch,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000
+        )
+        self.query_cache = QueryEmbeddingCache(
+            max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL
+        )
+
+    def load(self):
+        """Fetch the tokenizer and load the inference backend; safe to call repeatedly."""
+        with self._load_lock:
+            if not self._loaded:
+                self._tokenizer = model_registry.get_tokenizer(self.MODEL_NAME)
+                logger.info(f"Using {self.backend.name} embedding backend")
+                self.backend.load()
+                self._loaded = True
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self.load()
+        return self._tokenizer
+
+    def warm_up(self):
+        """Load the model and push a dummy batch through it."""
+        self.load()
+        self._embed_batch(["warm-up"])
+
+    def _encode(self, encoded_input) -> list[list[float]]:
+        if not self._loaded:
+            self.load()
+        return self.backend.embed(encoded_input)
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        # Tokenize the batch
+        encoded_input = self.tokenizer(
+            batch,
+            padding=True,
+            truncation=True,
+            max_length=512,
+            return_tensors='pt'
+        )
+        return self._encode(encoded_input)
+
+    def _tokenize(self, texts: list[str]) -> list[list[int]]:
+        return self.tokenizer(texts, truncation=True, max_length=512)["input_ids"]
+
+    def _embed_token_ids(self, batch_ids: list[list[int]]) -> list[list[float]]:
+        # Inputs are already tokenized; only pad to the longest row in this batch
+        encoded_input = self.tokenizer.pad({"input_ids": batch_ids}, padding=True, return_tensors='pt')
+        return self._encode(encoded_input)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _load_tokenizer(self):
-        logger.info(f"Loading tokenizer for {self.MODEL_NAME}")
-        return AutoTokenizer.from_pretrained(self.MODEL_NAME)
+    def _record_padding(self, real_tokens: int, padded_tokens: int):
+        self.padding_stats["real_tokens"] += real_tokens
+        self.padding_stats["padded_tokens"] += padded_tokens
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _load_model(self):
-        logger.info(f"Loading model {self.MODEL_NAME}")
-        return AutoModel.from_pretrained(self.MODEL_NAME)
+    @property
+    def padding_ratio(self) -> float:
+        """Share of processed token slots that were padding, over the process lifetime."""
+        padded = self.padding_stats["padded_tokens"]
+        return 1 - self.padding_stats["real_tokens"] / padded if padded else 0.0
 
-    def mean_pooling(self, model_output, attention_mask):
-        token_embeddings = model_output[0]  # First element is the last hidden state
-        input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-        return (token_embeddings * input_mask_expanded).sum(1) / input_mask_expanded.sum(1)
+    async def _embed_query_batch(self, batch: list[str]) -> list[list[float]]:
+        return await inference_executor.run(embed_batch_in_worker, batch)
+
+    async def embed_query(self, text: str) -> list[float]:
+        """Embed a single question, reusing a cached vector for repeated questions."""
+        cached = self.query_cache.get(text)
+        if cached is not None:
+            return cached
+        vector = await self.query_batcher.submit(text)
+        self.query_cache.put(text, vector)
+        return vector
+
+    async def embed_queries(self, questions: list[str]) -> list[list[float]]:
+        """Embed many questions in bulk, reusing cached vectors.
+
+        Questions skip the chunk embedding store; they go through the
+        question cache like embed_query does.
+        """
+        vectors = [self.query_cache.get(question) for question in questions]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = await self._embed_bulk([questions[i] for i in missing], settings.EMBEDDING_MAX_BATCH_SIZE)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self.query_cache.put(questions[i], vector)
+        return vectors
 
     async def embed_texts(self, texts: list[str], batch_size: int = 32) -> list[list[float]]:
-        all_embeddings = []
-        
-        # Process in batches
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-
-            # Tokenize the batch
-            encoded_input = self.tokenizer(
-                batch,
-                padding=True,
-                truncation=True,
-                max_length=512,
-                return_tensors='pt'
-            )
+        if not texts:
+            return []
+        if self.store is None:
+            return await self._embed_bulk(texts, batch_size)
 
-            # Move to GPU/CPU
-            encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
+        # Chunks embedded before (shared boilerplate, re-uploads) come from the store
+        try:
+            all_embeddings = await asyncio.to_thread(self.store.get_many, texts)
+        except Exception as e:
+            logger.error(f"Embedding store lookup failed: {str(e)}")
+            all_embeddings = [None] * len(texts)
 
-            # Forward pass
-            with torch.no_grad():
-                model_output = self.model(**encoded_input)
+        missing = [i for i, vector in enumerate(all_embeddings) if vector is None]
+        logger.info(f"Embedding store served {len(texts) - len(missing)}/{len(texts)} texts")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = await self._embed_bulk(missing_texts, batch_size)
+            for i, vector in zip(missing, computed):
+                all_embeddings[i] = vector
+            try:
+                await asyncio.to_thread(self.store.put_many, missing_texts, computed)
+            except Exception as e:
+                logger.error(f"Embedding store update failed: {str(e)}")
 
-            # Pooling
-            embeddings = self.mean_pooling(model_output, encoded_input['attention_mask'])
+        return all_embeddings
 
-            # Normalize
-            embeddings = F.normalize(embeddings, p=2, dim=1)
+    async def _embed_bulk(self, texts: list[str], batch_size: int) -> list[list[float]]:
+        # Tokenize once, then group texts of similar length so each batch
+        # pads to a tight width and stays within the token budget
+        token_ids = await inference_executor.run(tokenize_in_worker, texts)
+        lengths = [len(ids) for ids in token_ids]
+        batches = plan_length_buckets(lengths, settings.EMBEDDING_TOKEN_BUDGET, batch_size)
 
-            # Convert embeddings to list of floats and append
-            all_embeddings.extend(embeddings.cpu().tolist())
+        all_embeddings = [None] * len(texts)
+        real_tokens = padded_tokens = 0
+        for batch in batches:
+            batch_ids = [token_ids[i] for i in batch]
+            # The forward pass runs on the inference executor so the event
+            # loop keeps serving other requests between batches
+            vectors = await inference_executor.run(embed_token_ids_in_worker, batch_ids)
+            for i, vector in zip(batch, vectors):
+                all_embeddings[i] = vector
+            real_tokens += sum(lengths[i] for i in batch)
+            padded_tokens += len(batch) * max(lengths[i] for i in batch)
 
+        self._record_padding(real_tokens, padded_tokens)
+        padding_ratio = 1 - real_tokens / padded_tokens if padded_tokens else 0.0
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches (padding ratio {padding_ratio:.1%})")
         return all_embeddings
 
-embedding_service = EmbeddingService() 
\ No newline at end of file
+# Module-level entry points so they can be submitted to a process pool
+def embed_batch_in_worker(batch: list[str]) -> list[list[float]]:
+    return embedding_service._embed_batch(batch)
+
+def tokenize_in_worker(texts: list[str]) -> list[list[int]]:
+    return embedding_service._tokenize(texts)
+
+def embed_token_ids_in_worker(batch_ids: list[list[int]]) -> list[list[float]]:
+    return embedding_service._embed_token_ids(batch_ids)
+
+def warm_up_embedding_model():
+    embedding_service.warm_up()
+
+embedding_service = EmbeddingService()
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+class EmbeddingStore:
+    """Persistent, content-addressed cache of chunk embeddings.
+
+    Vectors live in a fixed-capacity float32 matrix that is memory-mapped
+    from ``vectors.f32``; a SQLite index maps the hash of
+    (model name, normalized text) to a row of that matrix. The capacity is
+    derived from ``max_bytes`` and the least recently used entries are
+    evicted once it is reached. The files survive restarts and may be
+    shared by several processes on the same host.
+
+    The lock only covers threads of one process, so every row has a tag
+    in ``tags.u64`` naming the key whose vector it holds. Writers clear the
+    tag, write the vector and then set the tag; readers check the tag
+    before and after copying a row, and treat a mismatch as a miss. Another
+    process can therefore evict or fill a slot at any time without a reader
+    ever returning the wrong vector.
+    """
+
+    def __init__(self, path: str, model_name: str, dim: int, max_bytes: int):
+        self.path = path
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = max(1, max_bytes // (dim * 4))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._vectors: Optional[np.memmap] = None
+        self._tags: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._last_tick = 0.0
+
+    def _tick(self) -> float:
+        # Strictly increasing so entries touched in the same instant still order
+        self._last_tick = max(time.time(), self._last_tick + 1e-6)
+        return self._last_tick
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _tag(key: str) -> int:
+        # 0 marks a row that holds no complete vector
+        return int(key[:16], 16) or 1
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+
+        self._vectors = self._map("vectors.f32", np.float32, (self.capacity, self.dim))
+        self._tags = self._map("tags.u64", np.uint64, (self.capacity,))
+
+        conn = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite3"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)")
+        # Drop rows that no longer fit if the store was shrunk between runs
+        conn.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+        self._conn = conn
+        logger.info(f"Opened embedding store at {self.path} ({self.capacity} vectors)")
+
+    def _map(self, filename: str, dtype, shape: tuple) -> np.memmap:
+        path = os.path.join(self.path, filename)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _read(self, key: str, slot: int) -> Optional[List[float]]:
+        tag = self._tag(key)
+        if self._tags[slot] != tag:
+            return None
+        vector = self._vectors[slot].tolist()
+        # Rewritten by another process while it was being copied
+        return vector if self._tags[slot] == tag else None
+
+    def _write(self, rows: List[tuple]):
+        """Write (key, slot, vector) rows, tagging each once its vector is complete."""
+        slots = [slot for _, slot, _ in rows]
+        self._tags[slots] = 0
+        for _, slot, vector in rows:
+            self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+        self._vectors.flush()
+        self._tags[slots] = [self._tag(key) for key, _, _ in rows]
+        self._tags.flush()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, int]:
+        found = {}
+        for i in range(0, len(keys), _SQL_BATCH):
+            part = keys[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part)
+            found.update(rows.fetchall())
+        return found
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the stored vector for each text, or None where it is missing."""
+        keys = [self.make_key(text) for text in texts]
+        with self._lock:
+            self._open()
+            found = self._lookup(list(set(keys)))
+            if found:
+                now = self._tick()
+                hit_keys = list(found)
+                for i in range(0, len(hit_keys), _SQL_BATCH):
+                    part = hit_keys[i:i + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(part))
+                    self._conn.execute(f"UPDATE entries SET last_used = ? WHERE key IN ({placeholders})", [now, *part])
+            results = [self._read(key, found[key]) if key in found else None for key in keys]
+
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def _free_slots(self, n: int) -> List[int]:
+        """The lowest (at most ``n``) slots that no entry uses."""
+        count, top = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(slot), -1) FROM entries").fetchone()
+        if top == count - 1:
+            # No gaps: the occupied slots are exactly 0..count-1
+            return list(range(count, min(count + n, self.capacity)))
+        # Deleted entries left gaps; walk the slot index up to the n-th one
+        free, next_slot = [], 0
+        for (slot,) in self._conn.execute("SELECT slot FROM entries ORDER BY slot"):
+            free.extend(range(next_slot, min(slot, next_slot + n - len(free))))
+            if len(free) == n:
+                return free
+            next_slot = slot + 1
+        free.extend(range(next_slot, min(self.capacity, next_slot + n - len(free))))
+        return free
+
+    def _allocate_slots(self, n: int) -> List[int]:
+        slots = self._free_slots(n)
+        if n > len(slots):
+            victims = self._conn.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (n - len(slots),)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            self.evictions += len(victims)
+            slots.extend(slot for _, slot in victims)
+        return slots
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts that are not in the store yet.
+
+        Entries whose row does not carry their tag, e.g. because the process
+        that added them died before writing the vector, are written again.
+        """
+        pending = {}
+        for text, vector in zip(texts, vectors):
+            pending.setdefault(self.make_key(text), vector)
+
+        with self._lock:
+            self._open()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._lookup(list(pending))
+                repairs = [
+                    (key, slot, pending[key]) for key, slot in existing.items()
+                    if self._tags[slot] != self._tag(key)
+                ]
+                new_items = [(key, vector) for key, vector in pending.items() if key not in existing]
+                # Anything beyond capacity would only evict rows written in this call
+                new_items = new_items[:self.capacity]
+                slots = self._allocate_slots(len(new_items))
+                now = self._tick()
+                self._conn.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slot, now) for (key, _), slot in zip(new_items, slots)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            # Vectors are written only once the index commits: a rollback
+            # restores evicted rows, whose slots must still hold their vectors
+            try:
+                # New rows go last, so a repaired row evicted in this call
+                # ends up holding the entry that replaced it
+                self._write(repairs + [(key, slot, vector) for (key, vector), slot in zip(new_items, slots)])
+            except Exception:
+                self._delete([key for key, _ in new_items])
+                raise
+
+    def _delete(self, keys: List[str]):
+        for i in range(0, len(keys), _SQL_BATCH):
+            part = keys[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM entries WHERE key IN ({placeholders})", part)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "capacity": self.capacity,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            if self._tags is not None:
+                self._tags.flush()
+                self._tags = None
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+import torch
+from app.core.config import settings
+from app.core.logger import logger
+
+def _configure_torch_threads(num_threads: int):
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+class InferenceExecutor:
+    """Runs CPU-bound model inference off the event loop.
+
+    Work is submitted to a thread or process pool selected by
+    ``INFERENCE_EXECUTOR``. At most ``INFERENCE_MAX_QUEUE`` calls may be queued
+    or running at once; further callers wait for a slot, which keeps a burst
+    of ingest work from building an unbounded backlog in front of queries.
+
+    Functions submitted in process mode must be picklable module-level
+    callables; each worker process loads its own copy of the models.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int, torch_threads: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported inference executor: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.torch_threads = torch_threads
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            logger.info(f"Starting {self.kind} inference executor with {self.workers} worker(s)")
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_configure_torch_threads,
+                    initargs=(self.torch_threads,)
+                )
+            else:
+                _configure_torch_threads(self.torch_threads)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="inference"
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the executor and await its result."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        self.pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+inference_executor = InferenceExecutor(
+    kind=settings.INFERENCE_EXECUTOR,
+    workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_MAX_QUEUE,
+    torch_threads=settings.TORCH_NUM_THREADS
+)
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+from app.db.base import async_session
+from app.services.document_processor import document_processor
+from app.services.document_storage import document_storage
+from app.services.embedding_service import embedding_service
+from app.core.exceptions import ValidationError, ConflictError, DatabaseError, FileError
+
+# Ingestion stages reported by GET /documents/jobs/{id}, in pipeline order
+JOB_STAGES = ("extract", "chunk", "embed", "store")
+
+class IngestionPipeline:
+    """Streams one document through extract → chunk → embed → store.
+
+    Every stage is its own task, connected to the next by a bounded queue
+    that ends with a ``None`` sentinel: pages flow into the chunker, batches
+    of ``INGEST_EMBED_BATCH_SIZE`` chunks into the embedder and embedded
+    batches into the writer. Batch N is embedded while batch N-1 is being
+    written, and a slow stage blocks the ones before it once its queue is
+    full, so at most a few pages and batches are in memory per document.
+
+    All writes happen in one transaction that commits after the last batch;
+    a failure in any stage cancels the others and rolls it back.
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        filename: str,
+        content: bytes,
+        progress: dict,
+        on_progress: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        file_hash: Optional[str] = None
+    ):
+        self.user_id = user_id
+        self.filename = filename
+        self.content = content
+        self.progress = progress
+        self.on_progress = on_progress
+        self.batch_size = max(1, batch_size or settings.INGEST_EMBED_BATCH_SIZE)
+        self.queue_size = max(1, queue_size or settings.INGEST_QUEUE_SIZE)
+        self.file_hash = file_hash
+        self.content_hash: Optional[str] = None
+        self._details: dict = {}
+
+    async def run(self) -> tuple:
+        """Ingest the document; returns (document_id, chunk count)."""
+        pages = asyncio.Queue(maxsize=self.queue_size)
+        batches = asyncio.Queue(maxsize=self.queue_size)
+        embedded = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [
+            asyncio.create_task(self._extract(pages)),
+            asyncio.create_task(self._chunk(pages, batches)),
+            asyncio.create_task(self._embed(batches, embedded)),
+            asyncio.create_task(self._store(embedded)),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            # Stages only fail on their own input, so the first failure in
+            # pipeline order is the cause
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            return tasks[-1].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _extract(self, pages_out: asyncio.Queue):
+        file_ext = self.filename.split(".")[-1].lower()
+        async with self._stage("extract") as details:
+            details.update(pages=0, characters=0)
+            # Hash of the pages joined by newlines, i.e. of the extracted text
+            digest = hashlib.sha256()
+            pages = document_processor.extract_pages(self.content, file_ext)
+            try:
+                while True:
+                    page = await asyncio.to_thread(next, pages, None)
+                    if page is None:
+                        break
+                    if details["pages"]:
+                        digest.update(b"\n")
+                    digest.update(page.encode("utf-8"))
+                    details["pages"] += 1
+                    details["characters"] += len(page)
+                    await pages_out.put(page)
+            except Exception as e:
+                raise FileError(f"Error extracting text from document: {str(e)}")
+            finally:
+                try:
+                    pages.close()
+                except ValueError:
+                    # Cancelled while a page was being read in its thread;
+                    # the generator is closed when it is collected
+                    pass
+            self.content_hash = digest.hexdigest()
+
+            # Extraction runs ahead of embedding, so most of that work is
+            # skipped for duplicates; the writer checks again before commit
+            async with async_session() as session:
+                if await document_storage.check_duplicate_document(self.content_hash, self.user_id, session):
+                    raise ConflictError("This document has already been uploaded")
+        await pages_out.put(None)
+
+    async def _chunk(self, pages_in: asyncio.Queue, batches_out: asyncio.Queue):
+        chunker = document_processor.incremental_chunker()
+        pending, first_index = [], 0
+        async with self._stage("chunk") as details:
+            while True:
+                page = await pages_in.get()
+                try:
+                    if page is None:
+                        chunks = await asyncio.to_thread(chunker.finish)
+                    else:
+                        chunks = await asyncio.to_thread(chunker.feed, page)
+                except Exception as e:
+                    raise FileError(f"Error processing document chunks: {str(e)}")
+                pending.extend(chunks)
+                while len(pending) >= self.batch_size or (page is None and pending):
+                    batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+                    await batches_out.put((first_index, batch))
+                    first_index += len(batch)
+                if page is None:
+                    break
+            if not first_index:
+                raise ValidationError("Document is empty or could not be processed")
+            details["chunks"] = first_index
+        await batches_out.put(None)
+
+    async def _embed(self, batches_in: asyncio.Queue, embedded_out: asyncio.Queue):
+        async with self._stage("embed") as details:
+            details["chunks"] = 0
+            while True:
+                item = await batches_in.get()
+                if item is None:
+                    break
+                first_index, batch = item
+                try:
+                    embeddings = await embedding_service.embed_texts([text for text, _ in batch])
+                except Exception as e:
+                    raise DatabaseError(f"Error generating embeddings: {str(e)}")
+                details["chunks"] += len(embeddings)
+                await embedded_out.put((first_index, batch, embeddings))
+        await embedded_out.put(None)
+
+    async def _store(self, embedded_in: asyncio.Queue) -> tuple:
+        document_id = None
+        async with self._stage("store") as details:
+            details["chunks"] = 0
+            # The session only takes a connection with the first write
+            async with async_session() as session:
+                while True:
+                    item = await embedded_in.get()
+                    if item is None:
+                        break
+                    first_index, batch, embeddings = item
+                    if document_id is None:
+                        document_id = await self._create_document(session)
+
+                    # Store chunks with embeddings
+                    try:
+                        await document_storage.store_chunks(
+                            document_id,
+                            [text for text, _ in batch],
+                            embeddings,
+                            session,
+                            [token_count for _, token_count in batch],
+                            first_index=first_index
+                        )
+                    except Exception as e:
+                        raise DatabaseError(f"Error storing document chunks: {str(e)}")
+                    details["chunks"] += len(batch)
+                    await self._report("store")
+
+                # The sentinel only arrives after extraction hashed the text
+                # and at least one chunk was written. A concurrent job for
+                # the same file may have finished meanwhile.
+                if await document_storage.check_duplicate_document(self.content_hash, self.user_id, session):
+                    raise ConflictError("This document has already been uploaded")
+                try:
+                    await document_storage.set_document_hash(document_id, self.content_hash, session)
+                except Exception as e:
+                    raise DatabaseError(f"Error storing document: {str(e)}")
+
+                # New documents start disabled for QA
+                try:
+                    await document_storage.adjust_user_chunk_stats(self.user_id, 0, details["chunks"], session)
+                except Exception as e:
+                    raise DatabaseError(f"Error updating chunk statistics: {str(e)}")
+
+                await session.commit()
+        return document_id, details["chunks"]
+
+    async def _create_document(self, session) -> str:
+        # The content hash is only known once extraction finishes; it is set
+        # before commit, so the placeholder is never visible
+        try:
+            document_id = await document_storage.store_document(self.filename, "", session, file_hash=self.file_hash)
+        except Exception as e:
+            raise DatabaseError(f"Error storing document: {str(e)}")
+
+        # Create user-document relationship
+        try:
+            await document_storage.create_user_document_relationship(self.user_id, document_id, session)
+        except Exception as e:
+            raise DatabaseError(f"Error creating document relationship: {str(e)}")
+        return document_id
+
+    @asynccontextmanager
+    async def _stage(self, stage: str):
+        # Stages run concurrently, so each reports its own status and counts
+        details = self._details[stage] = {}
+        self.progress[stage] = {"status": "running"}
+        await self._report(stage)
+        started = time.perf_counter()
+        try:
+            yield details
+        except asyncio.CancelledError:
+            self.progress[stage] = {"status": "cancelled", "seconds": round(time.perf_counter() - started, 3)}
+            raise
+        except Exception:
+            self.progress[stage] = {"status": "failed", "seconds": round(time.perf_counter() - started, 3)}
+            raise
+        self.progress[stage] = {"status": "done", "seconds": round(time.perf_counter() - started, 3), **details}
+        await self._report(stage)
+
+    async def _report(self, stage: str):
+        if self.progress[stage]["status"] == "running":
+            self.progress[stage] = {"status": "running", **self._details[stage]}
+        if self.on_progress is not None:
+            await self.on_progress(stage, self.progress)
@@ -0,0 +1,80 @@
+from typing import Optional
+from app.db.optimizations import redis_client
+
+QUEUE_PREFIX = "ingest:queue:"
+# Users with queued jobs, in the order they take turns
+TENANT_RING_KEY = "ingest:tenants"
+# Same users as a set, so a user is on the ring at most once
+ACTIVE_TENANTS_KEY = "ingest:active"
+# Job ids currently in some user's queue, so a job is queued at most once
+QUEUED_JOBS_KEY = "ingest:queued"
+
+# KEYS: ring, active set, the user's queue, queued jobs; ARGV: user id, job id
+ENQUEUE_SCRIPT = """
+if redis.call('SADD', KEYS[4], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[3], ARGV[2])
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('LLEN', KEYS[3])
+"""
+
+# KEYS: ring, active set, queued jobs; ARGV: queue key prefix. Pops one job
+# from the user at the head of the ring and moves them to the back if they
+# have more.
+DEQUEUE_SCRIPT = """
+local tenant = redis.call('LPOP', KEYS[1])
+while tenant do
+    local queue = ARGV[1] .. tenant
+    local job = redis.call('LPOP', queue)
+    if job then
+        redis.call('SREM', KEYS[3], job)
+        if redis.call('LLEN', queue) > 0 then
+            redis.call('RPUSH', KEYS[1], tenant)
+        else
+            redis.call('SREM', KEYS[2], tenant)
+        end
+        return job
+    end
+    redis.call('SREM', KEYS[2], tenant)
+    tenant = redis.call('LPOP', KEYS[1])
+end
+return false
+"""
+
+class IngestionQueue:
+    """Redis-backed queue of ingestion job ids, fair across users.
+
+    Every user has a list of their own job ids, and users with pending jobs
+    take turns on a ring: a worker slot takes one job from the user at the
+    head and moves them to the back. A tenant uploading hundreds of files
+    therefore delays everyone else by at most one job per slot, instead of
+    the whole backlog. Both operations are Lua scripts, so concurrent
+    workers and API processes never see a half-updated ring.
+
+    A job id that is already waiting is not queued again, so the stale-job
+    sweep can re-enqueue any job it cannot find a worker for.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._enqueue = redis.register_script(ENQUEUE_SCRIPT)
+        self._dequeue = redis.register_script(DEQUEUE_SCRIPT)
+
+    def enqueue(self, user_id: str, job_id: str) -> int:
+        """Queue a job behind the user's earlier jobs; returns the user's queue length, or 0 if it was already queued."""
+        return self._enqueue(
+            keys=[TENANT_RING_KEY, ACTIVE_TENANTS_KEY, f"{QUEUE_PREFIX}{user_id}", QUEUED_JOBS_KEY],
+            args=[str(user_id), str(job_id)]
+        )
+
+    def dequeue(self) -> Optional[str]:
+        """Next job id in round-robin order across users, or None if the queue is empty."""
+        return self._dequeue(keys=[TENANT_RING_KEY, ACTIVE_TENANTS_KEY, QUEUED_JOBS_KEY], args=[QUEUE_PREFIX]) or None
+
+    def depth(self, user_id: str) -> int:
+        return self.redis.llen(f"{QUEUE_PREFIX}{user_id}")
+
+ingestion_queue = IngestionQueue(redis_client)
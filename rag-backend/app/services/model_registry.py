@@ -0,0 +1,109 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModel
+from tenacity import retry, stop_after_attempt, wait_exponential
+import logging
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, str, str]
+
+class ModelRegistry:
+    """Process-wide cache of tokenizers and models.
+
+    Every service asks the registry for its handles instead of calling
+    ``from_pretrained`` itself, so each (name, revision, dtype) combination is
+    loaded exactly once per worker. Models are handed out in eval mode with
+    gradients disabled and must be treated as read-only by callers.
+    """
+
+    def __init__(self):
+        self._tokenizers: Dict[Tuple[str, str], Any] = {}
+        self._models: Dict[ModelKey, torch.nn.Module] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _model_key(name: str, revision: Optional[str], dtype: Optional[torch.dtype], quantize: bool = False) -> ModelKey:
+        if quantize:
+            return (name, revision or "main", "qint8-dynamic")
+        return (name, revision or "main", str(dtype) if dtype is not None else "default")
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _load_tokenizer(self, name: str, revision: str):
+        logger.info(f"Loading tokenizer for {name}@{revision}")
+        return AutoTokenizer.from_pretrained(name, revision=revision)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _load_model(self, name: str, revision: str, model_cls, dtype: Optional[torch.dtype]):
+        logger.info(f"Loading model {name}@{revision} ({model_cls.__name__}, dtype={dtype or 'default'})")
+        kwargs = {"revision": revision}
+        if dtype is not None:
+            kwargs["torch_dtype"] = dtype
+        return model_cls.from_pretrained(name, **kwargs)
+
+    def get_tokenizer(self, name: str, revision: Optional[str] = None):
+        """Return the shared tokenizer for ``name``, loading it on first use."""
+        key = (name, revision or "main")
+        with self._lock:
+            if key not in self._tokenizers:
+                self._tokenizers[key] = self._load_tokenizer(name, key[1])
+            return self._tokenizers[key]
+
+    def get_model(
+        self,
+        name: str,
+        model_cls=AutoModel,
+        revision: Optional[str] = None,
+        dtype: Optional[torch.dtype] = None,
+        quantize: bool = False
+    ) -> torch.nn.Module:
+        """Return the shared, read-only model for ``name``, loading it on first use.
+
+        With ``quantize`` the Linear layers are converted to int8 with dynamic
+        quantization; the float weights are not kept in the registry.
+        """
+        key = self._model_key(name, revision, dtype, quantize)
+        with self._lock:
+            if key not in self._models:
+                model = self._load_model(name, key[1], model_cls, None if quantize else dtype)
+                if quantize:
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+                model.eval()
+                model.requires_grad_(False)
+                self._models[key] = model
+                logger.info(f"Registered {name}: {self._model_bytes(model) / 1024 / 1024:.1f}MB")
+            return self._models[key]
+
+    @staticmethod
+    def _model_bytes(model: torch.nn.Module) -> int:
+        # state_dict also covers the packed weights of dynamically quantized
+        # layers, which do not show up in parameters()
+        seen = set()
+
+        def tensor_bytes(value) -> int:
+            if isinstance(value, torch.Tensor):
+                if value.data_ptr() in seen:
+                    return 0
+                seen.add(value.data_ptr())
+                return value.numel() * value.element_size()
+            if isinstance(value, (tuple, list)):
+                return sum(tensor_bytes(v) for v in value)
+            return 0
+
+        return sum(tensor_bytes(v) for v in model.state_dict().values())
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Report the bytes held by every registered model."""
+        with self._lock:
+            models = {
+                f"{name}@{revision}[{dtype}]": self._model_bytes(model)
+                for (name, revision, dtype), model in self._models.items()
+            }
+            return {
+                "models": models,
+                "tokenizers": [f"{name}@{revision}" for name, revision in self._tokenizers],
+                "total_bytes": sum(models.values()),
+            }
+
+model_registry = ModelRegistry()
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Callable, Dict, Optional
+from app.services.embedding_service import warm_up_embedding_model
+from app.services.reranker import warm_up_reranker_model
+from app.services.inference_executor import inference_executor
+from app.core.logger import logger
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+class ModelWarmup:
+    """Loads and warms every inference model in the background.
+
+    Each target is loaded on the inference executor and a dummy batch is pushed
+    through it, so the first real request does not pay for lazy
+    initialisation. ``state`` backs the readiness probe.
+    """
+
+    def __init__(self, targets: Dict[str, Callable[[], None]]):
+        self.targets = targets
+        self.state: Dict[str, str] = {name: PENDING for name in targets}
+        self.errors: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(state == READY for state in self.state.values())
+
+    def start(self) -> asyncio.Task:
+        """Schedule the warm-up on the running loop if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        for name, warm_up in self.targets.items():
+            if self.state[name] == READY:
+                continue
+            self.state[name] = LOADING
+            logger.info(f"Warming up {name} model")
+            try:
+                await inference_executor.run(warm_up)
+                self.state[name] = READY
+                self.errors.pop(name, None)
+                logger.info(f"{name} model is ready")
+            except Exception as e:
+                self.state[name] = FAILED
+                self.errors[name] = str(e)
+                logger.error(f"Failed to warm up {name} model: {str(e)}")
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "models": dict(self.state),
+            "errors": dict(self.errors),
+        }
+
+model_warmup = ModelWarmup({
+    "embedding": warm_up_embedding_model,
+    "reranker": warm_up_reranker_model,
+})
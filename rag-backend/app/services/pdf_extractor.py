@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import fitz  # PyMuPDF
+from app.core.config import settings
+from app.core.logger import logger
+
+def extract_page_range(content: bytes, start: int, stop: int) -> list[str]:
+    """Text of pages ``start`` to ``stop`` (exclusive); runs in a pool process."""
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+class PdfExtractor:
+    """Extracts PDF text page by page, spreading large PDFs over processes.
+
+    PDFs with at least ``min_pages`` pages are split into ranges of
+    ``pages_per_task`` pages that a process pool extracts in parallel, so
+    ingest time for long documents scales with cores rather than being
+    bound to one. Only ``2 * workers`` ranges are in flight at a time and
+    pages are yielded in order as soon as their range is done, which keeps
+    memory bounded and lets the consumer start before the last page.
+
+    Each task receives the PDF bytes and opens the document itself;
+    ranges are large enough that this is small next to text extraction.
+    """
+
+    def __init__(self, workers: int, min_pages: int, pages_per_task: int):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.min_pages = min_pages
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting PDF extraction pool with {self.workers} worker(s)")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def pages(self, content: bytes) -> Iterator[str]:
+        with fitz.open(stream=content, filetype="pdf") as doc:
+            page_count = doc.page_count
+            if self.workers <= 1 or page_count < self.min_pages:
+                for page in doc:
+                    yield page.get_text()
+                return
+
+        ranges = deque(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        executor = self._get_executor()
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.workers:
+                    in_flight.append(executor.submit(extract_page_range, content, *ranges.popleft()))
+                yield from in_flight.popleft().result()
+        finally:
+            # The consumer stopped early (failure or cancellation)
+            for future in in_flight:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+pdf_extractor = PdfExtractor(
+    workers=settings.PDF_EXTRACT_WORKERS,
+    min_pages=settings.PDF_PARALLEL_MIN_PAGES,
+    pages_per_task=settings.PDF_PAGES_PER_TASK
+)
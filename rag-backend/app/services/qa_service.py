@@ -1,49 +1,46 @@
-from typing import List, Optional
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-import torch
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import openai
 from app.core.config import settings
+from app.db.base import async_session
+from app.services.embedding_service import embedding_service
 from app.services.retriever import document_retriever
 from app.services.reranker import reranker
+from app.services.context_packer import context_packer
 from app.services.answer_generator import answer_generator
 from app.core.exceptions import ValidationError, DatabaseError, NotFoundError
 from app.db.optimizations import db_optimizations
 from app.core.logger import logger
 
+NO_DOCUMENTS_ANSWER = "No relevant documents found for your question. Please try rephrasing or upload relevant documents first or enable the uploaded documents for QA."
+NO_RELEVANT_CONTENT_ANSWER = "No highly relevant content found to answer your question accurately. Please try rephrasing or upload more relevant documents."
+
 class QAService:
     def __init__(self):
         try:
-            self.reranker_tokenizer = AutoTokenizer.from_pretrained('BAAI/bge-reranker-v2-m3')
-            self.reranker_model = AutoModelForSequenceClassification.from_pretrained('BAAI/bge-reranker-v2-m3')
-            self.reranker_model.eval()
             openai.api_key = settings.OPENAI_API_KEY
         except Exception as e:
             raise ValidationError(f"Failed to initialize RAG service: {str(e)}")
 
+    def _candidate_count(self) -> int:
+        # The reranker only runs on more than 10 chunks, so ann and hybrid
+        # retrieval over-fetch rather than stop at TOP_K_DOCUMENTS
+        return max(settings.TOP_K_DOCUMENTS, settings.RERANK_CANDIDATES)
+
+    def _keep_top_k(self, chunks: List[str]) -> List[str]:
+        # Threshold mode has never been limited to TOP_K_DOCUMENTS
+        if settings.RETRIEVAL_MODE == "threshold":
+            return chunks
+        return chunks[:settings.TOP_K_DOCUMENTS]
+
     def rerank_chunks(self, question: str, chunks: List[str], score_threshold: float = 1.0, return_debug: bool = False) -> List[str]:
         if not question or not chunks:
             raise ValidationError("Question and chunks must not be empty")
             
         try:
-            pairs = [[question, chunk] for chunk in chunks]
-            with torch.no_grad():
-                inputs = self.reranker_tokenizer(pairs, padding=True, truncation=True, return_tensors='pt', max_length=512)
-                scores = self.reranker_model(**inputs, return_dict=True).logits.view(-1).float()
-
-            # Filter and sort by score
-            scored_pairs = sorted(
-                [(score.item(), chunk) for score, chunk in zip(scores, chunks) if score.item() >= score_threshold],
-                key=lambda x: x[0],
-                reverse=True
-            )
-
-            if return_debug:
-                print("🔍 Reranker Scores:")
-                for score, chunk in scored_pairs:
-                    print(f"Score: {score:.2f} | Chunk: {chunk[:80]}...")
-
-            return [chunk for _, chunk in scored_pairs]
+            # Delegate to the shared reranker so the cross-encoder is only loaded once
+            return reranker.rerank_chunks(question, chunks, score_threshold=score_threshold, return_debug=return_debug)
         except Exception as e:
             raise ValidationError(f"Failed to rerank chunks: {str(e)}")
 
@@ -69,7 +66,9 @@ class QAService:
             # Step 1: Retrieve relevant chunks
             logger.info("Retrieving relevant chunks")
             try:
-                chunk_texts = await document_retriever.retrieve_relevant_chunks(question, session, user_id)
+                chunk_texts = await document_retriever.retrieve_relevant_chunks(
+                    question, session, user_id, top_k=self._candidate_count()
+                )
                 logger.info(f"Retrieved {len(chunk_texts)} chunks")
             except Exception as e:
                 logger.error(f"Chunk retrieval failed: {str(e)}")
@@ -77,27 +76,29 @@ class QAService:
 
             if not chunk_texts:
                 logger.warning("No relevant chunks found")
-                return "No relevant documents found for your question. Please try rephrasing or upload relevant documents first or enable the uploaded documents for QA."
+                return NO_DOCUMENTS_ANSWER
 
             # Step 2: Rerank chunks only if we have more than 10 chunks
             if len(chunk_texts) > 10:
                 logger.info("More than 10 chunks found, using reranker")
                 try:
-                    reranked_chunks = reranker.rerank_chunks(question, chunk_texts, score_threshold=0.0, return_debug=True)
+                    reranked_chunks = await reranker.rerank_chunks_async(question, chunk_texts, score_threshold=0.0, return_debug=True)
                     logger.info(f"Reranked chunks count: {len(reranked_chunks)}")
                     if not reranked_chunks:
                         logger.warning("No chunks passed reranking threshold")
-                        return "No highly relevant content found to answer your question accurately. Please try rephrasing or upload more relevant documents."
-                    # Use top 10 reranked chunks
-                    top_chunks = reranked_chunks[:10]
+                        return NO_RELEVANT_CONTENT_ANSWER
+                    ranked_chunks = reranked_chunks
                 except Exception as e:
                     logger.error(f"Reranking failed: {str(e)}")
                     raise
             else:
-                logger.info("10 or fewer chunks found, using all chunks directly")
-                top_chunks = chunk_texts
+                logger.info("10 or fewer chunks found, using retrieval order")
+                ranked_chunks = chunk_texts
+            ranked_chunks = self._keep_top_k(ranked_chunks)
 
-            # Step 3: Build context from chunks
+            # Step 3: Build context from the best chunks that fit the token
+            # budget, with neighbouring chunks stitched into one span
+            top_chunks = context_packer.assemble(ranked_chunks)
             context = "\n".join(top_chunks)
             logger.info(f"Built context from {len(top_chunks)} chunks")
 
@@ -126,4 +127,136 @@ class QAService:
             logger.error(f"Unexpected error in QA process: {str(e)}")
             raise DatabaseError(f"Failed to process query: {str(e)}")
 
+    def get_answers_for_queries(self, questions: List[str], user_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answer a batch of questions, yielding each result as soon as it is ready.
+
+        Validation happens here, before anything is streamed. Results are
+        ``{"index", "question", "answer"}`` or ``{"index", "question", "error"}``
+        in completion order, with cached answers first.
+        """
+        if not questions:
+            raise ValidationError("Questions must not be empty")
+        if len(questions) > settings.QA_BATCH_MAX_QUESTIONS:
+            raise ValidationError(f"A batch may contain at most {settings.QA_BATCH_MAX_QUESTIONS} questions")
+        return self._answer_batch(list(questions), user_id)
+
+    async def _answer_batch(self, questions: List[str], user_id: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        # Sessions are opened here: the endpoint streams after the
+        # request-scoped session has been closed
+        logger.info(f"Processing batch of {len(questions)} queries for user: {user_id}")
+
+        def result(index: int, **fields) -> Dict[str, Any]:
+            return {"index": index, "question": questions[index], **fields}
+
+        # Step 0: answers already cached, with one documents hash and one MGET
+        try:
+            async with async_session() as session:
+                cached_answers = await db_optimizations.get_cached_answers(questions, session, user_id)
+        except Exception as e:
+            logger.error(f"Batch cache check failed: {str(e)}")
+            cached_answers = [None] * len(questions)
+
+        pending = []
+        for index, (question, cached_answer) in enumerate(zip(questions, cached_answers)):
+            if not question:
+                yield result(index, error="Question must not be empty")
+            elif cached_answer:
+                yield result(index, answer=cached_answer)
+            else:
+                pending.append(index)
+        logger.info(f"Batch cache served {len(questions) - len(pending)}/{len(questions)} questions")
+        if not pending:
+            return
+
+        # Step 1: embed every remaining question in one batch
+        try:
+            vectors = await embedding_service.embed_queries([questions[i] for i in pending])
+        except Exception as e:
+            logger.error(f"Batch embedding failed: {str(e)}")
+            for index in pending:
+                yield result(index, error=f"Failed to embed question: {str(e)}")
+            return
+
+        # Step 2: retrieve concurrently, each on its own pooled connection
+        retrieval_slots = asyncio.Semaphore(settings.QA_BATCH_RETRIEVAL_CONCURRENCY)
+
+        async def retrieve(index: int, vector: List[float]) -> List[str]:
+            async with retrieval_slots:
+                async with async_session() as session:
+                    return await document_retriever.retrieve_relevant_chunks(
+                        questions[index], session, user_id, top_k=self._candidate_count(), query_vector=vector
+                    )
+
+        retrieved = await asyncio.gather(
+            *(retrieve(index, vector) for index, vector in zip(pending, vectors)),
+            return_exceptions=True
+        )
+
+        contexts: Dict[int, List[str]] = {}
+        for index, chunk_texts in zip(pending, retrieved):
+            if isinstance(chunk_texts, Exception):
+                logger.error(f"Chunk retrieval failed for question {index}: {str(chunk_texts)}")
+                yield result(index, error=f"Failed to retrieve chunks: {str(chunk_texts)}")
+            elif not chunk_texts:
+                yield result(index, answer=NO_DOCUMENTS_ANSWER)
+            else:
+                contexts[index] = chunk_texts
+
+        # Step 3: rerank every question with more than 10 chunks in shared batches
+        to_rerank = [index for index, chunk_texts in contexts.items() if len(chunk_texts) > 10]
+        if to_rerank:
+            logger.info(f"Reranking {len(to_rerank)} questions in shared batches")
+            try:
+                reranked = await reranker.rerank_many_async(
+                    [(questions[index], contexts[index]) for index in to_rerank],
+                    score_threshold=0.0
+                )
+            except Exception as e:
+                logger.error(f"Batch reranking failed: {str(e)}")
+                reranked = [e] * len(to_rerank)
+            for index, reranked_chunks in zip(to_rerank, reranked):
+                del contexts[index]
+                if isinstance(reranked_chunks, Exception):
+                    yield result(index, error=f"Failed to rerank chunks: {str(reranked_chunks)}")
+                elif not reranked_chunks:
+                    yield result(index, answer=NO_RELEVANT_CONTENT_ANSWER)
+                else:
+                    contexts[index] = reranked_chunks
+
+        # Step 4: pack each context under the token budget and stitch neighbours
+        for index in contexts:
+            contexts[index] = context_packer.assemble(self._keep_top_k(contexts[index]))
+
+        # Step 5: generate answers with bounded concurrency, streaming each one
+        llm_slots = asyncio.Semaphore(settings.QA_BATCH_LLM_CONCURRENCY)
+
+        async def generate(index: int) -> Dict[str, Any]:
+            async with llm_slots:
+                try:
+                    answer = await asyncio.to_thread(answer_generator.generate_answer, questions[index], "\n".join(contexts[index]))
+                    return result(index, answer=answer)
+                except Exception as e:
+                    logger.error(f"Answer generation failed for question {index}: {str(e)}")
+                    return result(index, error=f"Failed to generate answer: {str(e)}")
+
+        tasks = [asyncio.ensure_future(generate(index)) for index in contexts]
+        new_answers: Dict[str, str] = {}
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                answer = await next_result
+                if "answer" in answer:
+                    new_answers[answer["question"]] = answer["answer"]
+                yield answer
+        finally:
+            # The client may disconnect mid-stream
+            for task in tasks:
+                task.cancel()
+
+        if new_answers:
+            try:
+                async with async_session() as session:
+                    await db_optimizations.cache_answers(new_answers, session, user_id, settings.CACHE_TTL)
+            except Exception as e:
+                logger.error(f"Failed to cache batch answers: {str(e)}")
+
 qa_service = QAService() 
\ No newline at end of file
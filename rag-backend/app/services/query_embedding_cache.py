@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from prometheus_client import Counter
+
+QUERY_CACHE_REQUESTS = Counter(
+    "query_embedding_cache_requests_total",
+    "Question embedding cache lookups",
+    ["result"]
+)
+QUERY_CACHE_EVICTIONS = Counter(
+    "query_embedding_cache_evictions_total",
+    "Question embeddings evicted to stay under the byte limit"
+)
+
+class QueryEmbeddingCache:
+    """Bounded in-process LRU of question text to float32 embedding.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    dropped once the stored vectors exceed ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        # The bge tokenizer lowercases its input, so case does not change the vector
+        return " ".join(question.split()).lower()
+
+    def get(self, question: str) -> Optional[List[float]]:
+        key = self.normalize(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                QUERY_CACHE_REQUESTS.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            QUERY_CACHE_REQUESTS.labels(result="hit").inc()
+            return entry[1].tolist()
+
+    def put(self, question: str, vector: List[float]):
+        key = self.normalize(question)
+        array = np.asarray(vector, dtype=np.float32)
+        if array.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, array)
+            self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                QUERY_CACHE_EVICTIONS.inc()
+
+    def _remove(self, key: str):
+        _, array = self._entries.pop(key)
+        self.bytes -= array.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,40 +1,108 @@
+import resource
+import threading
+import time
+import psutil
 import torch
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
-from typing import List
-from tenacity import retry, stop_after_attempt, wait_exponential
+from prometheus_client import Gauge, Histogram
+from transformers import AutoModelForSequenceClassification
+from typing import List, Tuple
+from app.services.model_registry import model_registry
+from app.services.inference_executor import inference_executor
+from app.services.batching import plan_length_buckets
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+RERANK_LATENCY = Histogram(
+    "reranker_latency_seconds",
+    "Wall time of a rerank_chunks call",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RERANK_PEAK_RSS = Gauge(
+    "reranker_peak_rss_bytes",
+    "Peak resident set size of the process running the reranker"
+)
+
 class Reranker:
     def __init__(self):
         self.MODEL_NAME = 'BAAI/bge-reranker-v2-m3'
-        self.tokenizer = self._load_tokenizer()
-        self.model = self._load_model()
-        self.model.eval()
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.last_call_stats = {}
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _load_tokenizer(self):
-        logger.info(f"Loading reranker tokenizer for {self.MODEL_NAME}")
-        return AutoTokenizer.from_pretrained(self.MODEL_NAME)
+    def load(self):
+        """Fetch the tokenizer and model from the registry; safe to call repeatedly."""
+        with self._load_lock:
+            if self._model is None:
+                self._tokenizer = model_registry.get_tokenizer(self.MODEL_NAME)
+                self._model = model_registry.get_model(
+                    self.MODEL_NAME,
+                    AutoModelForSequenceClassification,
+                    quantize=settings.RERANKER_QUANTIZE
+                )
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _load_model(self):
-        logger.info(f"Loading reranker model {self.MODEL_NAME}")
-        return AutoModelForSequenceClassification.from_pretrained(self.MODEL_NAME)
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
 
-    def rerank_chunks(self, question: str, chunks: List[str], score_threshold: float = 1.0, return_debug: bool = False) -> List[str]:
-        pairs = [[question, chunk] for chunk in chunks]
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self.load()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load()
+        return self._model
+
+    def warm_up(self):
+        """Load the model and score a dummy pair."""
+        self.load()
+        self.rerank_chunks("warm-up", ["warm-up"], score_threshold=float("-inf"))
+
+    def score_chunks(self, question: str, chunks: List[str]) -> List[float]:
+        """Score every (question, chunk) pair, in input order."""
+        return self.score_pairs([(question, chunk) for chunk in chunks])
+
+    def score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Score (question, chunk) pairs, in input order.
+
+        Pairs are tokenized once, sorted by length and scored in batches that
+        stay under RERANKER_TOKEN_BUDGET padded tokens, so a broad question
+        matching hundreds of chunks never builds one huge activation tensor.
+        Pairs may come from different questions.
+        """
+        if not pairs:
+            return []
+        encoded = self.tokenizer([list(pair) for pair in pairs], truncation=True, max_length=512)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        batches = plan_length_buckets(lengths, settings.RERANKER_TOKEN_BUDGET, settings.RERANKER_MAX_BATCH_SIZE)
+
+        scores = [0.0] * len(pairs)
         with torch.no_grad():
-            inputs = self.tokenizer(pairs, padding=True, truncation=True, return_tensors='pt', max_length=512)
-            scores = self.model(**inputs, return_dict=True).logits.view(-1).float()
+            for batch in batches:
+                features = {key: [encoded[key][i] for i in batch] for key in encoded.keys()}
+                inputs = self.tokenizer.pad(features, padding=True, return_tensors='pt')
+                logits = self.model(**inputs, return_dict=True).logits.view(-1).float()
+                for i, score in zip(batch, logits.tolist()):
+                    scores[i] = score
+        return scores
+
+    def rerank_chunks(self, question: str, chunks: List[str], score_threshold: float = 1.0, return_debug: bool = False) -> List[str]:
+        start = time.perf_counter()
+        scores = self.score_chunks(question, chunks)
 
         # Filter and sort by score
         scored_pairs = sorted(
-            [(score.item(), chunk) for score, chunk in zip(scores, chunks) if score.item() >= score_threshold],
+            [(score, chunk) for score, chunk in zip(scores, chunks) if score >= score_threshold],
             key=lambda x: x[0],
             reverse=True
         )
+        self._record_call(len(chunks), time.perf_counter() - start)
 
         if return_debug:
             print("🔍 Reranker Scores:")
@@ -43,4 +111,59 @@ class Reranker:
 
         return [chunk for _, chunk in scored_pairs]
 
-reranker = Reranker() 
\ No newline at end of file
+    def rerank_many(self, queries: List[Tuple[str, List[str]]], score_threshold: float = 1.0) -> List[List[str]]:
+        """Rerank the chunks of several questions in shared batches."""
+        start = time.perf_counter()
+        pairs = [(question, chunk) for question, chunks in queries for chunk in chunks]
+        scores = self.score_pairs(pairs)
+
+        results = []
+        offset = 0
+        for _, chunks in queries:
+            chunk_scores = scores[offset:offset + len(chunks)]
+            offset += len(chunks)
+            scored_pairs = sorted(
+                [(score, chunk) for score, chunk in zip(chunk_scores, chunks) if score >= score_threshold],
+                key=lambda x: x[0],
+                reverse=True
+            )
+            results.append([chunk for _, chunk in scored_pairs])
+        self._record_call(len(pairs), time.perf_counter() - start)
+        return results
+
+    def _record_call(self, pair_count: int, latency: float):
+        # ru_maxrss is reported in kilobytes on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        rss = psutil.Process().memory_info().rss
+        self.last_call_stats = {
+            "pairs": pair_count,
+            "latency_ms": latency * 1000,
+            "rss_bytes": rss,
+            "peak_rss_bytes": peak_rss,
+        }
+        RERANK_LATENCY.observe(latency)
+        RERANK_PEAK_RSS.set(peak_rss)
+        logger.info(
+            f"Reranked {pair_count} pairs in {latency * 1000:.0f}ms "
+            f"(rss {rss / 1024 / 1024:.0f}MB, peak rss {peak_rss / 1024 / 1024:.0f}MB)"
+        )
+
+    async def rerank_chunks_async(self, question: str, chunks: List[str], score_threshold: float = 1.0, return_debug: bool = False) -> List[str]:
+        """Run rerank_chunks on the inference executor instead of the event loop."""
+        return await inference_executor.run(rerank_in_worker, question, chunks, score_threshold, return_debug)
+
+    async def rerank_many_async(self, queries: List[Tuple[str, List[str]]], score_threshold: float = 1.0) -> List[List[str]]:
+        """Run rerank_many on the inference executor instead of the event loop."""
+        return await inference_executor.run(rerank_many_in_worker, queries, score_threshold)
+
+# Module-level entry points so they can be submitted to a process pool
+def rerank_in_worker(question: str, chunks: List[str], score_threshold: float, return_debug: bool) -> List[str]:
+    return reranker.rerank_chunks(question, chunks, score_threshold=score_threshold, return_debug=return_debug)
+
+def rerank_many_in_worker(queries: List[Tuple[str, List[str]]], score_threshold: float) -> List[List[str]]:
+    return reranker.rerank_many(queries, score_threshold=score_threshold)
+
+def warm_up_reranker_model():
+    reranker.warm_up()
+
+reranker = Reranker()
@@ -0,0 +1,95 @@
+import math
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.services.document_storage import document_storage
+from app.services.vector_index_manager import vector_index_manager
+from app.core.logger import logger
+
+# pgvector caps hnsw.ef_search at this value
+MAX_EF_SEARCH = 1000
+
+class RetrievalPlan(NamedTuple):
+    kind: str  # "exact" or "ann"
+    chunk_count: Optional[int]
+    probes: Optional[int] = None
+    ef_search: Optional[int] = None
+
+class RetrievalPlanner:
+    """Chooses between an exact filtered scan and an ANN query per user.
+
+    The global ANN index visits chunks of every tenant, so for a user with
+    few enabled chunks most of what it scans is filtered away and an exact
+    scan of their chunks (served by the document_id index) is both faster
+    and exact. Large tenants use the ANN index with probes / ef_search
+    raised in proportion to how selective their filter is. Enabled chunk
+    counts come from ``user_chunk_stats`` and are cached in process for
+    ``stats_ttl`` seconds.
+    """
+
+    def __init__(self, exact_max_chunks: int, stats_ttl: float):
+        self.exact_max_chunks = exact_max_chunks
+        self.stats_ttl = stats_ttl
+        self._counts: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._counts.pop(str(user_id), None)
+
+    async def enabled_chunk_count(self, user_id: str, session: AsyncSession) -> int:
+        key = str(user_id)
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        count = await document_storage.get_enabled_chunk_count(user_id, session)
+        if count is None:
+            # No stats row until the user's first upload or toggle; count
+            # directly rather than write from the read path
+            count, _ = await document_storage.count_user_chunks(user_id, session)
+        with self._lock:
+            self._counts[key] = (time.monotonic() + self.stats_ttl, count)
+        return count
+
+    def plan_for(self, chunk_count: int, top_k: int, index_stats: Optional[Dict[str, Any]] = None) -> RetrievalPlan:
+        if chunk_count <= self.exact_max_chunks:
+            return RetrievalPlan("exact", chunk_count)
+
+        index_stats = index_stats or {}
+        if settings.VECTOR_INDEX_TYPE == "hnsw":
+            rows = index_stats.get("rows")
+            ef_search = settings.HNSW_EF_SEARCH
+            if rows:
+                # The graph walk must see about rows / chunk_count candidates
+                # per chunk the filter keeps
+                ef_search = math.ceil(2 * top_k * rows / chunk_count)
+            ef_search = max(settings.HNSW_EF_SEARCH, min(MAX_EF_SEARCH, ef_search))
+            return RetrievalPlan("ann", chunk_count, ef_search=ef_search)
+
+        lists = index_stats.get("lists") or settings.IVFFLAT_LISTS
+        # Each list holds about chunk_count / lists of the user's chunks;
+        # probe enough lists to expect twice top_k of them
+        probes = math.ceil(2 * top_k * lists / chunk_count)
+        probes = max(settings.IVFFLAT_PROBES, min(lists, probes))
+        return RetrievalPlan("ann", chunk_count, probes=probes)
+
+    async def plan(self, user_id: str, top_k: int, session: AsyncSession) -> RetrievalPlan:
+        chunk_count = await self.enabled_chunk_count(user_id, session)
+        plan = self.plan_for(chunk_count, top_k, vector_index_manager.last_stats)
+        if plan.kind == "exact":
+            logger.info(f"Retrieval plan for user {user_id}: exact scan over {chunk_count} chunks")
+        else:
+            logger.info(
+                f"Retrieval plan for user {user_id}: ANN over {chunk_count} chunks "
+                f"(probes={plan.probes}, ef_search={plan.ef_search})"
+            )
+        return plan
+
+retrieval_planner = RetrievalPlanner(
+    exact_max_chunks=settings.RETRIEVAL_EXACT_MAX_CHUNKS,
+    stats_ttl=settings.RETRIEVAL_STATS_TTL
+)
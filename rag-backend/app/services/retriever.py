@@ -1,79 +1,259 @@
+import asyncio
 import numpy as np
-from typing import List, Optional
+from typing import Dict, Hashable, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from app.db.base import async_session
 from app.db.models import DocumentChunk, UserDocument
+from app.db.optimizations import db_optimizations, text_search_config
 from app.services.embedding_service import embedding_service
+from app.services.user_index_cache import user_index_cache
+from app.services.retrieval_planner import retrieval_planner
+from app.core.config import settings
 from app.core.logger import logger
 
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Hashable]],
+    weights: Dict[str, float],
+    k: int = 60
+) -> List[Hashable]:
+    """Merge ranked lists by weighted reciprocal rank: sum(w / (k + rank)).
+
+    Ties keep the order in which items were first seen.
+    """
+    scores: Dict[Hashable, float] = {}
+    for mode, ranked in rankings.items():
+        weight = weights.get(mode, 1.0)
+        for rank, item in enumerate(ranked, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+class RetrievedChunk(str):
+    """Chunk text that also carries what retrieval already knows about it.
+
+    It is a str so callers that only need the text are unaffected; the
+    context packer uses the stored token count and embedding, and the
+    document position to stitch neighbouring chunks back together.
+    """
+
+    def __new__(
+        cls,
+        content: str,
+        distance: Optional[float] = None,
+        token_count: Optional[int] = None,
+        embedding=None,
+        document_id=None,
+        chunk_index: Optional[int] = None
+    ):
+        chunk = super().__new__(cls, content)
+        chunk.distance = distance
+        chunk.document_id = document_id
+        chunk.chunk_index = chunk_index
+        chunk.token_count = token_count
+        chunk.embedding = embedding
+        return chunk
+
 class DocumentRetriever:
-    async def retrieve_relevant_chunks(
+    @staticmethod
+    def _restrict_to_enabled_documents(query, user_id: Optional[str]):
+        if not user_id:
+            return query
+        # Restrict to the user's QA-enabled documents with a semi-join so
+        # retrieval stays one round trip, and the SQL text (and the cached
+        # prepared statement) is the same however many documents the user
+        # has enabled
+        enabled_documents = select(UserDocument.document_id).where(
+            UserDocument.user_id == user_id,
+            UserDocument.enabled_for_qa == 1
+        )
+        return query.where(DocumentChunk.document_id.in_(enabled_documents))
+
+    def _lexical_query(self, question: str, user_id: Optional[str], limit: int):
+        config = text_search_config()
+        document = func.to_tsvector(config, DocumentChunk.content)
+        query = func.websearch_to_tsquery(config, question)
+        rank = func.ts_rank_cd(document, query)
+        lexical_query = select(
+            DocumentChunk.id,
+            DocumentChunk.document_id,
+            DocumentChunk.chunk_index,
+            DocumentChunk.content,
+            DocumentChunk.token_count,
+            DocumentChunk.embedding
+        ).where(
+            document.op("@@")(query)
+        ).order_by(
+            rank.desc()
+        ).limit(limit)
+        return self._restrict_to_enabled_documents(lexical_query, user_id)
+
+    async def _run_lexical_query(self, question: str, user_id: Optional[str], limit: int):
+        # A session cannot run two statements at once, so the lexical query
+        # gets its own connection and overlaps the embedding and ANN query
+        async with async_session() as lexical_session:
+            result = await lexical_session.execute(self._lexical_query(question, user_id, limit))
+            return result.all()
+
+    @staticmethod
+    def _to_chunk(row, distance: Optional[float]) -> RetrievedChunk:
+        return RetrievedChunk(
+            row.content,
+            distance=distance,
+            token_count=row.token_count,
+            embedding=row.embedding,
+            document_id=row.document_id,
+            chunk_index=row.chunk_index
+        )
+
+    async def _query_nearest_chunks(
         self,
-        question: str,
+        embedding_vector: List[float],
         session: AsyncSession,
-        user_id: Optional[str] = None,
-        similarity_threshold: float = 0.3
-    ) -> List[str]:
-        logger.info(f"Starting chunk retrieval for question: {question}")
-        
-        try:
-            # Step 1: Embed the question
-            logger.info("Generating question embedding")
-            question_embedding = (await embedding_service.embed_texts([question]))[0]
-            embedding_vector = np.array(question_embedding).tolist()
-            logger.info("Question embedding generated successfully")
-
-            # Step 2: Use pgvector to filter by similarity
-            cosine_distance = DocumentChunk.embedding.cosine_distance(embedding_vector)
-            similarity_expr = (1 - cosine_distance) * 100
+        user_id: Optional[str],
+        similarity_threshold: float,
+        limit: int,
+        probes: Optional[int],
+        ef_search: Optional[int],
+        exact: bool = False
+    ):
+        # Use pgvector to find the nearest chunks
+        cosine_distance = DocumentChunk.embedding.cosine_distance(embedding_vector)
 
+        if settings.RETRIEVAL_MODE == "threshold":
+            # Legacy mode: every chunk within the threshold, ordered by a
+            # derived expression the ANN index cannot serve
+            similarity_expr = (1 - cosine_distance) * 100
             chunks_query = select(
-                DocumentChunk.content,  # Only select the content field
+                DocumentChunk.id,
+                DocumentChunk.document_id,
+                DocumentChunk.chunk_index,
+                DocumentChunk.content,
+                DocumentChunk.token_count,
+                DocumentChunk.embedding,
+                cosine_distance.label("distance"),
                 similarity_expr.label("similarity_percent")
             ).where(
                 cosine_distance <= similarity_threshold
             ).order_by(
                 similarity_expr.desc()
             )
+        else:
+            # ORDER BY embedding <=> :q LIMIT :k lets pgvector serve the
+            # query from the ANN index; the threshold is applied afterwards
+            chunks_query = select(
+                DocumentChunk.id,
+                DocumentChunk.document_id,
+                DocumentChunk.chunk_index,
+                DocumentChunk.content,
+                DocumentChunk.token_count,
+                DocumentChunk.embedding,
+                cosine_distance.label("distance")
+            ).order_by(
+                # "+ 0" hides the distance from the ANN index, so the planner
+                # scans the user's chunks exactly via the document_id filter
+                cosine_distance + 0 if exact else cosine_distance
+            ).limit(limit)
+
+        chunks_query = self._restrict_to_enabled_documents(chunks_query, user_id)
+
+        logger.info("Executing final chunks query")
+        # Connections carry the configured search parameters; only a
+        # per-query override costs an extra statement
+        await db_optimizations.apply_vector_search_params(session, probes=probes, ef_search=ef_search)
+        result = await session.execute(chunks_query)
+        return result.all()
+
+    async def retrieve_relevant_chunks(
+        self,
+        question: str,
+        session: AsyncSession,
+        user_id: Optional[str] = None,
+        similarity_threshold: float = 0.3,
+        top_k: Optional[int] = None,
+        probes: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> List[str]:
+        logger.info(f"Starting chunk retrieval for question: {question}")
+
+        try:
+            top_k = top_k or settings.TOP_K_DOCUMENTS
+            hybrid = settings.RETRIEVAL_MODE == "hybrid"
+            candidates = settings.HYBRID_CANDIDATES or 2 * top_k
+            lexical_task = None
+            if hybrid:
+                lexical_task = asyncio.create_task(self._run_lexical_query(question, user_id, candidates))
 
-            if user_id:
-                logger.info(f"Fetching enabled documents for user: {user_id}")
-                # Get documents enabled for QA for this user
-                try:
-                    result = await session.execute(
-                        select(UserDocument.document_id)
-                        .where(
-                            UserDocument.user_id == user_id,
-                            UserDocument.enabled_for_qa == 1
-                        )
-                    )
-                    selected_doc_ids = [str(row[0]) for row in result.all()]  # Convert UUIDs to strings
-                    logger.info(f"Found {len(selected_doc_ids)} enabled documents")
-                    
-                    if not selected_doc_ids:
-                        logger.warning("No documents enabled for QA")
-                        return []  # Return empty list if no documents are enabled for QA
-                        
-                    chunks_query = chunks_query.where(DocumentChunk.document_id.in_(selected_doc_ids))
-                except Exception as e:
-                    logger.error(f"Error fetching enabled documents: {str(e)}")
-                    raise
-
-            logger.info("Executing final chunks query")
             try:
-                result = await session.execute(chunks_query)
-                filtered_chunks = result.all()
-                chunk_count = len(filtered_chunks)
-                logger.info(f"Retrieved {chunk_count} relevant chunks")
-                
-                chunks = [chunk.content for chunk in filtered_chunks]  # Access content directly
-                return chunks
+                # Step 1: Embed the question, unless the caller embedded it in a batch
+                if query_vector is None:
+                    logger.info("Generating question embedding")
+                    question_embedding = await embedding_service.embed_query(question)
+                    embedding_vector = np.array(question_embedding).tolist()
+                    logger.info("Question embedding generated successfully")
+                else:
+                    embedding_vector = list(query_vector)
+
+                # Step 2: Find the nearest chunks, in process for small tenants
+                cached_chunks = None
+                if user_id and settings.USER_INDEX_CACHE_ENABLED and settings.RETRIEVAL_MODE != "threshold":
+                    cached_chunks = await user_index_cache.search(user_id, embedding_vector, candidates if hybrid else top_k)
+
+                if cached_chunks is not None:
+                    chunk_count = len(cached_chunks)
+                    logger.info(f"Retrieved {chunk_count} relevant chunks from the user index cache")
+                    filtered_chunks = cached_chunks
+                else:
+                    limit = candidates if hybrid else top_k
+                    exact = False
+                    if user_id and settings.RETRIEVAL_MODE != "threshold" and probes is None and ef_search is None:
+                        plan = await retrieval_planner.plan(user_id, limit, session)
+                        exact = plan.kind == "exact"
+                        probes, ef_search = plan.probes, plan.ef_search
+                    filtered_chunks = await self._query_nearest_chunks(
+                        embedding_vector, session, user_id, similarity_threshold,
+                        limit, probes, ef_search, exact=exact
+                    )
+                    chunk_count = len(filtered_chunks)
+                    logger.info(f"Retrieved {chunk_count} relevant chunks")
+
+                if settings.RETRIEVAL_MODE != "threshold":
+                    filtered_chunks = [chunk for chunk in filtered_chunks if chunk.distance <= similarity_threshold]
+                    logger.info(f"{len(filtered_chunks)} of {chunk_count} nearest chunks within similarity threshold")
+
+                if not hybrid:
+                    return [self._to_chunk(chunk, chunk.distance) for chunk in filtered_chunks]
+
+                lexical_chunks = await lexical_task
             except Exception as e:
                 logger.error(f"Error executing chunks query: {str(e)}")
                 raise
-                
+            finally:
+                if lexical_task is not None and not lexical_task.done():
+                    lexical_task.cancel()
+
+            # Step 3: Fuse the vector and lexical rankings
+            rows = {chunk.id: chunk for chunk in (*lexical_chunks, *filtered_chunks)}
+            distances = {chunk.id: chunk.distance for chunk in filtered_chunks}
+            fused = reciprocal_rank_fusion(
+                {
+                    "vector": [chunk.id for chunk in filtered_chunks],
+                    "lexical": [chunk.id for chunk in lexical_chunks],
+                },
+                {
+                    "vector": settings.HYBRID_VECTOR_WEIGHT,
+                    "lexical": settings.HYBRID_LEXICAL_WEIGHT,
+                },
+                settings.HYBRID_RRF_K
+            )[:top_k]
+            logger.info(
+                f"Fused {len(filtered_chunks)} vector and {len(lexical_chunks)} lexical candidates "
+                f"into {len(fused)} chunks"
+            )
+            return [self._to_chunk(rows[chunk_id], distances.get(chunk_id)) for chunk_id in fused]
+
         except Exception as e:
             logger.error(f"Unexpected error in chunk retrieval: {str(e)}")
             raise
 
-document_retriever = DocumentRetriever() 
\ No newline at end of file
+document_retriever = DocumentRetriever()
@@ -0,0 +1,210 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from prometheus_client import Counter
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.db.base import async_session
+from app.db.models import DocumentChunk, UserDocument
+from app.db.optimizations import redis_client
+from app.core.logger import logger
+
+USER_INDEX_REQUESTS = Counter(
+    "user_index_cache_requests_total",
+    "Per-user vector index lookups",
+    ["result"]
+)
+
+class ChunkHit(NamedTuple):
+    id: object
+    content: str
+    distance: float
+    token_count: Optional[int] = None
+    embedding: Optional[np.ndarray] = None
+    document_id: object = None
+    chunk_index: Optional[int] = None
+
+class _UserIndex:
+    __slots__ = ("ids", "contents", "token_counts", "positions", "matrix", "nbytes")
+
+    def __init__(
+        self,
+        ids: List[object],
+        contents: List[str],
+        matrix: np.ndarray,
+        token_counts: Optional[List[Optional[int]]] = None,
+        positions: Optional[List[Tuple[object, int]]] = None
+    ):
+        self.ids = ids
+        self.contents = contents
+        self.token_counts = token_counts or [None] * len(ids)
+        # (document_id, chunk_index) of each chunk
+        self.positions = positions or [(None, None)] * len(ids)
+        self.matrix = matrix
+        self.nbytes = matrix.nbytes + sum(len(content) for content in contents)
+
+class UserIndexCache:
+    """Read-through, in-process exact vector index per user.
+
+    For users whose enabled documents hold at most ``max_chunks`` chunks the
+    normalized embeddings are kept as one float32 matrix, so retrieval is a
+    matrix-vector product and an ``argpartition`` instead of a Postgres round
+    trip. Entries are keyed by the user's document-set generation, a Redis
+    counter bumped whenever the set changes, so every worker drops stale
+    entries on its next lookup. The least recently used entries are evicted
+    once the matrices exceed ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, max_chunks: int):
+        self.max_bytes = max_bytes
+        self.max_chunks = max_chunks
+        self.bytes = 0
+        # user_id -> (generation, index); index None marks an oversized user
+        self._entries: "OrderedDict[str, Tuple[int, Optional[_UserIndex]]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _generation_key(user_id: str) -> str:
+        return f"doc_set_version:{user_id}"
+
+    def _generation(self, user_id: str) -> int:
+        return int(redis_client.get(self._generation_key(user_id)) or 0)
+
+    def invalidate(self, user_id: str):
+        """Mark the user's enabled-document set as changed in every worker."""
+        with self._lock:
+            self._remove(str(user_id))
+        try:
+            redis_client.incr(self._generation_key(user_id))
+        except Exception as e:
+            logger.error(f"Failed to bump document set version for user {user_id}: {str(e)}")
+
+    async def search(
+        self,
+        user_id: str,
+        query_vector: List[float],
+        limit: int
+    ) -> Optional[List[ChunkHit]]:
+        """Exact nearest chunks for the user, or None if the user is not cacheable."""
+        user_id = str(user_id)
+        try:
+            generation = self._generation(user_id)
+        except Exception as e:
+            # Without the version we cannot tell whether an entry is stale
+            logger.warning(f"User index cache bypassed, document set version unavailable: {str(e)}")
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(user_id)
+            else:
+                entry = None
+
+        if entry is None:
+            index = await self._load(user_id, generation)
+            result = "miss"
+        else:
+            index = entry[1]
+            result = "hit"
+
+        if index is None:
+            USER_INDEX_REQUESTS.labels(result="oversized").inc()
+            return None
+        USER_INDEX_REQUESTS.labels(result=result).inc()
+        return self._top_k(index, query_vector, limit)
+
+    @staticmethod
+    def _top_k(index: _UserIndex, query_vector: List[float], limit: int) -> List[ChunkHit]:
+        if not index.ids:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarities = index.matrix @ query
+        k = min(limit, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [
+            ChunkHit(
+                index.ids[i], index.contents[i], float(1.0 - similarities[i]),
+                index.token_counts[i], index.matrix[i], *index.positions[i]
+            )
+            for i in top
+        ]
+
+    async def _load(self, user_id: str, generation: int) -> Optional[_UserIndex]:
+        # Concurrent misses for the same user share one load, on a session of
+        # its own so it does not depend on the request that started it
+        key = (user_id, generation)
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        index = await asyncio.shield(task)
+
+        with self._lock:
+            self._remove(user_id)
+            self._entries[user_id] = (generation, index)
+            if index is not None:
+                self.bytes += index.nbytes
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+        return index
+
+    async def _fetch(self, user_id: str) -> Optional[_UserIndex]:
+        enabled_documents = select(UserDocument.document_id).where(
+            UserDocument.user_id == user_id,
+            UserDocument.enabled_for_qa == 1
+        )
+        in_enabled_documents = DocumentChunk.document_id.in_(enabled_documents)
+        async with async_session() as session:
+            chunk_count = (await session.execute(
+                select(func.count()).select_from(DocumentChunk).where(in_enabled_documents)
+            )).scalar()
+            if chunk_count > self.max_chunks:
+                logger.info(f"User {user_id} has {chunk_count} enabled chunks, serving retrieval from Postgres")
+                return None
+
+            result = await session.execute(
+                select(
+                    DocumentChunk.id,
+                    DocumentChunk.document_id,
+                    DocumentChunk.chunk_index,
+                    DocumentChunk.content,
+                    DocumentChunk.token_count,
+                    DocumentChunk.embedding
+                ).where(in_enabled_documents)
+            )
+            rows = [row for row in result.all() if row.embedding is not None]
+
+        if rows:
+            matrix = np.vstack([np.asarray(row.embedding, dtype=np.float32) for row in rows])
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        index = _UserIndex(
+            [row.id for row in rows],
+            [row.content for row in rows],
+            matrix,
+            [row.token_count for row in rows],
+            [(row.document_id, row.chunk_index) for row in rows]
+        )
+        logger.info(f"Loaded vector index for user {user_id}: {len(rows)} chunks, {index.nbytes / 1024 / 1024:.1f}MB")
+        return index
+
+    def _remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None and entry[1] is not None:
+            self.bytes -= entry[1].nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+user_index_cache = UserIndexCache(
+    max_bytes=settings.USER_INDEX_CACHE_MAX_MB * 1024 * 1024,
+    max_chunks=settings.USER_INDEX_CACHE_MAX_CHUNKS
+)
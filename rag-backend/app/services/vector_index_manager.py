@@ -0,0 +1,248 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from prometheus_client import Gauge
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.exceptions import DatabaseError
+from app.db.base import engine
+from app.db.optimizations import db_optimizations, VECTOR_INDEX_NAMES
+from app.core.logger import logger
+
+VECTOR_INDEX_ROWS = Gauge("vector_index_rows", "Estimated rows in document_chunks at the last index check")
+VECTOR_INDEX_SIZE = Gauge("vector_index_size_bytes", "On-disk size of the vector index")
+VECTOR_INDEX_IMBALANCE = Gauge(
+    "vector_index_list_imbalance",
+    "Largest sampled IVFFlat list relative to the mean list size"
+)
+VECTOR_INDEX_BUILD_SECONDS = Gauge("vector_index_last_build_seconds", "Duration of the last vector index build")
+
+# pgvector rejects more lists than this
+MAX_IVFFLAT_LISTS = 32768
+# pg_try_advisory_lock key so only one worker rebuilds at a time
+REBUILD_LOCK_KEY = 7_341_201
+# Build records kept for the admin endpoint
+BUILD_HISTORY = 20
+
+def recommend_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    lists = rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows))
+    return max(1, min(MAX_IVFFLAT_LISTS, lists))
+
+def _parse_reloptions(reloptions: Optional[List[str]]) -> Dict[str, str]:
+    return dict(option.split("=", 1) for option in reloptions or [])
+
+class VectorIndexManager:
+    """Keeps the vector index tuned as ``document_chunks`` grows.
+
+    IVFFlat centroids are trained when the index is built, so an index
+    created on an empty or small table keeps its initial ``lists`` and
+    becomes unbalanced as chunks are ingested. The manager periodically
+    checks the row count and sampled list sizes and rebuilds the index with
+    ``REINDEX CONCURRENTLY`` when ``lists`` is far from the recommendation
+    or the lists are skewed. Builds can also be triggered from the admin API.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self.builds: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._rebuild_lock = asyncio.Lock()
+
+    @property
+    def index_name(self) -> str:
+        return VECTOR_INDEX_NAMES[settings.VECTOR_INDEX_TYPE]
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild_lock.locked()
+
+    async def collect_stats(self, sample_lists: bool = True) -> Dict[str, Any]:
+        """Row count, index size and parameters, and sampled list imbalance."""
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = 'document_chunks'::regclass"
+            ))).scalar()
+            if rows is None or rows < 0:
+                # Never vacuumed or analyzed yet
+                rows = (await conn.execute(text("SELECT count(*) FROM document_chunks"))).scalar()
+
+            index = (await conn.execute(text("""
+                SELECT pg_relation_size(c.oid) AS size, c.reloptions, am.amname
+                FROM pg_class c JOIN pg_am am ON am.oid = c.relam
+                WHERE c.relname = :name
+            """), {"name": self.index_name})).first()
+
+            stats: Dict[str, Any] = {
+                "index": self.index_name,
+                "index_type": settings.VECTOR_INDEX_TYPE,
+                "index_exists": index is not None,
+                "rows": int(rows),
+                "size_bytes": int(index.size) if index is not None else 0,
+                "lists": None,
+                "recommended_lists": None,
+                "list_imbalance": None,
+                "checked_at": datetime.utcnow().isoformat(),
+            }
+            if index is not None and index.amname == "ivfflat":
+                options = _parse_reloptions(index.reloptions)
+                stats["lists"] = int(options.get("lists", 100))  # pgvector's default
+                stats["recommended_lists"] = recommend_lists(stats["rows"])
+                if sample_lists and stats["rows"] > 0:
+                    stats["list_imbalance"] = await self._sample_list_imbalance(conn, stats["rows"], stats["lists"])
+            await conn.rollback()
+
+        VECTOR_INDEX_ROWS.set(stats["rows"])
+        VECTOR_INDEX_SIZE.set(stats["size_bytes"])
+        if stats["list_imbalance"] is not None:
+            VECTOR_INDEX_IMBALANCE.set(stats["list_imbalance"])
+        self.last_stats = stats
+        return stats
+
+    async def _sample_list_imbalance(self, conn, rows: int, lists: int) -> Optional[float]:
+        # With probes = 1 an IVFFlat scan returns exactly the rows of the list
+        # nearest to the query vector, so an unbounded scan from a sampled
+        # chunk's own embedding measures the size of the list it belongs to.
+        # Lists are sampled in proportion to their size, which is also how
+        # queries land on them.
+        await conn.execute(text("SET LOCAL ivfflat.probes = 1"))
+        await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        if settings.VECTOR_ITERATIVE_SCAN != "off":
+            await conn.execute(text("SET LOCAL ivfflat.iterative_scan = off"))
+
+        samples = settings.VECTOR_INDEX_IMBALANCE_SAMPLES
+        percent = min(100.0, 100.0 * samples * 10 / rows)
+        sample_ids = (await conn.execute(
+            text(f"SELECT id FROM document_chunks TABLESAMPLE SYSTEM ({percent:.6f}) WHERE embedding IS NOT NULL LIMIT :n"),
+            {"n": samples}
+        )).scalars().all()
+
+        sizes = []
+        for chunk_id in sample_ids:
+            size = (await conn.execute(text("""
+                SELECT count(*) FROM (
+                    SELECT 1 FROM document_chunks
+                    ORDER BY embedding <=> (SELECT embedding FROM document_chunks WHERE id = :id)
+                    LIMIT :rows
+                ) list_rows
+            """), {"id": chunk_id, "rows": rows})).scalar()
+            sizes.append(size)
+        if not sizes:
+            return None
+        return max(sizes) / max(rows / lists, 1.0)
+
+    def rebuild_reason(self, stats: Dict[str, Any]) -> Optional[str]:
+        """Why the index should be rebuilt, or None if it is fine as it is."""
+        if not stats["index_exists"]:
+            return "index is missing"
+        if stats["lists"] is None or stats["rows"] < settings.VECTOR_INDEX_MIN_ROWS:
+            # HNSW needs no retraining; tiny tables are not worth rebuilding
+            return None
+        ratio = stats["lists"] / stats["recommended_lists"]
+        if max(ratio, 1 / ratio) >= settings.VECTOR_INDEX_LISTS_TOLERANCE:
+            return f"lists={stats['lists']} is far from the recommended {stats['recommended_lists']}"
+        if stats["list_imbalance"] is not None and stats["list_imbalance"] >= settings.VECTOR_INDEX_MAX_IMBALANCE:
+            return f"largest sampled list is {stats['list_imbalance']:.1f}x the mean"
+        return None
+
+    async def rebuild(self, force: bool = False) -> Dict[str, Any]:
+        """Rebuild the vector index if it needs it (or unconditionally with ``force``)."""
+        async with self._rebuild_lock:
+            stats = await self.collect_stats()
+            reason = self.rebuild_reason(stats) or ("forced" if force else None)
+            if reason is None:
+                return {"rebuilt": False, "stats": stats}
+
+            lists = stats["recommended_lists"]
+            logger.info(f"Rebuilding vector index {self.index_name}: {reason}")
+            # CONCURRENTLY cannot run inside a transaction block
+            async with self.engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": REBUILD_LOCK_KEY})).scalar()
+                if not locked:
+                    logger.info("Vector index rebuild already running in another worker")
+                    return {"rebuilt": False, "reason": "rebuild running in another worker", "stats": stats}
+                try:
+                    started = time.perf_counter()
+                    if not stats["index_exists"]:
+                        await conn.execute(text(db_optimizations.vector_index_sql(
+                            lists=recommend_lists(stats["rows"]), concurrently=True
+                        )))
+                    else:
+                        if lists is not None:
+                            # Only the metadata changes here; scans keep using
+                            # the old lists until the REINDEX swaps the index
+                            await conn.execute(text(f"ALTER INDEX {self.index_name} SET (lists = {int(lists)})"))
+                        await conn.execute(text(f"REINDEX INDEX CONCURRENTLY {self.index_name}"))
+                    duration = time.perf_counter() - started
+                except Exception as e:
+                    logger.error(f"Vector index rebuild failed: {str(e)}")
+                    raise DatabaseError(f"Failed to rebuild vector index: {str(e)}")
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REBUILD_LOCK_KEY})
+
+            after = await self.collect_stats(sample_lists=False)
+            build = {
+                "finished_at": after["checked_at"],
+                "reason": reason,
+                "duration_seconds": round(duration, 3),
+                "rows": after["rows"],
+                "lists": after["lists"],
+                "size_bytes_before": stats["size_bytes"],
+                "size_bytes": after["size_bytes"],
+            }
+            self.builds = (self.builds + [build])[-BUILD_HISTORY:]
+            VECTOR_INDEX_BUILD_SECONDS.set(duration)
+            logger.info(
+                f"Rebuilt {self.index_name} in {duration:.1f}s: {after['rows']} rows, "
+                f"lists={after['lists']}, {after['size_bytes'] / 1024 / 1024:.1f}MB"
+            )
+            return {"rebuilt": True, "build": build, "stats": after}
+
+    def trigger_rebuild(self, force: bool = False) -> bool:
+        """Start a rebuild in the background; False if one is already running."""
+        if self.rebuilding or (self._rebuild_task is not None and not self._rebuild_task.done()):
+            return False
+        self._rebuild_task = asyncio.create_task(self._run_rebuild(force))
+        return True
+
+    async def _run_rebuild(self, force: bool):
+        try:
+            await self.rebuild(force=force)
+        except Exception as e:
+            logger.error(f"Vector index maintenance failed: {str(e)}")
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Schedule periodic maintenance if an interval is configured."""
+        if settings.VECTOR_INDEX_MAINTENANCE_INTERVAL <= 0:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._maintenance_loop())
+        return self._task
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(settings.VECTOR_INDEX_MAINTENANCE_INTERVAL)
+            await self._run_rebuild(force=False)
+
+    async def stop(self):
+        for task in (self._task, self._rebuild_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "rebuilding": self.rebuilding,
+            "stats": self.last_stats,
+            "builds": list(self.builds),
+        }
+
+vector_index_manager = VectorIndexManager(engine)
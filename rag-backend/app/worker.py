@@ -0,0 +1,118 @@
+"""Ingestion worker: ``python -m app.worker [--concurrency N]``.
+
+Drains the Redis ingestion queue that ``POST /documents/upload`` feeds and
+runs each job (extract, chunk, embed, store) outside the API process, so
+API and ingestion capacity scale independently. Any number of worker
+processes can run against the same queue.
+"""
+import argparse
+import asyncio
+import signal
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.base import async_session
+from app.services.document_service import document_service
+from app.services.document_storage import document_storage
+from app.services.ingestion_queue import ingestion_queue
+from app.services.inference_executor import inference_executor
+from app.services.pdf_extractor import pdf_extractor
+
+class IngestionWorker:
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping: Optional[asyncio.Event] = None
+
+    def stop(self):
+        if self._stopping is not None and not self._stopping.is_set():
+            logger.info("Ingestion worker stopping after the jobs in progress")
+            self._stopping.set()
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        maintenance = asyncio.create_task(self._maintenance_loop())
+        logger.info(f"Ingestion worker started with concurrency {self.concurrency}")
+        try:
+            while not self._stopping.is_set():
+                await slots.acquire()
+                try:
+                    job_id = ingestion_queue.dequeue()
+                except Exception as e:
+                    logger.error(f"Failed to read the ingestion queue: {str(e)}")
+                    job_id = None
+                if job_id is None:
+                    slots.release()
+                    await self._sleep(self.poll_interval)
+                    continue
+                if job_id in self._running:
+                    # A stale-job sweep requeued a job this worker still runs
+                    logger.info(f"Ingestion job {job_id} is already running, skipping")
+                    slots.release()
+                    continue
+                task = asyncio.create_task(self._process(job_id))
+                self._running[job_id] = task
+                task.add_done_callback(lambda task, job_id=job_id: self._finished(job_id, task, slots))
+        finally:
+            maintenance.cancel()
+            if self._running:
+                await asyncio.gather(*self._running.values(), return_exceptions=True)
+            logger.info("Ingestion worker stopped")
+
+    def _finished(self, job_id: str, task: asyncio.Task, slots: asyncio.Semaphore):
+        if self._running.get(job_id) is task:
+            del self._running[job_id]
+        slots.release()
+
+    async def _process(self, job_id: str):
+        try:
+            if not await document_service.ingest_job(job_id):
+                logger.info(f"Ingestion job {job_id} was already claimed, skipping")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} crashed: {str(e)}")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _maintenance_loop(self):
+        # Running jobs are touched well within INGEST_JOB_TIMEOUT so a long
+        # embedding stage is not mistaken for a dead worker
+        interval = max(1.0, settings.INGEST_JOB_TIMEOUT / 3)
+        while True:
+            try:
+                if self._running:
+                    async with async_session() as session:
+                        for job_id in list(self._running):
+                            await document_storage.update_ingestion_job(job_id, session)
+                        await session.commit()
+                await document_service.requeue_stale_jobs()
+            except Exception as e:
+                logger.error(f"Ingestion worker maintenance failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the document ingestion worker")
+    parser.add_argument("--concurrency", type=int, default=settings.INGEST_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    worker = IngestionWorker(args.concurrency, settings.INGEST_POLL_INTERVAL)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    try:
+        asyncio.run(run())
+    finally:
+        inference_executor.shutdown()
+        pdf_extractor.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import pickle
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.context_packer import ContextPacker
+from app.services.retriever import RetrievedChunk
+
+def _chunk(content, token_count, embedding=None):
+    return RetrievedChunk(content, distance=0.1, token_count=token_count, embedding=embedding)
+
+@pytest.mark.functional
+def test_pack_fills_budget_in_rank_order():
+    """Test that chunks are taken in order and over-budget ones are skipped."""
+    packer = ContextPacker(token_budget=100, dedup_threshold=0.95)
+    chunks = [_chunk("best", 60), _chunk("too long", 50), _chunk("short", 30), _chunk("also short", 20)]
+
+    with patch.object(ContextPacker, 'tokenizer', new=None):
+        assert packer.pack(chunks) == ["best", "short"]
+        assert packer.pack(chunks, token_budget=200) == ["best", "too long", "short", "also short"]
+
+@pytest.mark.functional
+def test_pack_drops_near_duplicates():
+    """Test that exact repeats and near-identical embeddings are packed once."""
+    packer = ContextPacker(token_budget=1000, dedup_threshold=0.95)
+    chunks = [
+        _chunk("original", 10, [1.0, 0.0]),
+        _chunk("reworded copy", 10, [0.99, 0.05]),
+        _chunk("different", 10, [0.0, 1.0]),
+        _chunk("original", 10, None),
+    ]
+
+    assert packer.pack(chunks) == ["original", "different"]
+
+@pytest.mark.functional
+def test_pack_tokenizes_chunks_without_stored_counts():
+    """Test the tokenizer fallback for plain strings and legacy rows."""
+    tokenizer = MagicMock()
+    tokenizer.encode.side_effect = lambda text, add_special_tokens: text.split()
+    packer = ContextPacker(token_budget=3, dedup_threshold=0.95)
+
+    with patch('app.services.context_packer.model_registry.get_tokenizer', return_value=tokenizer):
+        assert packer.pack(["one two", "three four", "five"]) == ["one two", "five"]
+
+@pytest.mark.functional
+def test_pack_keeps_top_chunk_when_nothing_fits():
+    """Test that an oversized best chunk is still used rather than no context."""
+    packer = ContextPacker(token_budget=10, dedup_threshold=0.95)
+
+    assert packer.pack([_chunk("huge", 50), _chunk("bigger", 80)]) == ["huge"]
+    assert packer.pack([]) == []
+
+@pytest.mark.functional
+def test_retrieved_chunk_survives_pickling():
+    """Test that chunk metadata crosses the process executor boundary."""
+    chunk = pickle.loads(pickle.dumps(_chunk("text", 7, [0.5, 0.5])))
+
+    assert chunk == "text"
+    assert chunk.token_count == 7
+    assert chunk.embedding == [0.5, 0.5]
+
+def _positioned(content, document_id, chunk_index):
+    return RetrievedChunk(content, token_count=len(content.split()), document_id=document_id, chunk_index=chunk_index)
+
+@pytest.mark.functional
+def test_stitch_merges_overlapping_neighbours():
+    """Test that adjacent overlap-strategy chunks become one span without the repeat."""
+    words = [f"w{i}" for i in range(20)]
+    first = _positioned(" ".join(words[0:12]), "doc-1", 0)
+    second = _positioned(" ".join(words[8:20]), "doc-1", 1)
+    other = _positioned("unrelated text", "doc-2", 4)
+
+    # The second chunk ranks first, so the merged span leads
+    assert ContextPacker.stitch([second, other, first]) == [" ".join(words), "unrelated text"]
+
+@pytest.mark.functional
+def test_stitch_keeps_gaps_and_unpositioned_chunks_apart():
+    """Test that non-consecutive chunks and plain strings are not merged."""
+    chunks = [
+        _positioned("alpha beta gamma", "doc-1", 0),
+        _positioned("delta epsilon", "doc-1", 2),
+        "plain string",
+        _positioned("zeta eta", "doc-1", 1),
+    ]
+
+    # Indexes 0, 1 and 2 form one span in document order
+    assert ContextPacker.stitch(chunks) == ["alpha beta gamma zeta eta delta epsilon", "plain string"]
+    # Without index 1 there is a gap
+    assert ContextPacker.stitch([chunks[0], chunks[1]]) == ["alpha beta gamma", "delta epsilon"]
+
+@pytest.mark.functional
+def test_overlap_end_ignores_short_coincidences():
+    """Test that a one-word repeat is not treated as chunk overlap."""
+    from app.services.context_packer import overlap_end
+
+    assert overlap_end("results of the", "the next section") == 0
+    assert overlap_end("a b c d e", "c d e f") == len("c d e")
+    # A tail chunk entirely inside its predecessor's overlap
+    assert overlap_end("a b c d e", "d e") == len("d e")
@@ -124,4 +124,82 @@ async def test_cache_answer_with_different_ttl(mock_redis):
             ttl,
             json.dumps(answer)
         )
-        mock_redis.reset_mock()  # Reset mock for next iteration 
\ No newline at end of file
+        mock_redis.reset_mock()  # Reset mock for next iteration 
+
+@pytest.mark.functional
+def test_vector_index_sql_hnsw():
+    """Test that the HNSW index is built with the configured parameters."""
+    with patch('app.db.optimizations.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.HNSW_M = 24
+        mock_settings.HNSW_EF_CONSTRUCTION = 128
+        sql = db_optimizations.vector_index_sql()
+
+    assert "USING hnsw (embedding vector_cosine_ops)" in sql
+    assert "m = 24, ef_construction = 128" in sql
+
+@pytest.mark.functional
+def test_vector_search_settings_by_index_type():
+    """Test that search parameters follow the index type and iterative scan mode."""
+    with patch('app.db.optimizations.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "ivfflat"
+        mock_settings.IVFFLAT_PROBES = 10
+        mock_settings.VECTOR_ITERATIVE_SCAN = "off"
+        assert db_optimizations.vector_search_settings() == {"ivfflat.probes": "10"}
+        assert db_optimizations.vector_search_settings(probes=25) == {"ivfflat.probes": "25"}
+
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.HNSW_EF_SEARCH = 40
+        mock_settings.VECTOR_ITERATIVE_SCAN = "strict_order"
+        assert db_optimizations.vector_search_settings() == {
+            "hnsw.ef_search": "40",
+            "hnsw.iterative_scan": "strict_order",
+        }
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_apply_vector_search_params_is_transaction_local():
+    """Test that per-query overrides use transaction-local set_config."""
+    mock_session = AsyncMock()
+    await db_optimizations.apply_vector_search_params(mock_session)
+    mock_session.execute.assert_not_called()
+
+    with patch('app.db.optimizations.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.VECTOR_ITERATIVE_SCAN = "off"
+        await db_optimizations.apply_vector_search_params(mock_session, ef_search=200)
+
+    statement, params = mock_session.execute.call_args[0]
+    assert "set_config(:name_0, :value_0, true)" in str(statement)
+    assert params == {"name_0": "hnsw.ef_search", "value_0": "200"}
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_get_cached_answers_uses_one_mget(mock_redis):
+    """Test batch cache lookups with a single MGET."""
+    questions = ["What is a CRM?", "What is an ERP?"]
+    mock_redis.mget.return_value = [json.dumps("Customer Relationship Management"), None]
+
+    result = await db_optimizations.get_cached_answers(questions, AsyncMock())
+
+    assert result == ["Customer Relationship Management", None]
+    mock_redis.mget.assert_called_once_with([_get_expected_cache_key(q) for q in questions])
+
+@pytest.mark.functional
+def test_vector_search_defaults_survive_pool_rollback():
+    """Test that connection defaults are SET in autocommit so a checkin rollback keeps them."""
+    from app.db.base import set_vector_search_defaults
+    connection = MagicMock(autocommit=False)
+    cursor = connection.cursor.return_value
+    cursor.execute.side_effect = lambda sql: autocommit_states.append(connection.autocommit)
+    autocommit_states = []
+
+    with patch('app.db.optimizations.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.HNSW_EF_SEARCH = 40
+        mock_settings.VECTOR_ITERATIVE_SCAN = "off"
+        set_vector_search_defaults(connection, None)
+
+    cursor.execute.assert_called_once_with("SET hnsw.ef_search = '40'")
+    assert autocommit_states == [True]
+    assert connection.autocommit is False
@@ -0,0 +1,118 @@
+import io
+import re
+import pytest
+from unittest.mock import patch
+from app.services.document_processor import DocumentProcessor, IncrementalChunker
+
+class WordPieceTokenizer:
+    """Splits words into pieces of at most four characters, like a subword tokenizer."""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=True):
+        offsets = [
+            (start, min(start + 4, match.end()))
+            for match in re.finditer(r"\w+|[^\w\s]", text)
+            for start in range(match.start(), match.end(), 4)
+        ]
+        return {"offset_mapping": offsets}
+
+@pytest.fixture
+def processor():
+    processor = DocumentProcessor()
+    with patch.object(DocumentProcessor, 'tokenizer', new=WordPieceTokenizer()):
+        yield processor
+
+@pytest.mark.functional
+def test_default_chunks_pack_whole_sentences(processor):
+    """Test that sentences are packed greedily and sliced from the original text."""
+    text = "One two ten. Four five six. Seven eight. Nine"
+
+    chunks, token_counts = processor._chunk(text, "default", 8, 0)
+
+    assert chunks == ["One two ten. Four five six.", "Seven eight. Nine"]
+    assert token_counts == [8, 6]
+
+@pytest.mark.functional
+def test_default_chunks_split_long_sentences_at_word_starts(processor):
+    """Test that a sentence longer than a chunk is split by token position, between words."""
+    text = "alpha bravo charlie delta"  # two tokens per word
+
+    chunks, token_counts = processor._chunk(text, "default", 3, 0)
+
+    assert chunks == ["alpha", "bravo", "charlie", "delta"]
+    assert token_counts == [2, 2, 2, 2]
+
+@pytest.mark.functional
+def test_overlap_chunks_by_token_position(processor):
+    """Test that overlap windows advance by tokens and repeat the overlap."""
+    text = " ".join(f"w{i}" for i in range(10))
+
+    chunks, token_counts = processor._chunk(text, "overlap", 4, 1)
+
+    assert chunks == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert token_counts == [4, 4, 4]
+
+@pytest.mark.functional
+def test_paragraph_chunks(processor):
+    """Test that every non-empty line becomes its own chunk."""
+    text = "First line.\n\nSecond line\n"
+
+    assert processor._chunk(text, "paragraph", 512, 128)[0] == ["First line.", "Second line"]
+
+@pytest.mark.functional
+def test_empty_text_has_no_chunks(processor):
+    """Test that blank documents produce no chunks."""
+    assert processor._chunk("  \n ", "default", 512, 128) == ([], [])
+    chunker = IncrementalChunker(processor, "default", 512, 128, window=1)
+    assert chunker.feed("  ") + chunker.feed(" ") + chunker.finish() == []
+
+@pytest.mark.functional
+@pytest.mark.parametrize("strategy", ["default", "overlap", "paragraph"])
+def test_incremental_chunker_matches_whole_text(processor, strategy):
+    """Test that chunking page by page gives the chunks of the joined text."""
+    sentence = "Lorem ipsum dolor sit amet consectetur. "
+    pages = [
+        sentence * (i % 4) + "extraordinarily " * (i % 7) + f"page {i} ends here."
+        for i in range(40)
+    ]
+    text = "\n".join(pages)
+    expected = processor._chunk(text, strategy, 16, 4)
+
+    chunker = IncrementalChunker(processor, strategy, 16, 4, window=200)
+    chunks = [chunk for page in pages for chunk in chunker.feed(page)] + chunker.finish()
+
+    assert [chunk for chunk, _ in chunks] == expected[0]
+    assert [token_count for _, token_count in chunks] == expected[1]
+
+@pytest.mark.functional
+@pytest.mark.parametrize("text", ["", "one line", "a\nb\r\nc\n", "\n\n" + "several words per line\n" * 3000 + "last"], ids=["empty", "single", "mixed", "long"])
+def test_text_pages_rejoin_to_the_file(processor, text):
+    """Test that plain text streamed in blocks joins back to the decoded file."""
+    stream = io.BytesIO(text.encode("utf-8"))
+
+    with patch('app.services.document_processor.TEXT_BLOCK_SIZE', 1000):
+        pages = list(processor.extract_pages(stream, "txt"))
+
+    assert "\n".join(pages) == text
+    assert all(len(page) < 2000 for page in pages[:-1])
+    assert not stream.closed
+
+@pytest.mark.functional
+@pytest.mark.parametrize("window", [1, 60, 200])
+def test_incremental_chunker_keeps_split_sentences_apart(processor, window):
+    """Test that the tail of an over-long sentence is not packed with the sentences after it."""
+    long_sentence = " ".join(f"w{i}" for i in range(40))
+    pages = [
+        f"Intro here. {long_sentence[:60]}",
+        f"{long_sentence[60:]}. ",
+        "Short one. Another short. ",
+        f"{long_sentence}. ",
+        "Tail sentence.",
+    ]
+    text = "\n".join(pages)
+    expected = processor._chunk(text, "default", 16, 0)
+
+    chunker = IncrementalChunker(processor, "default", 16, 0, window=window)
+    chunks = [chunk for page in pages for chunk in chunker.feed(page)] + chunker.finish()
+
+    assert [chunk for chunk, _ in chunks] == expected[0]
+    assert [token_count for _, token_count in chunks] == expected[1]
@@ -0,0 +1,96 @@
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+from pgvector import Vector
+from app.services.document_storage import DocumentStorage, CHUNK_COLUMNS
+
+def _session(in_transaction=True):
+    """Mock session whose raw connection is a mock asyncpg connection."""
+    driver_connection = MagicMock()
+    driver_connection.is_in_transaction.return_value = in_transaction
+    driver_connection.copy_records_to_table = AsyncMock()
+    driver_connection.set_type_codec = AsyncMock()
+    driver_connection.reset_type_codec = AsyncMock()
+
+    connection = MagicMock()
+    connection.info = {}
+    connection.get_raw_connection = AsyncMock(return_value=MagicMock(driver_connection=driver_connection))
+    session = MagicMock()
+    session.flush = AsyncMock()
+    session.execute = AsyncMock()
+    session.connection = AsyncMock(return_value=connection)
+    return session, driver_connection
+
+def _chunks(count):
+    return [f"chunk {i}" for i in range(count)], [[0.1] * 768] * count, list(range(count))
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_store_chunks_copies_in_batches():
+    """Test that chunks are written with binary COPY on the session's connection."""
+    session, driver_connection = _session()
+    chunks, embeddings, token_counts = _chunks(5)
+    document_id = uuid4()
+
+    with patch('app.services.document_storage.settings.CHUNK_INSERT_METHOD', "copy"), \
+         patch('app.services.document_storage.settings.CHUNK_INSERT_BATCH_SIZE', 2):
+        await DocumentStorage().store_chunks(document_id, chunks, embeddings, session, token_counts)
+
+    assert driver_connection.copy_records_to_table.await_count == 3
+    calls = driver_connection.copy_records_to_table.await_args_list
+    records = [record for call in calls for record in call.kwargs["records"]]
+    assert calls[0].args == ("document_chunks",)
+    assert calls[0].kwargs["columns"] == CHUNK_COLUMNS
+    assert [record[1:4] for record in records] == [(document_id, i, f"chunk {i}") for i in range(5)]
+    assert [record[5] for record in records] == token_counts
+    session.execute.assert_not_called()
+
+    # The binary vector codec also encodes the text form SQLAlchemy binds
+    encoder = driver_connection.set_type_codec.await_args.kwargs["encoder"]
+    assert encoder([0.5, 1.0]) == Vector([0.5, 1.0]).to_binary()
+    assert encoder("[0.5,1.0]") == Vector([0.5, 1.0]).to_binary()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_store_chunks_registers_vector_codec_once():
+    """Test that later batches on the same connection reuse its vector codec."""
+    session, driver_connection = _session()
+    chunks, embeddings, token_counts = _chunks(2)
+
+    with patch('app.services.document_storage.settings.CHUNK_INSERT_METHOD', "copy"):
+        for first_index in (0, 2, 4):
+            await DocumentStorage().store_chunks(uuid4(), chunks, embeddings, session, token_counts, first_index=first_index)
+
+    assert driver_connection.copy_records_to_table.await_count == 3
+    driver_connection.set_type_codec.assert_awaited_once()
+    driver_connection.reset_type_codec.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_store_chunks_executemany_batches():
+    """Test the batched executemany path."""
+    session, driver_connection = _session()
+    chunks, embeddings, token_counts = _chunks(5)
+
+    with patch('app.services.document_storage.settings.CHUNK_INSERT_METHOD', "executemany"), \
+         patch('app.services.document_storage.settings.CHUNK_INSERT_BATCH_SIZE', 2):
+        await DocumentStorage().store_chunks(uuid4(), chunks, embeddings, session, token_counts)
+
+    batches = [call.args[1] for call in session.execute.await_args_list]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [row["chunk_index"] for batch in batches for row in batch] == list(range(5))
+    driver_connection.copy_records_to_table.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_store_chunks_falls_back_outside_a_transaction():
+    """Test that COPY is not used when it would commit on its own."""
+    session, driver_connection = _session(in_transaction=False)
+    chunks, embeddings, _ = _chunks(3)
+
+    with patch('app.services.document_storage.settings.CHUNK_INSERT_METHOD', "copy"):
+        await DocumentStorage().store_chunks(uuid4(), chunks, embeddings, session)
+
+    driver_connection.copy_records_to_table.assert_not_called()
+    assert session.execute.await_count == 1
+    assert [row["token_count"] for row in session.execute.await_args.args[1]] == [None] * 3
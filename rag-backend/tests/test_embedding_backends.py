@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+from tenacity import RetryError
+from app.services.embedding_backends import (
+    EmbeddingBackend,
+    TorchEmbeddingBackend,
+    OnnxEmbeddingBackend,
+    create_embedding_backend
+)
+from app.services.model_registry import model_registry
+
+MODEL_NAME = "BAAI/bge-base-en-v1.5"
+SENTENCES = [
+    "CRM stands for Customer Relationship Management.",
+    "A CRM system helps manage customer interactions.",
+    "Order SKU-4471-B shipped on 2024-03-02.",
+    "Unicode: 你好",
+]
+
+def _cosines(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    # Needs the model from the Hugging Face hub (or its local cache)
+    try:
+        return model_registry.get_tokenizer(MODEL_NAME)
+    except (OSError, RetryError) as e:
+        pytest.skip(f"{MODEL_NAME} is not available: {e}")
+
+@pytest.mark.functional
+def test_create_embedding_backend():
+    """Test backend selection by setting value."""
+    assert isinstance(create_embedding_backend("torch", MODEL_NAME, "cpu", ".cache/onnx", False, 0), TorchEmbeddingBackend)
+    assert isinstance(create_embedding_backend("onnx", MODEL_NAME, "cpu", ".cache/onnx", True, 0), OnnxEmbeddingBackend)
+    with pytest.raises(ValueError):
+        create_embedding_backend("tensorrt", MODEL_NAME, "cpu", ".cache/onnx", False, 0)
+
+@pytest.mark.functional
+def test_embedding_backend_requires_load_and_embed():
+    """Test that a backend missing load or embed cannot be instantiated."""
+    class LoadOnlyBackend(EmbeddingBackend):
+        def load(self):
+            pass
+
+    with pytest.raises(TypeError):
+        EmbeddingBackend()
+    with pytest.raises(TypeError):
+        LoadOnlyBackend()
+
+@pytest.mark.functional
+@pytest.mark.parametrize("quantize, min_cosine", [(False, 0.999), (True, 0.98)])
+def test_onnx_backend_parity_with_torch(tmp_path, tokenizer, quantize, min_cosine):
+    """Test that ONNX embeddings agree with the torch backend by cosine similarity."""
+    pytest.importorskip("onnxruntime")
+    encoded = tokenizer(SENTENCES, padding=True, truncation=True, max_length=512, return_tensors="pt")
+
+    torch_backend = TorchEmbeddingBackend(MODEL_NAME, "cpu")
+    torch_backend.load()
+    onnx_backend = OnnxEmbeddingBackend(MODEL_NAME, str(tmp_path), quantize=quantize)
+    onnx_backend.load()
+
+    cosines = _cosines(torch_backend.embed(encoded), onnx_backend.embed(encoded))
+    assert cosines.min() >= min_cosine
@@ -1,6 +1,7 @@
 import pytest
-from unittest.mock import patch, MagicMock
-from app.services.embedding_service import embedding_service
+from unittest.mock import AsyncMock, patch, MagicMock
+from app.services.embedding_service import embedding_service, EmbeddingService
+from app.services.batching import plan_length_buckets
 from app.core.exceptions import ValidationError
 
 @pytest.mark.functional
@@ -104,4 +105,59 @@ async def test_embed_texts_special_characters():
         result = await embedding_service.embed_texts(texts)
         assert isinstance(result, list)
         assert len(result) == 3
-        assert all(len(embedding) == 768 for embedding in result) 
\ No newline at end of file
+        assert all(len(embedding) == 768 for embedding in result) 
+
+@pytest.mark.functional
+def test_plan_length_buckets_groups_similar_lengths():
+    """Test that batching sorts by length and respects the token budget."""
+    lengths = [512] + [40] * 31
+    batches = plan_length_buckets(lengths, token_budget=2048, max_batch_size=32)
+
+    # The long chunk is isolated instead of padding thirty-one short ones to 512
+    assert [0] in batches
+    assert sorted(i for batch in batches for i in batch) == list(range(32))
+    for batch in batches:
+        assert len(batch) * max(lengths[i] for i in batch) <= 2048 or len(batch) == 1
+
+@pytest.mark.functional
+def test_plan_length_buckets_respects_max_batch_size():
+    """Test that batches never exceed the row cap."""
+    batches = plan_length_buckets([10] * 100, token_budget=100000, max_batch_size=32)
+    assert [len(batch) for batch in batches] == [32, 32, 32, 4]
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_embed_texts_restores_input_order():
+    """Test that embeddings come back in input order after length bucketing."""
+    service = EmbeddingService()
+    service.store = None
+    texts = ["a b c d", "a", "a b"]
+    token_ids = [[1] * 4, [1], [1] * 2]
+
+    def fake_embed(batch_ids):
+        return [[float(len(ids))] for ids in batch_ids]
+
+    with patch.object(service, '_tokenize', return_value=token_ids), \
+         patch.object(service, '_embed_token_ids', side_effect=fake_embed), \
+         patch('app.services.embedding_service.embedding_service', service):
+        result = await service.embed_texts(texts)
+
+    assert result == [[4.0], [1.0], [2.0]]
+    assert service.padding_stats["real_tokens"] == 7
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_embed_texts_single_chunk_uses_the_store():
+    """Test that a one-chunk call goes through the chunk store, not the question cache."""
+    service = EmbeddingService()
+    service.store = MagicMock()
+    service.store.get_many.return_value = [None]
+
+    with patch.object(service, '_embed_bulk', new=AsyncMock(return_value=[[0.5]])) as embed_bulk, \
+         patch.object(service, 'embed_query', new=AsyncMock()) as embed_query:
+        assert await service.embed_texts(["only chunk"]) == [[0.5]]
+
+    embed_bulk.assert_awaited_once_with(["only chunk"], 32)
+    service.store.put_many.assert_called_once_with(["only chunk"], [[0.5]])
+    embed_query.assert_not_called()
+    assert service.query_cache.get("only chunk") is None
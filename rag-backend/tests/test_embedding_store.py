@@ -0,0 +1,120 @@
+import pytest
+from app.services.embedding_store import EmbeddingStore
+
+DIM = 4
+
+def _store(path, vectors=8):
+    return EmbeddingStore(str(path), "test/model", dim=DIM, max_bytes=vectors * DIM * 4)
+
+@pytest.mark.functional
+def test_put_and_get_roundtrip(tmp_path):
+    """Test that stored vectors are returned and misses are None."""
+    store = _store(tmp_path)
+    store.put_many(["alpha", "beta"], [[1.0, 0, 0, 0], [0, 1.0, 0, 0]])
+
+    result = store.get_many(["beta", "gamma", "alpha"])
+
+    assert result == [[0, 1.0, 0, 0], None, [1.0, 0, 0, 0]]
+    assert store.hits == 2
+    assert store.misses == 1
+
+@pytest.mark.functional
+def test_whitespace_normalization(tmp_path):
+    """Test that texts differing only in whitespace share an entry."""
+    store = _store(tmp_path)
+    store.put_many(["CRM stands for\nCustomer  Relationship Management."], [[0.5] * DIM])
+    assert store.get_many(["CRM stands for Customer Relationship Management."])[0] == [0.5] * DIM
+
+@pytest.mark.functional
+def test_keys_include_model_name(tmp_path):
+    """Test that the same text under a different model is a different key."""
+    store = _store(tmp_path)
+    other = EmbeddingStore(str(tmp_path), "other/model", dim=DIM, max_bytes=8 * DIM * 4)
+    assert store.make_key("alpha") != other.make_key("alpha")
+
+@pytest.mark.functional
+def test_store_survives_restart(tmp_path):
+    """Test that vectors persist across store instances."""
+    store = _store(tmp_path)
+    store.put_many(["alpha"], [[0.25] * DIM])
+    store.close()
+
+    reopened = _store(tmp_path)
+    assert reopened.get_many(["alpha"]) == [[0.25] * DIM]
+
+@pytest.mark.functional
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used entry is evicted when full."""
+    store = _store(tmp_path, vectors=2)
+    store.put_many(["a", "b"], [[1.0] * DIM, [2.0] * DIM])
+    store.get_many(["a"])  # "b" is now least recently used
+    store.put_many(["c"], [[3.0] * DIM])
+
+    assert store.get_many(["a", "b", "c"]) == [[1.0] * DIM, None, [3.0] * DIM]
+    assert store.evictions == 1
+
+class FailingInsertConnection:
+    """SQLite connection wrapper whose INSERT into the index fails."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        return self.conn.execute(sql, *args)
+
+    def executemany(self, sql, rows):
+        if sql.startswith("INSERT"):
+            raise RuntimeError("disk I/O error")
+        return self.conn.executemany(sql, rows)
+
+@pytest.mark.functional
+def test_failed_put_keeps_evicted_vectors(tmp_path):
+    """Test that a rolled back eviction leaves the victims' vectors intact."""
+    store = _store(tmp_path, vectors=2)
+    store.put_many(["a", "b"], [[1.0] * DIM, [2.0] * DIM])
+    store._conn = FailingInsertConnection(store._conn)
+
+    with pytest.raises(RuntimeError):
+        store.put_many(["c", "d"], [[3.0] * DIM, [4.0] * DIM])
+
+    assert store.get_many(["a", "b", "c"]) == [[1.0] * DIM, [2.0] * DIM, None]
+
+@pytest.mark.functional
+def test_put_fills_slots_freed_by_deletes(tmp_path):
+    """Test that new entries reuse the lowest free slots instead of occupied ones."""
+    store = _store(tmp_path, vectors=4)
+    store.put_many(["a", "b", "c"], [[1.0] * DIM, [2.0] * DIM, [3.0] * DIM])
+    store._delete([store.make_key("a")])
+
+    store.put_many(["d", "e"], [[4.0] * DIM, [5.0] * DIM])
+
+    assert store.get_many(["b", "c", "d", "e"]) == [[2.0] * DIM, [3.0] * DIM, [4.0] * DIM, [5.0] * DIM]
+    assert sorted(slot for slot, in store._conn.execute("SELECT slot FROM entries")) == [0, 1, 2, 3]
+    assert store.evictions == 0
+
+@pytest.mark.functional
+def test_rows_being_rewritten_read_as_misses(tmp_path):
+    """Test that a row whose tag does not match its key is a miss until it is written again."""
+    store = _store(tmp_path)
+    store.put_many(["alpha", "beta"], [[1.0] * DIM, [2.0] * DIM])
+    slots = dict(store._conn.execute("SELECT key, slot FROM entries"))
+    alpha, beta = slots[store.make_key("alpha")], slots[store.make_key("beta")]
+
+    # Another process cleared alpha's row to overwrite it, and beta's row
+    # holds a vector it wrote for a different key
+    store._tags[alpha] = 0
+    store._vectors[alpha] = [9.0] * DIM
+    store._tags[beta] = store._tag(store.make_key("gamma"))
+    assert store.get_many(["alpha", "beta"]) == [None, None]
+
+    store.put_many(["alpha", "beta"], [[1.0] * DIM, [2.0] * DIM])
+    assert store.get_many(["alpha", "beta"]) == [[1.0] * DIM, [2.0] * DIM]
+
+@pytest.mark.functional
+def test_stores_in_separate_processes_share_files(tmp_path):
+    """Test that a store sees entries another store instance wrote and evicted."""
+    first, second = _store(tmp_path, vectors=2), _store(tmp_path, vectors=2)
+    first.put_many(["a", "b"], [[1.0] * DIM, [2.0] * DIM])
+    second.put_many(["c"], [[3.0] * DIM])
+
+    assert first.get_many(["a", "b", "c"]) == [None, [2.0] * DIM, [3.0] * DIM]
@@ -0,0 +1,66 @@
+import pytest
+import asyncio
+import threading
+import time
+from app.services.inference_executor import InferenceExecutor
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_run_executes_off_event_loop():
+    """Test that submitted work runs on an executor thread, not the event loop thread."""
+    executor = InferenceExecutor(kind="thread", workers=1, max_queue=4, torch_threads=0)
+    loop_thread = threading.get_ident()
+    try:
+        worker_thread = await executor.run(threading.get_ident)
+        assert worker_thread != loop_thread
+    finally:
+        executor.shutdown()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive():
+    """Test that a blocking inference call does not stall other coroutines."""
+    executor = InferenceExecutor(kind="thread", workers=1, max_queue=4, torch_threads=0)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    try:
+        await asyncio.gather(executor.run(time.sleep, 0.1), ticker())
+        assert len(ticks) == 5
+    finally:
+        executor.shutdown()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_queue_depth_is_bounded():
+    """Test that no more than max_queue calls are in flight at once."""
+    executor = InferenceExecutor(kind="thread", workers=4, max_queue=2, torch_threads=0)
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+
+    try:
+        await asyncio.gather(*(executor.run(work) for _ in range(8)))
+        assert peak <= 2
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+@pytest.mark.functional
+def test_invalid_executor_kind():
+    """Test that an unknown executor kind is rejected."""
+    with pytest.raises(ValueError):
+        InferenceExecutor(kind="gpu", workers=1, max_queue=1, torch_threads=0)
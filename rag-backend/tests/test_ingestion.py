@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import io
+import re
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import UploadFile
+from app.core.exceptions import ConflictError, ValidationError
+from app.services.ingestion_queue import IngestionQueue, QUEUE_PREFIX, TENANT_RING_KEY, ACTIVE_TENANTS_KEY, QUEUED_JOBS_KEY
+from app.services.document_service import document_service, JOB_STAGES
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.worker import IngestionWorker
+
+class FakeChunker:
+    """Incremental chunker that makes every sentence of every page a chunk."""
+
+    def feed(self, text):
+        return [(sentence.strip(), 1) for sentence in re.findall(r"[^.]+\.?", text) if sentence.strip()]
+
+    def finish(self):
+        return []
+
+@pytest.fixture
+def session_factory():
+    """async_session stand-in whose sessions accept any statement."""
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=AsyncMock())
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory
+
+@pytest.mark.functional
+def test_queue_scripts_receive_tenant_keys():
+    """Test that jobs go to the user's own list and dequeue walks the tenant ring."""
+    redis = MagicMock()
+    enqueue_script, dequeue_script = MagicMock(return_value=1), MagicMock(return_value="job-1")
+    redis.register_script.side_effect = [enqueue_script, dequeue_script]
+    queue = IngestionQueue(redis)
+
+    queue.enqueue("user-1", "job-1")
+    assert queue.dequeue() == "job-1"
+
+    enqueue_script.assert_called_once_with(
+        keys=[TENANT_RING_KEY, ACTIVE_TENANTS_KEY, f"{QUEUE_PREFIX}user-1", QUEUED_JOBS_KEY],
+        args=["user-1", "job-1"]
+    )
+    dequeue_script.assert_called_once_with(keys=[TENANT_RING_KEY, ACTIVE_TENANTS_KEY, QUEUED_JOBS_KEY], args=[QUEUE_PREFIX])
+    dequeue_script.return_value = None
+    assert queue.dequeue() is None
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_ingest_job_reports_every_stage(session_factory):
+    """Test that a claimed job runs all stages, stores every batch and records progress."""
+    job = SimpleNamespace(
+        user_id="user-1",
+        filename="notes.txt",
+        progress={stage: {"status": "pending"} for stage in JOB_STAGES},
+        payload=b"First sentence. Second sentence",
+        file_hash="file-hash"
+    )
+    updates = []
+
+    async def update_job(job_id, session, **values):
+        updates.append({key: value for key, value in values.items() if key != "progress"} | {
+            "progress": {stage: dict(state) for stage, state in values.get("progress", {}).items()}
+        })
+
+    with patch('app.services.document_service.async_session', session_factory), \
+         patch('app.services.ingestion_pipeline.async_session', session_factory), \
+         patch('app.services.ingestion_pipeline.settings.INGEST_EMBED_BATCH_SIZE', 1), \
+         patch('app.services.document_service.document_storage.claim_ingestion_job', new=AsyncMock(return_value=job)), \
+         patch('app.services.document_service.document_storage.update_ingestion_job', new=update_job), \
+         patch('app.services.ingestion_pipeline.document_storage.check_duplicate_document', new=AsyncMock(return_value=False)), \
+         patch('app.services.ingestion_pipeline.document_storage.store_document', new=AsyncMock(return_value="doc-1")) as store_document, \
+         patch('app.services.ingestion_pipeline.document_storage.create_user_document_relationship', new=AsyncMock()), \
+         patch('app.services.ingestion_pipeline.document_storage.store_chunks', new=AsyncMock()) as store_chunks, \
+         patch('app.services.ingestion_pipeline.document_storage.set_document_hash', new=AsyncMock()) as set_hash, \
+         patch('app.services.ingestion_pipeline.document_storage.adjust_user_chunk_stats', new=AsyncMock()), \
+         patch('app.services.ingestion_pipeline.document_processor.incremental_chunker', return_value=FakeChunker()), \
+         patch('app.services.ingestion_pipeline.embedding_service.embed_texts', new=AsyncMock(side_effect=lambda texts: [[0.1]] * len(texts))), \
+         patch('app.services.document_service.user_index_cache.invalidate'), \
+         patch('app.services.document_service.retrieval_planner.invalidate'):
+        assert await document_service.ingest_job("job-1") is True
+
+    for stage in JOB_STAGES:
+        assert any(update.get("stage") == stage for update in updates)
+    final = updates[-1]
+    assert final["status"] == "completed" and final["document_id"] == "doc-1" and final["payload"] is None
+    assert all(final["progress"][stage]["status"] == "done" for stage in JOB_STAGES)
+    assert final["progress"]["chunk"]["chunks"] == 2
+    assert final["progress"]["store"]["chunks"] == 2
+
+    # One write per batch, numbered across batches
+    assert [call.args[1] for call in store_chunks.await_args_list] == [["First sentence."], ["Second sentence"]]
+    assert [call.kwargs["first_index"] for call in store_chunks.await_args_list] == [0, 1]
+    assert set_hash.await_args.args[1] == hashlib.sha256(b"First sentence. Second sentence").hexdigest()
+    assert store_document.await_args.kwargs["file_hash"] == "file-hash"
+
+def _upload(content, filename="notes.txt"):
+    return UploadFile(file=io.BytesIO(content), filename=filename, size=len(content))
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_submit_document_hashes_upload_in_one_pass():
+    """Test that the job is created with the raw bytes and their hash."""
+    content = b"%PDF-like bytes without newlines " * 50000
+    session = AsyncMock()
+
+    with patch('app.services.document_service.document_storage.check_duplicate_file', new=AsyncMock(return_value=False)) as check, \
+         patch('app.services.document_service.document_storage.create_ingestion_job', new=AsyncMock(return_value="job-1")) as create, \
+         patch('app.services.document_service.ingestion_queue.enqueue'):
+        result = await document_service.submit_document(_upload(content), session, SimpleNamespace(id="user-1"))
+
+    assert result == {"job_id": "job-1", "status": "queued"}
+    assert check.await_args.args[:2] == (hashlib.sha256(content).hexdigest(), "user-1")
+    assert create.await_args.args[2] == content
+    assert create.await_args.kwargs["file_hash"] == hashlib.sha256(content).hexdigest()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_submit_document_rejects_exact_reuploads():
+    """Test that a known file hash is rejected before a job is created."""
+    with patch('app.services.document_service.document_storage.check_duplicate_file', new=AsyncMock(return_value=True)), \
+         patch('app.services.document_service.document_storage.create_ingestion_job', new=AsyncMock()) as create:
+        with pytest.raises(ConflictError):
+            await document_service.submit_document(_upload(b"notes"), AsyncMock(), SimpleNamespace(id="user-1"))
+    create.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_submit_document_enforces_size_while_reading():
+    """Test that oversized uploads are rejected even when their size is not declared."""
+    upload = _upload(b"x" * 6000)
+    upload.size = None
+
+    with patch('app.services.document_service.settings.MAX_DOCUMENT_SIZE', 4096), \
+         patch('app.services.document_service.UPLOAD_BLOCK_SIZE', 1024), \
+         patch('app.services.document_service.document_storage.check_duplicate_file', new=AsyncMock()) as check:
+        with pytest.raises(ValidationError, match="File size exceeds"):
+            await document_service.submit_document(upload, AsyncMock(), SimpleNamespace(id="user-1"))
+    # Reading stopped at the first block over the limit
+    assert upload.file.tell() == 5 * 1024
+    check.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_pipeline_overlaps_embedding_and_writes(session_factory):
+    """Test that a batch is embedded while the previous one is written, with bounded lead."""
+    pages = [f"page {i}" for i in range(30)]
+    extracted, stored, lead = [], [], []
+    next_embed = asyncio.Event()
+
+    def extract_pages(content, file_ext):
+        for page in pages:
+            extracted.append(page)
+            yield page
+
+    async def embed_texts(texts):
+        next_embed.set()
+        return [[0.1]] * len(texts)
+
+    async def store_chunks(document_id, chunks, embeddings, session, token_counts, first_index):
+        if first_index == 0:
+            # Only completes if the next batch is embedded meanwhile
+            next_embed.clear()
+            await asyncio.wait_for(next_embed.wait(), timeout=1)
+        await asyncio.sleep(0.001)
+        stored.extend(chunks)
+        lead.append(len(extracted) - len(stored))
+
+    pipeline = IngestionPipeline("user-1", "book.pdf", b"", {}, batch_size=1, queue_size=1)
+    with patch('app.services.ingestion_pipeline.async_session', session_factory), \
+         patch('app.services.ingestion_pipeline.document_processor.extract_pages', new=extract_pages), \
+         patch('app.services.ingestion_pipeline.document_processor.incremental_chunker', return_value=FakeChunker()), \
+         patch('app.services.ingestion_pipeline.embedding_service.embed_texts', new=embed_texts), \
+         patch('app.services.ingestion_pipeline.document_storage.check_duplicate_document', new=AsyncMock(return_value=False)), \
+         patch('app.services.ingestion_pipeline.document_storage.store_document', new=AsyncMock(return_value="doc-1")), \
+         patch('app.services.ingestion_pipeline.document_storage.create_user_document_relationship', new=AsyncMock()), \
+         patch('app.services.ingestion_pipeline.document_storage.store_chunks', new=store_chunks), \
+         patch('app.services.ingestion_pipeline.document_storage.set_document_hash', new=AsyncMock()), \
+         patch('app.services.ingestion_pipeline.document_storage.adjust_user_chunk_stats', new=AsyncMock()):
+        assert await pipeline.run() == ("doc-1", 30)
+
+    assert stored == pages
+    # Extraction never runs more than the queues and stages can hold ahead of the writer
+    assert max(lead) <= 8
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_ingest_job_records_failure(session_factory):
+    """Test that a failing stage marks the job failed with the error."""
+    job = SimpleNamespace(user_id="user-1", filename="scan.txt", progress={}, payload=b"\xff\xfe", file_hash=None)
+    update_job = AsyncMock()
+
+    with patch('app.services.document_service.async_session', session_factory), \
+         patch('app.services.document_service.document_storage.claim_ingestion_job', new=AsyncMock(return_value=job)), \
+         patch('app.services.document_service.document_storage.update_ingestion_job', new=update_job):
+        assert await document_service.ingest_job("job-1") is True
+
+    final = update_job.await_args.kwargs
+    assert final["status"] == "failed"
+    assert final["error"].startswith("Error extracting text from document")
+    assert final["progress"]["extract"]["status"] == "failed"
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_ingest_job_skips_claimed_jobs(session_factory):
+    """Test that a job another worker already claimed is not run twice."""
+    with patch('app.services.document_service.async_session', session_factory), \
+         patch('app.services.document_service.document_storage.claim_ingestion_job', new=AsyncMock(return_value=None)), \
+         patch('app.services.ingestion_pipeline.document_processor.extract_pages') as extract:
+        assert await document_service.ingest_job("job-1") is False
+    extract.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_requeue_stale_jobs_skips_jobs_still_queued(session_factory):
+    """Test that the stale-job sweep only counts jobs the queue did not already hold."""
+    stale = [("job-1", "user-1"), ("job-2", "user-1"), ("job-3", "user-2")]
+    with patch('app.services.document_service.async_session', session_factory), \
+         patch('app.services.document_service.document_storage.requeue_stale_ingestion_jobs', new=AsyncMock(return_value=stale)), \
+         patch('app.services.document_service.ingestion_queue.enqueue', side_effect=[0, 2, 1]) as enqueue:
+        assert await document_service.requeue_stale_jobs() == 2
+    assert [call.args for call in enqueue.call_args_list] == [("user-1", "job-1"), ("user-1", "job-2"), ("user-2", "job-3")]
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_worker_bounds_concurrency():
+    """Test that the worker never runs more jobs at once than its concurrency."""
+    jobs = [f"job-{i}" for i in range(5)]
+    running, peak, done = set(), [0], []
+    worker = IngestionWorker(concurrency=2, poll_interval=0.01)
+
+    def dequeue():
+        if jobs:
+            return jobs.pop(0)
+        if len(done) == 5:
+            worker.stop()
+        return None
+
+    async def ingest_job(job_id):
+        running.add(job_id)
+        peak[0] = max(peak[0], len(running))
+        await asyncio.sleep(0.01)
+        running.discard(job_id)
+        done.append(job_id)
+        return True
+
+    with patch('app.worker.ingestion_queue.dequeue', side_effect=dequeue), \
+         patch('app.worker.document_service.ingest_job', new=ingest_job), \
+         patch('app.worker.document_service.requeue_stale_jobs', new=AsyncMock(return_value=0)):
+        await asyncio.wait_for(worker.run(), timeout=5)
+
+    assert sorted(done) == [f"job-{i}" for i in range(5)]
+    assert peak[0] == 2
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_worker_skips_jobs_it_is_already_running():
+    """Test that a job dequeued again while it runs keeps its heartbeat entry and is not run twice."""
+    jobs = ["job-1", "job-1"]
+    started, release, seen = [], asyncio.Event(), []
+    worker = IngestionWorker(concurrency=3, poll_interval=0.01)
+
+    def dequeue():
+        if jobs:
+            return jobs.pop(0)
+        seen.append(set(worker._running))
+        if not release.is_set():
+            release.set()
+        elif not worker._running:
+            worker.stop()
+        return None
+
+    async def ingest_job(job_id):
+        started.append(job_id)
+        await release.wait()
+        return True
+
+    with patch('app.worker.ingestion_queue.dequeue', side_effect=dequeue), \
+         patch('app.worker.document_service.ingest_job', new=ingest_job), \
+         patch('app.worker.document_service.requeue_stale_jobs', new=AsyncMock(return_value=0)):
+        await asyncio.wait_for(worker.run(), timeout=5)
+
+    assert started == ["job-1"]
+    assert seen[0] == {"job-1"}
@@ -0,0 +1,52 @@
+import pytest
+import asyncio
+from app.services.micro_batcher import MicroBatcher
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced():
+    """Test that concurrent submissions share a single batch call."""
+    calls = []
+
+    async def process_batch(items):
+        calls.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(process_batch, max_batch_size=32, max_wait=0.005)
+    results = await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(10)))
+
+    assert results == [f"Q{i}" for i in range(10)]
+    assert len(calls) == 1
+    assert batcher.mean_batch_size == 10
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_batches_respect_max_batch_size():
+    """Test that a full batch is flushed without waiting and oversize bursts are split."""
+    calls = []
+
+    async def process_batch(items):
+        calls.append(len(items))
+        return items
+
+    batcher = MicroBatcher(process_batch, max_batch_size=4, max_wait=10.0)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(i) for i in range(8))),
+        timeout=1.0
+    )
+
+    assert results == list(range(8))
+    assert calls == [4, 4]
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_batch_errors_propagate_to_all_callers():
+    """Test that a failing batch raises in every awaiting caller."""
+    async def process_batch(items):
+        raise Exception("Embedding service error")
+
+    batcher = MicroBatcher(process_batch, max_batch_size=8, max_wait=0.001)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, Exception) for r in results)
+    assert "Embedding service error" in str(results[0])
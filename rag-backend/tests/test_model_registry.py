@@ -0,0 +1,51 @@
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+from app.services.model_registry import ModelRegistry
+
+class _TinyModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(4, 2)
+
+@pytest.mark.functional
+def test_get_model_loads_once_per_key():
+    """Test that the same (name, revision, dtype) key reuses a single model instance."""
+    registry = ModelRegistry()
+    with patch.object(ModelRegistry, '_load_model', side_effect=lambda *args: _TinyModel()) as mock_load:
+        first = registry.get_model("test/model")
+        second = registry.get_model("test/model")
+        assert first is second
+        assert mock_load.call_count == 1
+
+        # A different dtype is a different handle
+        registry.get_model("test/model", dtype=torch.float16)
+        assert mock_load.call_count == 2
+
+@pytest.mark.functional
+def test_get_model_returns_read_only_handle():
+    """Test that registered models are in eval mode with gradients disabled."""
+    registry = ModelRegistry()
+    with patch.object(ModelRegistry, '_load_model', side_effect=lambda *args: _TinyModel()):
+        model = registry.get_model("test/model")
+        assert not model.training
+        assert all(not p.requires_grad for p in model.parameters())
+
+@pytest.mark.functional
+def test_get_tokenizer_loads_once():
+    """Test that tokenizers are shared between callers."""
+    registry = ModelRegistry()
+    with patch.object(ModelRegistry, '_load_tokenizer', return_value=MagicMock()) as mock_load:
+        assert registry.get_tokenizer("test/model") is registry.get_tokenizer("test/model")
+        assert mock_load.call_count == 1
+
+@pytest.mark.functional
+def test_memory_report():
+    """Test that the memory report sums parameter bytes of registered models."""
+    registry = ModelRegistry()
+    with patch.object(ModelRegistry, '_load_model', side_effect=lambda *args: _TinyModel()):
+        registry.get_model("test/model")
+        report = registry.memory_report()
+        # Linear(4, 2): 8 weights + 2 biases, float32
+        assert report["total_bytes"] == 10 * 4
+        assert len(report["models"]) == 1
@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import MagicMock
+from app.services.model_warmup import ModelWarmup
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_warmup_marks_models_ready():
+    """Test that successful warm-up marks every model ready."""
+    embedding_warm_up = MagicMock()
+    reranker_warm_up = MagicMock()
+    warmup = ModelWarmup({"embedding": embedding_warm_up, "reranker": reranker_warm_up})
+    assert not warmup.ready
+    assert warmup.state == {"embedding": "pending", "reranker": "pending"}
+
+    await warmup.run()
+
+    assert warmup.ready
+    embedding_warm_up.assert_called_once()
+    reranker_warm_up.assert_called_once()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_warmup_reports_failures():
+    """Test that a failing model is reported and keeps the service unready."""
+    failing = MagicMock(side_effect=Exception("Model download failed"))
+    warmup = ModelWarmup({"embedding": MagicMock(), "reranker": failing})
+
+    await warmup.run()
+
+    status = warmup.status()
+    assert status["ready"] is False
+    assert status["models"] == {"embedding": "ready", "reranker": "failed"}
+    assert "Model download failed" in status["errors"]["reranker"]
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_warmup_start_is_idempotent():
+    """Test that start() reuses a running warm-up task."""
+    warmup = ModelWarmup({"embedding": MagicMock()})
+    task = warmup.start()
+    assert warmup.start() is task
+    await task
+    assert warmup.ready
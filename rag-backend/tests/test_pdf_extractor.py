@@ -0,0 +1,31 @@
+import fitz
+import pytest
+from app.services.pdf_extractor import PdfExtractor
+
+def _pdf(page_count):
+    with fitz.open() as doc:
+        for number in range(page_count):
+            doc.new_page().insert_text((72, 72), f"Page number {number}")
+        return doc.tobytes()
+
+@pytest.mark.functional
+def test_small_pdfs_are_extracted_in_process():
+    """Test that PDFs below the page threshold never start the pool."""
+    extractor = PdfExtractor(workers=2, min_pages=10, pages_per_task=2)
+
+    pages = list(extractor.pages(_pdf(3)))
+
+    assert [page.strip() for page in pages] == [f"Page number {i}" for i in range(3)]
+    assert extractor._executor is None
+
+@pytest.mark.functional
+def test_large_pdfs_are_split_across_processes_in_order():
+    """Test that page ranges extracted by the pool come back in page order."""
+    content = _pdf(9)
+    serial = list(PdfExtractor(workers=1, min_pages=1, pages_per_task=2).pages(content))
+    extractor = PdfExtractor(workers=2, min_pages=4, pages_per_task=2)
+    try:
+        assert list(extractor.pages(content)) == serial
+    finally:
+        extractor.shutdown()
+    assert [page.strip() for page in serial] == [f"Page number {i}" for i in range(9)]
@@ -128,4 +128,41 @@ async def test_qa_memory_usage(benchmark, test_session, mock_user_id):
         
         # Assert that memory usage is within acceptable limits
         memory_increase = final_memory - initial_memory
-        assert memory_increase < 500, f"Memory increase was {memory_increase:.1f}MB, which exceeds the 500MB limit"  # Memory increase should be less than 500MB
\ No newline at end of file
+        assert memory_increase < 500, f"Memory increase was {memory_increase:.1f}MB, which exceeds the 500MB limit"  # Memory increase should be less than 500MB
+
+@pytest.mark.benchmark
+def test_chunking_scales_linearly():
+    """Test that chunking tokenizes each character a bounded number of times from 1k to 100k sentences."""
+    import re
+    from app.services.document_processor import DocumentProcessor, IncrementalChunker
+
+    calls = []
+
+    def tokenizer(text, **kwargs):
+        calls.append(len(text))
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\w+|[^\w\s]", text)]}
+
+    sentence = "The customer record links every deal, ticket and invoice to one account. "
+    page = sentence * 100
+    with patch.object(DocumentProcessor, 'tokenizer', new=staticmethod(tokenizer)):
+        processor = DocumentProcessor()
+        for sentences in (1_000, 10_000, 100_000):
+            text = sentence * sentences
+
+            # Whole text: one tokenizer pass
+            calls.clear()
+            chunks, _ = processor._chunk(text, "default", 512, 0)
+            assert len(chunks) == -(-sentences * 14 // 504)  # 36 whole 14-token sentences per chunk
+            assert calls == [len(text)]
+
+            # Page by page: one pass per page plus the carried tail, which
+            # is at most one chunk, so the work per page does not grow
+            calls.clear()
+            chunker = IncrementalChunker(processor, "default", 512, 0, window=len(page))
+            chunks = []
+            for _ in range(sentences // 100):
+                chunks.extend(chunker.feed(page))
+            chunks.extend(chunker.finish())
+            assert len(chunks) == -(-sentences * 14 // 504)
+            assert len(calls) <= sentences // 100 + 1
+            assert max(calls) <= len(page) + 1 + 36 * len(sentence)  # page, newline and one carried chunk
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from app.services.qa_service import qa_service
+from app.core.config import settings
 from app.core.exceptions import ValidationError, DatabaseError
 import numpy as np
 
@@ -32,7 +33,7 @@ async def test_get_answer_for_query_success(test_session, mock_user_id, mock_ser
         # Verify the mocks were called correctly
         mock_cache.assert_called_once_with(question, test_session, mock_user_id)
         mock_cache_answer.assert_called_once()
-        mock_retrieve.assert_called_once_with(question, test_session, mock_user_id)
+        mock_retrieve.assert_called_once_with(question, test_session, mock_user_id, top_k=qa_service._candidate_count())
         mock_generate.assert_called_once()
 
 @pytest.mark.functional
@@ -55,7 +56,7 @@ async def test_get_answer_for_query_no_chunks(test_session, mock_user_id, mock_s
         # Verify the answer
         expected_message = "No relevant documents found for your question. Please try rephrasing or upload relevant documents first or enable the uploaded documents for QA."
         assert answer == expected_message
-        mock_retrieve.assert_called_once_with(question, test_session, mock_user_id)
+        mock_retrieve.assert_called_once_with(question, test_session, mock_user_id, top_k=qa_service._candidate_count())
         mock_cache.assert_called_once_with(question, test_session, mock_user_id)
 
 @pytest.mark.functional
@@ -238,4 +239,78 @@ async def test_get_answer_for_query_reranking_no_chunks_passed(test_session, moc
         answer = await qa_service.get_answer_for_query(question, test_session, mock_user_id)
         
         expected_message = "No highly relevant content found to answer your question accurately. Please try rephrasing or upload more relevant documents."
-        assert answer == expected_message 
\ No newline at end of file
+        assert answer == expected_message 
+
+def _collect(results):
+    async def collect():
+        return [result async for result in results]
+    return collect()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_get_answers_for_queries_streams_batch(mock_user_id):
+    """Test that a batch is embedded once, reranked together and answered per question."""
+    questions = ["cached?", "few chunks?", "many chunks?", "nothing?"]
+    chunks = {
+        "few chunks?": ["chunk"],
+        "many chunks?": [f"chunk {i}" for i in range(12)],
+        "nothing?": [],
+    }
+
+    async def retrieve(question, session, user_id, top_k=None, query_vector=None):
+        assert query_vector == [0.1] * 768
+        assert top_k == qa_service._candidate_count()
+        return chunks[question]
+
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(return_value=AsyncMock())
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch('app.services.qa_service.async_session', session_factory), \
+         patch('app.services.qa_service.db_optimizations.get_cached_answers', new=AsyncMock(return_value=["Cached answer", None, None, None])), \
+         patch('app.services.qa_service.db_optimizations.cache_answers', new=AsyncMock()) as mock_cache_answers, \
+         patch('app.services.qa_service.embedding_service.embed_queries', new=AsyncMock(return_value=[[0.1] * 768] * 3)) as mock_embed, \
+         patch('app.services.qa_service.document_retriever.retrieve_relevant_chunks', new=retrieve), \
+         patch('app.services.qa_service.reranker.rerank_many_async', new=AsyncMock(return_value=[["chunk 3", "chunk 7"]])) as mock_rerank, \
+         patch('app.services.qa_service.context_packer.assemble', side_effect=lambda ranked: list(ranked)), \
+         patch('app.services.qa_service.answer_generator.generate_answer', side_effect=lambda q, context: f"{q} -> {context}"):
+        results = await _collect(qa_service.get_answers_for_queries(questions, mock_user_id))
+
+    by_index = {result["index"]: result for result in results}
+    assert results[0] == {"index": 0, "question": "cached?", "answer": "Cached answer"}
+    assert by_index[1]["answer"] == "few chunks? -> chunk"
+    assert by_index[2]["answer"] == "many chunks? -> chunk 3\nchunk 7"
+    assert "No relevant documents" in by_index[3]["answer"]
+    mock_embed.assert_awaited_once_with(["few chunks?", "many chunks?", "nothing?"])
+    mock_rerank.assert_awaited_once_with([("many chunks?", chunks["many chunks?"])], score_threshold=0.0)
+    assert set(mock_cache_answers.call_args[0][0]) == {"few chunks?", "many chunks?"}
+
+@pytest.mark.functional
+def test_get_answers_for_queries_validates_before_streaming():
+    """Test that an empty or oversized batch is rejected up front."""
+    with pytest.raises(ValidationError):
+        qa_service.get_answers_for_queries([])
+    with patch('app.services.qa_service.settings.QA_BATCH_MAX_QUESTIONS', 2):
+        with pytest.raises(ValidationError):
+            qa_service.get_answers_for_queries(["a", "b", "c"])
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_default_settings_over_fetch_for_the_reranker(mock_user_id):
+    """Test that with a small TOP_K_DOCUMENTS in ann mode the reranker still runs and the best k are kept."""
+    candidates = [f"chunk {i}" for i in range(50)]
+    retrieve = AsyncMock(return_value=candidates)
+
+    with patch('app.services.qa_service.settings.TOP_K_DOCUMENTS', 5), \
+         patch('app.services.qa_service.settings.RETRIEVAL_MODE', "ann"), \
+         patch('app.services.qa_service.db_optimizations.get_cached_answer', new=AsyncMock(return_value=None)), \
+         patch('app.services.qa_service.db_optimizations.cache_answer', new=AsyncMock()), \
+         patch('app.services.qa_service.document_retriever.retrieve_relevant_chunks', new=retrieve), \
+         patch('app.services.qa_service.reranker.rerank_chunks_async', new=AsyncMock(return_value=candidates[::-1])) as mock_rerank, \
+         patch('app.services.qa_service.context_packer.assemble', side_effect=lambda ranked: list(ranked)), \
+         patch('app.services.qa_service.answer_generator.generate_answer', side_effect=lambda q, context: context):
+        answer = await qa_service.get_answer_for_query("What is a CRM?", AsyncMock(), mock_user_id)
+
+    assert retrieve.await_args.kwargs["top_k"] == settings.RERANK_CANDIDATES
+    mock_rerank.assert_awaited_once()
+    assert answer == "\n".join(f"chunk {i}" for i in range(49, 44, -1))
@@ -0,0 +1,42 @@
+import pytest
+import time
+from unittest.mock import patch
+from app.services.query_embedding_cache import QueryEmbeddingCache
+
+@pytest.mark.functional
+def test_cache_hit_after_put():
+    """Test that a cached question is served and counted as a hit."""
+    cache = QueryEmbeddingCache(max_bytes=1024 * 1024, ttl=60)
+    assert cache.get("What is a CRM?") is None
+    cache.put("What is a CRM?", [0.1] * 768)
+
+    result = cache.get("  what is a   CRM? ")
+
+    assert result is not None
+    assert len(result) == 768
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+@pytest.mark.functional
+def test_cache_entries_expire():
+    """Test that entries older than the TTL are treated as misses."""
+    cache = QueryEmbeddingCache(max_bytes=1024 * 1024, ttl=10)
+    cache.put("What is a CRM?", [0.1] * 768)
+    with patch('app.services.query_embedding_cache.time.monotonic', return_value=time.monotonic() + 11):
+        assert cache.get("What is a CRM?") is None
+    assert len(cache) == 0
+
+@pytest.mark.functional
+def test_cache_evicts_least_recently_used_by_bytes():
+    """Test that the byte limit evicts the least recently used question."""
+    vector_bytes = 768 * 4
+    cache = QueryEmbeddingCache(max_bytes=2 * vector_bytes, ttl=60)
+    cache.put("first", [0.1] * 768)
+    cache.put("second", [0.2] * 768)
+    cache.get("first")
+    cache.put("third", [0.3] * 768)
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+    assert cache.bytes == 2 * vector_bytes
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.reranker import reranker
+from app.services.reranker import reranker, Reranker
 from app.core.exceptions import ValidationError
 
 @pytest.mark.functional
@@ -95,4 +95,64 @@ def test_rerank_chunks_single_chunk():
         result = reranker.rerank_chunks(query, chunks)
         assert isinstance(result, list)
         assert len(result) == 1
-        assert result[0] == chunks[0] 
\ No newline at end of file
+        assert result[0] == chunks[0] 
+
+@pytest.mark.functional
+def test_score_chunks_batches_by_token_budget():
+    """Test that pairs are scored in length-sorted batches and returned in input order."""
+    service = Reranker()
+    chunks = ["long " * 50, "short", "medium " * 10]
+    lengths = {chunks[0]: 60, chunks[1]: 5, chunks[2]: 15}
+    batch_sizes = []
+
+    def tokenize(pairs, truncation, max_length):
+        return {"input_ids": [[1] * lengths[chunk] for _, chunk in pairs]}
+
+    def pad(features, padding, return_tensors):
+        return {"input_ids": features["input_ids"]}
+
+    def model(input_ids, return_dict):
+        batch_sizes.append(len(input_ids))
+        logits = MagicMock()
+        logits.view.return_value.float.return_value.tolist.return_value = [float(len(ids)) for ids in input_ids]
+        return MagicMock(logits=logits)
+
+    tokenizer = MagicMock(side_effect=tokenize)
+    tokenizer.pad.side_effect = pad
+    service._tokenizer = tokenizer
+    service._model = MagicMock(side_effect=model)
+
+    with patch('app.services.reranker.settings') as mock_settings:
+        mock_settings.RERANKER_TOKEN_BUDGET = 64
+        mock_settings.RERANKER_MAX_BATCH_SIZE = 32
+        scores = service.score_chunks("What is a CRM?", chunks)
+
+    assert scores == [60.0, 5.0, 15.0]
+    assert batch_sizes == [2, 1]
+
+@pytest.mark.functional
+def test_rerank_chunks_records_call_stats():
+    """Test that rerank_chunks sorts by score and reports latency and peak RSS."""
+    service = Reranker()
+    chunks = ["a", "b", "c"]
+    with patch.object(service, 'score_chunks', return_value=[0.1, 0.9, 0.5]):
+        result = service.rerank_chunks("What is a CRM?", chunks, score_threshold=0.2)
+
+    assert result == ["b", "c"]
+    assert service.last_call_stats["pairs"] == 3
+    assert service.last_call_stats["latency_ms"] >= 0
+    assert service.last_call_stats["peak_rss_bytes"] > 0
+
+@pytest.mark.functional
+def test_rerank_many_shares_one_scoring_pass():
+    """Test that several questions are scored together and split back per question."""
+    service = Reranker()
+    queries = [("q1", ["a", "b"]), ("q2", ["c"]), ("q3", ["d", "e", "f"])]
+    with patch.object(service, 'score_pairs', return_value=[0.1, 0.9, 0.5, -1.0, 0.3, 0.7]) as score_pairs:
+        result = service.rerank_many(queries, score_threshold=0.0)
+
+    score_pairs.assert_called_once_with(
+        [("q1", "a"), ("q1", "b"), ("q2", "c"), ("q3", "d"), ("q3", "e"), ("q3", "f")]
+    )
+    assert result == [["b", "a"], ["c"], ["f", "e"]]
+    assert service.last_call_stats["pairs"] == 6
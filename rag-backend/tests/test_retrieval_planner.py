@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.retrieval_planner import RetrievalPlanner
+
+@pytest.mark.functional
+def test_plan_for_small_tenant_is_exact():
+    """Test that tenants under the threshold get an exact scan."""
+    planner = RetrievalPlanner(exact_max_chunks=10000, stats_ttl=60)
+
+    plan = planner.plan_for(300, top_k=5)
+
+    assert plan.kind == "exact"
+    assert plan.probes is None and plan.ef_search is None
+
+@pytest.mark.functional
+def test_plan_for_large_tenant_scales_probes():
+    """Test that IVFFlat probes grow as the tenant's share of each list shrinks."""
+    planner = RetrievalPlanner(exact_max_chunks=10000, stats_ttl=60)
+
+    with patch('app.services.retrieval_planner.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "ivfflat"
+        mock_settings.IVFFLAT_LISTS = 100
+        mock_settings.IVFFLAT_PROBES = 10
+        # 1000 lists: 20 of the tenant's chunks per list, 1 probe would do
+        assert planner.plan_for(20000, 10, {"lists": 1000}).probes == 10
+        # 2000 lists: 10 per list, 2 * top_k / 10 = 20 probes
+        assert planner.plan_for(20000, 100, {"lists": 2000}).probes == 20
+        # Never more probes than lists
+        assert planner.plan_for(20000, 10000, {"lists": 1000}).probes == 1000
+
+@pytest.mark.functional
+def test_plan_for_large_tenant_scales_ef_search():
+    """Test that HNSW ef_search follows the filter's selectivity within pgvector's bounds."""
+    planner = RetrievalPlanner(exact_max_chunks=10000, stats_ttl=60)
+
+    with patch('app.services.retrieval_planner.settings') as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.HNSW_EF_SEARCH = 40
+        assert planner.plan_for(50000, 10, {"rows": 1_000_000}).ef_search == 400
+        assert planner.plan_for(50000, 10, {"rows": 100_000_000}).ef_search == 1000
+        assert planner.plan_for(50000, 10, None).ef_search == 40
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_enabled_chunk_count_is_cached_until_invalidated():
+    """Test that chunk counts are read once per TTL and dropped on invalidate."""
+    planner = RetrievalPlanner(exact_max_chunks=10000, stats_ttl=60)
+
+    with patch('app.services.retrieval_planner.document_storage.get_enabled_chunk_count',
+               new=AsyncMock(return_value=1234)) as get_count:
+        assert await planner.enabled_chunk_count("user-1", AsyncMock()) == 1234
+        assert await planner.enabled_chunk_count("user-1", AsyncMock()) == 1234
+        assert get_count.await_count == 1
+
+        planner.invalidate("user-1")
+        await planner.enabled_chunk_count("user-1", AsyncMock())
+        assert get_count.await_count == 2
@@ -25,9 +25,9 @@ async def test_retrieve_relevant_chunks_core_logic(test_session, mock_user_id):
     ]
     mock_session.execute.return_value = mock_result
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = ["CRM stands for Customer Relationship Management.", "A CRM system helps manage customer interactions."]
         
         # Test cosine distance calculation
@@ -62,9 +62,9 @@ async def test_retrieve_relevant_chunks_user_document_filtering(test_session, mo
     
     mock_session.execute.side_effect = execute_side_effect
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = ["CRM stands for Customer Relationship Management."]
         
         result = await document_retriever.retrieve_relevant_chunks(question, mock_session, mock_user_id)
@@ -82,9 +82,9 @@ async def test_retrieve_relevant_chunks_database_error(test_session, mock_user_i
     mock_session = AsyncMock()
     mock_session.execute.side_effect = Exception("Database error")
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.side_effect = Exception("Database error")
         
         with pytest.raises(Exception) as exc_info:
@@ -106,9 +106,9 @@ async def test_retrieve_relevant_chunks_success(test_session, mock_user_id):
     ]
     mock_session.execute.return_value = mock_result
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = ["CRM stands for Customer Relationship Management.", "A CRM system helps manage customer interactions."]
         result = await document_retriever.retrieve_relevant_chunks(question, mock_session, mock_user_id)
         
@@ -130,9 +130,9 @@ async def test_retrieve_relevant_chunks_no_documents(test_session, mock_user_id)
     mock_result.all.return_value = []
     mock_session.execute.return_value = mock_result
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = []
         result = await document_retriever.retrieve_relevant_chunks(question, mock_session, mock_user_id)
         assert isinstance(result, list)
@@ -153,9 +153,9 @@ async def test_retrieve_relevant_chunks_with_similarity_threshold(test_session,
     ]
     mock_session.execute.return_value = mock_result
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = ["CRM stands for Customer Relationship Management."]
         result = await document_retriever.retrieve_relevant_chunks(
             question, mock_session, mock_user_id, similarity_threshold=0.5
@@ -174,9 +174,9 @@ async def test_retrieve_relevant_chunks_error_handling(test_session, mock_user_i
     mock_session = AsyncMock()
     mock_session.execute.side_effect = Exception("Database error")
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.side_effect = Exception("Database error")
         with pytest.raises(Exception) as exc_info:
             await document_retriever.retrieve_relevant_chunks(question, mock_session, mock_user_id)
@@ -209,11 +209,146 @@ async def test_retrieve_relevant_chunks_with_user_documents(test_session, mock_u
     
     mock_session.execute.side_effect = execute_side_effect
     
-    with patch('app.services.embedding_service.embedding_service.embed_texts') as mock_embed, \
+    with patch('app.services.embedding_service.embedding_service.embed_query') as mock_embed, \
          patch('app.services.retriever.document_retriever.retrieve_relevant_chunks') as mock_retrieve:
-        mock_embed.return_value = [[0.1] * 768]
+        mock_embed.return_value = [0.1] * 768
         mock_retrieve.return_value = ["CRM stands for Customer Relationship Management."]
         result = await document_retriever.retrieve_relevant_chunks(question, mock_session, mock_user_id)
         assert isinstance(result, list)
         assert len(result) == 1
-        assert result[0] == "CRM stands for Customer Relationship Management." 
\ No newline at end of file
+        assert result[0] == "CRM stands for Customer Relationship Management." 
+
+def _compile(statement) -> str:
+    from sqlalchemy.dialects import postgresql
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_retrieve_relevant_chunks_pushes_down_top_k(mock_user_id):
+    """Test that retrieval orders by raw distance with a LIMIT and thresholds afterwards."""
+    from collections import namedtuple
+    from app.services.retriever import DocumentRetriever
+    from app.services.retrieval_planner import RetrievalPlan
+    Row = namedtuple("Row", ["id", "document_id", "chunk_index", "content", "token_count", "embedding", "distance"])
+
+    statements = []
+    chunks_result = MagicMock()
+    chunks_result.all.return_value = [Row(1, "doc-1", 0, "close chunk", 2, None, 0.1), Row(2, "doc-1", 1, "far chunk", 2, None, 0.6)]
+
+    async def execute(statement):
+        statements.append(statement)
+        return chunks_result
+
+    mock_session = MagicMock()
+    mock_session.execute = execute
+
+    with patch('app.services.retriever.embedding_service.embed_query', new=AsyncMock(return_value=[0.1] * 768)), \
+         patch('app.services.retriever.user_index_cache.search', new=AsyncMock(return_value=None)), \
+         patch('app.services.retriever.retrieval_planner.plan', new=AsyncMock(return_value=RetrievalPlan("ann", 50000))):
+        result = await DocumentRetriever().retrieve_relevant_chunks("What is a CRM?", mock_session, mock_user_id, top_k=5)
+
+    assert result == ["close chunk"]
+    assert result[0].distance == 0.1 and result[0].token_count == 2
+    assert (result[0].document_id, result[0].chunk_index) == ("doc-1", 0)
+    # The enabled-document filter is part of the same statement
+    assert len(statements) == 1
+    sql = _compile(statements[0])
+    assert "ORDER BY document_chunks.embedding <=>" in sql
+    assert "LIMIT" in sql
+    assert "document_chunks.document_id IN (SELECT user_documents.document_id" in sql
+
+@pytest.mark.functional
+def test_reciprocal_rank_fusion():
+    """Test weighted reciprocal rank fusion of two rankings."""
+    from app.services.retriever import reciprocal_rank_fusion
+
+    rankings = {"vector": ["a", "b", "c"], "lexical": ["c", "d"]}
+    # "c" appears in both lists and overtakes the vector-only "a"
+    assert reciprocal_rank_fusion(rankings, {"vector": 1.0, "lexical": 1.0}, k=1) == ["c", "a", "b", "d"]
+    # Down-weighting the lexical side keeps the vector order on top
+    assert reciprocal_rank_fusion(rankings, {"vector": 1.0, "lexical": 0.1}, k=1)[:2] == ["a", "b"]
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_retrieve_relevant_chunks_hybrid(mock_user_id):
+    """Test that hybrid mode fuses ANN and full-text candidates."""
+    from collections import namedtuple
+    from app.services.retriever import DocumentRetriever
+    from app.services.retrieval_planner import RetrievalPlan
+    VectorRow = namedtuple("VectorRow", ["id", "document_id", "chunk_index", "content", "token_count", "embedding", "distance"])
+    LexicalRow = namedtuple("LexicalRow", ["id", "document_id", "chunk_index", "content", "token_count", "embedding"])
+
+    vector_result = MagicMock()
+    vector_result.all.return_value = [VectorRow(1, "doc-1", 0, "semantic match", 2, None, 0.1), VectorRow(2, "doc-1", 1, "shared match", 2, None, 0.2)]
+    mock_session = MagicMock()
+    mock_session.execute = AsyncMock(return_value=vector_result)
+
+    lexical_statements = []
+    lexical_result = MagicMock()
+    lexical_result.all.return_value = [LexicalRow(2, "doc-1", 1, "shared match", 2, None), LexicalRow(3, "doc-2", 0, "SKU-42 exact match", 4, None)]
+
+    async def lexical_execute(statement):
+        lexical_statements.append(statement)
+        return lexical_result
+
+    lexical_session = MagicMock()
+    lexical_session.execute = lexical_execute
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(return_value=lexical_session)
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch('app.services.retriever.embedding_service.embed_query', new=AsyncMock(return_value=[0.1] * 768)), \
+         patch('app.services.retriever.async_session', session_factory), \
+         patch('app.services.retriever.user_index_cache.search', new=AsyncMock(return_value=None)), \
+         patch('app.services.retriever.retrieval_planner.plan', new=AsyncMock(return_value=RetrievalPlan("exact", 2))), \
+         patch('app.services.retriever.settings.RETRIEVAL_MODE', "hybrid"):
+        result = await DocumentRetriever().retrieve_relevant_chunks("SKU-42 pricing", mock_session, mock_user_id, top_k=3)
+
+    assert result == ["shared match", "semantic match", "SKU-42 exact match"]
+    # Lexical-only matches have no vector distance
+    assert [chunk.distance for chunk in result] == [0.2, 0.1, None]
+    sql = _compile(lexical_statements[0])
+    assert "to_tsvector('english'::regconfig, document_chunks.content) @@ websearch_to_tsquery" in sql
+    assert "document_chunks.document_id IN (SELECT user_documents.document_id" in sql
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_retrieve_relevant_chunks_from_user_index_cache(mock_user_id):
+    """Test that cached tenants are served without querying Postgres."""
+    from app.services.retriever import DocumentRetriever
+    from app.services.user_index_cache import ChunkHit
+
+    mock_session = MagicMock()
+    mock_session.execute = AsyncMock()
+    hits = [ChunkHit(1, "close chunk", 0.1), ChunkHit(2, "far chunk", 0.6)]
+
+    with patch('app.services.retriever.embedding_service.embed_query', new=AsyncMock(return_value=[0.1] * 768)), \
+         patch('app.services.retriever.user_index_cache.search', new=AsyncMock(return_value=hits)):
+        result = await DocumentRetriever().retrieve_relevant_chunks("What is a CRM?", mock_session, mock_user_id, top_k=5)
+
+    assert result == ["close chunk"]
+    mock_session.execute.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_retrieve_relevant_chunks_exact_plan(mock_user_id):
+    """Test that small tenants get an exact scan the ANN index cannot serve."""
+    from collections import namedtuple
+    from app.services.retriever import DocumentRetriever
+    from app.services.retrieval_planner import RetrievalPlan
+    Row = namedtuple("Row", ["id", "document_id", "chunk_index", "content", "token_count", "embedding", "distance"])
+
+    chunks_result = MagicMock()
+    chunks_result.all.return_value = [Row(1, "doc-1", 0, "close chunk", 2, None, 0.1)]
+    mock_session = MagicMock()
+    mock_session.execute = AsyncMock(return_value=chunks_result)
+
+    with patch('app.services.retriever.embedding_service.embed_query', new=AsyncMock(return_value=[0.1] * 768)), \
+         patch('app.services.retriever.user_index_cache.search', new=AsyncMock(return_value=None)), \
+         patch('app.services.retriever.retrieval_planner.plan', new=AsyncMock(return_value=RetrievalPlan("exact", 300))):
+        result = await DocumentRetriever().retrieve_relevant_chunks("What is a CRM?", mock_session, mock_user_id, top_k=5)
+
+    assert result == ["close chunk"]
+    sql = _compile(mock_session.execute.call_args[0][0])
+    assert "ORDER BY (document_chunks.embedding <=>" in sql
+    assert ") + " in sql
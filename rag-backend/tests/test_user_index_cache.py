@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.user_index_cache import UserIndexCache, _UserIndex
+
+def _index(vectors, contents=None):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    contents = contents or [f"chunk {i}" for i in range(len(vectors))]
+    return _UserIndex(list(range(len(vectors))), contents, matrix)
+
+@pytest.fixture
+def mock_redis():
+    """In-memory stand-in for the document set versions in Redis."""
+    versions = {}
+    with patch('app.services.user_index_cache.redis_client') as mock:
+        mock.get.side_effect = lambda key: versions.get(key)
+        mock.incr.side_effect = lambda key: versions.__setitem__(key, versions.get(key, 0) + 1)
+        yield mock
+
+@pytest.mark.functional
+def test_top_k_orders_by_cosine_distance():
+    """Test exact top-k over the cached matrix."""
+    index = _index([[1, 0], [0, 1], [1, 1], [-1, 0]])
+
+    hits = UserIndexCache._top_k(index, [1.0, 0.1], 2)
+
+    assert [hit.id for hit in hits] == [0, 2]
+    assert hits[0].distance < hits[1].distance
+    assert UserIndexCache._top_k(index, [1.0, 0.0], 10)[-1].id == 3
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_search_loads_once_and_reloads_after_invalidate(mock_redis):
+    """Test that entries are reused until the user's document set changes."""
+    cache = UserIndexCache(max_bytes=1024 * 1024, max_chunks=100)
+    fetch = AsyncMock(return_value=_index([[1, 0], [0, 1]]))
+
+    with patch.object(cache, '_fetch', fetch):
+        await cache.search("user-1", [1.0, 0.0], 1)
+        hits = await cache.search("user-1", [1.0, 0.0], 1)
+        assert fetch.await_count == 1
+        assert hits[0].content == "chunk 0"
+
+        cache.invalidate("user-1")
+        await cache.search("user-1", [1.0, 0.0], 1)
+        assert fetch.await_count == 2
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_search_bypasses_oversized_users(mock_redis):
+    """Test that users over the chunk limit fall back to Postgres."""
+    cache = UserIndexCache(max_bytes=1024 * 1024, max_chunks=100)
+
+    with patch.object(cache, '_fetch', AsyncMock(return_value=None)) as fetch:
+        assert await cache.search("user-1", [1.0, 0.0], 1) is None
+        assert await cache.search("user-1", [1.0, 0.0], 1) is None
+        assert fetch.await_count == 1
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_search_evicts_least_recently_used(mock_redis):
+    """Test that the cache stays within its byte budget."""
+    index = _index([[1, 0], [0, 1]], ["a", "b"])
+    cache = UserIndexCache(max_bytes=2 * index.nbytes, max_chunks=100)
+
+    with patch.object(cache, '_fetch', AsyncMock(side_effect=lambda user_id: _index([[1, 0], [0, 1]], ["a", "b"]))):
+        await cache.search("user-1", [1.0, 0.0], 1)
+        await cache.search("user-2", [1.0, 0.0], 1)
+        await cache.search("user-1", [1.0, 0.0], 1)
+        await cache.search("user-3", [1.0, 0.0], 1)
+
+    assert "user-2" not in cache._entries
+    assert len(cache) == 2
+    assert cache.bytes <= cache.max_bytes
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_search_bypasses_cache_without_redis():
+    """Test that a Redis outage falls back to Postgres instead of serving stale entries."""
+    cache = UserIndexCache(max_bytes=1024 * 1024, max_chunks=100)
+
+    with patch('app.services.user_index_cache.redis_client') as mock_redis:
+        mock_redis.get.side_effect = ConnectionError("redis down")
+        assert await cache.search("user-1", [1.0, 0.0], 1) is None
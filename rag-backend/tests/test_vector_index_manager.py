@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.vector_index_manager import VectorIndexManager, recommend_lists
+
+def _stats(**overrides):
+    stats = {
+        "index": "idx_document_chunks_embedding",
+        "index_type": "ivfflat",
+        "index_exists": True,
+        "rows": 500_000,
+        "size_bytes": 1024,
+        "lists": 500,
+        "recommended_lists": 500,
+        "list_imbalance": 1.5,
+        "checked_at": "2024-01-01T00:00:00",
+    }
+    stats.update(overrides)
+    return stats
+
+@pytest.mark.functional
+def test_recommend_lists():
+    """Test the rows/1000 and sqrt(rows) recommendations and their bounds."""
+    assert recommend_lists(0) == 1
+    assert recommend_lists(250_000) == 250
+    assert recommend_lists(1_000_000) == 1000
+    assert recommend_lists(4_000_000) == 2000
+    assert recommend_lists(10**12) == 32768
+
+@pytest.mark.functional
+def test_rebuild_reason():
+    """Test when the index is considered stale."""
+    manager = VectorIndexManager(MagicMock())
+
+    assert manager.rebuild_reason(_stats()) is None
+    assert manager.rebuild_reason(_stats(index_exists=False)) == "index is missing"
+    # Created on an empty table with the default lists
+    assert "far from the recommended" in manager.rebuild_reason(_stats(lists=100))
+    assert "largest sampled list" in manager.rebuild_reason(_stats(list_imbalance=6.0))
+    # Small tables and HNSW indexes are left alone
+    assert manager.rebuild_reason(_stats(rows=500, lists=100, recommended_lists=1)) is None
+    assert manager.rebuild_reason(_stats(index_type="hnsw", lists=None, recommended_lists=None)) is None
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_rebuild_skips_healthy_index():
+    """Test that an unforced rebuild of a healthy index does not touch the database."""
+    manager = VectorIndexManager(MagicMock())
+    manager.collect_stats = AsyncMock(return_value=_stats())
+
+    result = await manager.rebuild()
+
+    assert result["rebuilt"] is False
+    manager.engine.connect.assert_not_called()
+
+@pytest.mark.functional
+@pytest.mark.asyncio
+async def test_trigger_rebuild_runs_once():
+    """Test that only one background rebuild runs at a time."""
+    manager = VectorIndexManager(MagicMock())
+    release = asyncio.Event()
+
+    async def slow_rebuild(force=False):
+        await release.wait()
+
+    manager.rebuild = slow_rebuild
+    assert manager.trigger_rebuild() is True
+    assert manager.trigger_rebuild() is False
+    release.set()
+    await manager._rebuild_task
+    assert manager.trigger_rebuild() is True
+    await manager._rebuild_task
@@ -85,6 +85,19 @@ export const uploadDocument = async (file) => {
   }
 };
 
+export const getIngestionJob = async (jobId) => {
+  try {
+    const response = await api.get(`documents/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    console.error(
+      "Error fetching ingestion job:",
+      error.response?.data?.detail || error.message
+    );
+    throw error;
+  }
+};
+
 // 📄 Document APIs
 export const getDocuments = async () => {
   try {
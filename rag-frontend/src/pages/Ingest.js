@@ -1,8 +1,26 @@
 import { useState, useEffect } from "react";
-import { getDocuments, uploadDocument, selectDocuments } from "../api/api";
+import {
+  getDocuments,
+  uploadDocument,
+  getIngestionJob,
+  selectDocuments,
+} from "../api/api";
 import Layout from "../components/Layout";
 import { handleError, showSuccess } from "../utils/errorHandler";
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Uploads are processed in the background; poll until the job finishes
+const waitForIngestion = async (jobId, onProgress) => {
+  for (;;) {
+    const job = await getIngestionJob(jobId);
+    if (job.status === "completed") return job;
+    if (job.status === "failed") throw new Error(job.error || "Ingestion failed");
+    onProgress(job);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 function Ingest() {
   const [docs, setDocs] = useState([]);
   const [file, setFile] = useState(null);
@@ -42,7 +60,10 @@ function Ingest() {
     try {
       setIsUploading(true);
       setUploadStatus("Uploading...");
-      await uploadDocument(file);
+      const { job_id: jobId } = await uploadDocument(file);
+      await waitForIngestion(jobId, (job) =>
+        setUploadStatus(job.stage ? `Processing (${job.stage})...` : "Queued...")
+      );
       showSuccess("Document uploaded successfully!");
       setFile(null);
       setUploadStatus("");